@@ -3,216 +3,775 @@ from discord import app_commands
 import random
 import asyncio
 import sqlite3
-from uuid import uuid4
+from uuid import uuid4, UUID
 import json
 import os
-import threading
+import sys
+import csv
+import tracemalloc
+import weakref
+import gc
+import bisect
+import math
+import time
+import tempfile
+import shutil
+import subprocess
+import importlib
+import copy
+from fractions import Fraction
+from functools import lru_cache
+from contextlib import contextmanager, nullcontext
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import buckshot_core
+from buckshot_core import (
+    SHARD_COUNT, SHARD_IDS, SHARD_PROCESSES, shard_for_guild, owns_guild, shard_path,
+    io_stats, HOUSE_ACCOUNT, COMMIT_INTERVAL, commit_observers, get_db, request_commit, flush_commits, write_transaction,
+    init_db, register_migration, ensure_db, connect_db, GameRNG, StoredPlayer, Ruleset, render_game_embed,
+    ItemHooks, ItemConfig, Beer, MagnifyingGlass, Cigarette, Knife, Handcuffs, Adrenaline, BurnerPhone, Inverter, Jammer, Medicine,
+    AI_DIFFICULTIES, AI_WORKERS, AIState, fallback_ai_action, choose_ai_action, get_ai_pool, discard_ai_pool, in_worker_process,
+    stage_stats, timed_stage, acknowledge,
+    THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_GAME_RATE, THROTTLE_GAME_BURST, THROTTLE_MAX_BUCKETS,
+    TokenBucketLimiter, user_limiter, game_limiter, take_tokens, throttle,
+    INVITE_QUEUE_SIZE, INVITE_QUEUE_TIMEOUT, LOAD_SAMPLE_INTERVAL, AdmissionControl,
+    record_path, InteractionRecorder, REPLAY_PATH, REPLAY_SPEED, ReplaySession, ReplayInteraction, load_recording, run_replay,
+    write_snapshot, GameSnapshot, install_shutdown_handler,
+    MAINTENANCE_BATCH, MAINTENANCE_MAX_ROWS, DatabaseMaintenance, maintenance, schedule_maintenance,
+    run_shard_supervisor, sync_command_tree,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+@lru_cache(maxsize=None)
+def optional_module(name):
+    """선택 의존성을 처음 쓸 때 import (설치되어 있지 않으면 None)
+
+    numpy(레이팅 일괄 재계산)와 pyarrow(Parquet 내보내기)는 import만으로 봇 시작 시간의 대부분을 차지하므로
+    시작할 때 올리지 않는다. 둘 다 없어도 봇은 동작한다 (순수 파이썬 재계산, CSV 내보내기).
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
 
 # 디스코드 인텐트 설정
-intents = discord.Intents.default()
-intents.message_content = True
-client = discord.Client(intents=intents)
-tree = app_commands.CommandTree(client)
+# bot.py가 두 룰셋을 한 프로세스에 올릴 때는 공용 클라이언트와 명령 모음(tree)을 미리 넣어 둠
+HOSTED = "client" in globals()
+if not HOSTED:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = discord.AutoShardedClient(intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+    tree = app_commands.CommandTree(client)
 
 # 동기화 플래그
-synced = False
+synced = HOSTED  # bot.py에 올라가면 명령어 동기화는 bot.py가 한 번만 수행
 
-# JSON 파일 동기화를 위한 Lock
-json_lock = threading.Lock()
+# 이전 버전은 게임별 아이템을 이 파일에 따로 저장했음 (처음 DB를 열 때 상태 행으로 옮김)
+LEGACY_ITEMS_PATH = "user.json"
 
-# JSON 파일 관리
-USER_JSON_PATH = "user.json"
+# 상금 원장 (복식 부기): 모든 입출금은 합이 0인 거래 단위로 ledger_entries에 추가만 하고,
+# 잔액(player_money.total_money)은 모아 둔 거래를 한 트랜잭션에서 원장과 함께 반영하는 정산으로만 바꾼다.
+SETTLE_INTERVAL = COMMIT_INTERVAL
+SETTLE_RETRY_DELAY = 5  # 정산 실패 시 다시 시도하기까지 대기 (초)
+pending_postings = {}  # (연결, 묶음) -> 정산을 기다리는 거래 목록. 묶음이 None이면 SETTLE_INTERVAL마다 정산
+settle_scheduled = set()
+ledger_stats = {"transactions": 0, "settlements": 0}
 
-def init_json():
-    """user.json 파일 초기화"""
-    with json_lock:
-        if not os.path.exists(USER_JSON_PATH):
-            with open(USER_JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+def post_transaction(conn, game_id, reason, postings, usage=None, batch=None):
+    """거래 하나를 정산 대기열에 올림 (이벤트 루프 밖에서는 즉시 정산)
 
-def save_items_to_json(game_id, player1_id, player2_id, items):
-    """아이템을 user.json에 저장"""
-    with json_lock:
-        try:
-            with open(USER_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {}
-        
-        data[game_id] = {
-            str(player1_id): items[player1_id],
-            str(player2_id): items[player2_id]
-        }
-        
-        print(f"Saving items for game {game_id}: {data[game_id]}")  # 디버깅 로그
-        with open(USER_JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-def load_items_from_json(game_id, player1_id, player2_id):
-    """user.json에서 아이템 로드"""
-    with json_lock:
-        try:
-            with open(USER_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            game_data = data.get(game_id, {})
-            return {
-                player1_id: game_data.get(str(player1_id), []),
-                player2_id: game_data.get(str(player2_id), [])
-            }
-        except (FileNotFoundError, json.JSONDecodeError, KeyError):
-            return {player1_id: [], player2_id: []}
-
-def delete_items_from_json(game_id):
-    """게임 종료 시 user.json에서 아이템 데이터 삭제"""
-    with json_lock:
-        try:
-            with open(USER_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {}
-        if game_id in data:
-            del data[game_id]
-            with open(USER_JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-# SQLite 데이터베이스 초기화
-def init_db():
+    postings는 (계정, 금액) 목록으로 금액의 합이 0이어야 한다 (양수: 입금, 음수: 출금).
+    usage는 플레이어별 아이템 사용 횟수로, 정산 때 item_usage_history에 함께 더한다.
+    batch를 주면 타이머로 정산하지 않고 settle_batch(batch)가 불릴 때 묶음 전체를 한 번에 정산한다
+    (토너먼트 라운드의 상금은 라운드가 끝날 때 한 커밋으로 반영).
+    """
+    if sum(amount for _, amount in postings) != 0:
+        raise ValueError(f"입금과 출금의 합이 0이 아닙니다: {postings}")
+    pending_postings.setdefault((conn, batch), []).append((uuid4().hex, game_id, reason, postings, usage or {}, time.time()))
+    ledger_stats["transactions"] += 1
+    if batch is not None:
+        return
+    if not schedule_settle(conn):
+        settle_ledger(conn)
+
+def schedule_settle(conn, batch=None, delay=SETTLE_INTERVAL):
+    """delay초 뒤 정산을 예약 (이미 예약돼 있으면 그대로 둠). 이벤트 루프 밖이면 False"""
     try:
-        with sqlite3.connect("buckshot.db") as conn:
-            c = conn.cursor()
-            c.execute("DROP TABLE IF EXISTS games")
-            c.execute("DROP TABLE IF EXISTS game_states")
-            c.execute("DROP TABLE IF EXISTS player_money")
-            c.execute('''CREATE TABLE games (
-                game_id TEXT PRIMARY KEY,
-                player1_id INTEGER,
-                player2_id INTEGER,
-                round INTEGER,
-                scores TEXT,
-                status TEXT,
-                prize INTEGER,
-                double_or_nothing BOOLEAN
-            )''')
-            c.execute('''CREATE TABLE game_states (
-                game_id TEXT,
-                turn INTEGER,
-                current_turn_id INTEGER,
-                hp TEXT,
-                chamber TEXT,
-                knife_active TEXT,
-                handcuff_active TEXT,
-                jammer_active TEXT,
-                item_usage TEXT,
-                FOREIGN KEY (game_id) REFERENCES games (game_id)
-            )''')
-            c.execute('''CREATE TABLE player_money (
-                player_id INTEGER PRIMARY KEY,
-                total_money INTEGER,
-                item_usage_history TEXT
-            )''')
-            conn.commit()
-            return True, "데이터베이스가 성공적으로 초기화되었습니다!"
-    except sqlite3.Error as e:
-        return False, f"데이터베이스 초기화 중 오류 발생: {e}"
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    if (conn, batch) not in settle_scheduled:
+        settle_scheduled.add((conn, batch))
+        loop.call_later(delay, settle_ledger, conn, batch)
+    return True
+
+def settle_batch(batch):
+    """묶음으로 모아 둔 거래를 연결마다 한 트랜잭션으로 정산. 정산한 거래 수를 반환"""
+    return sum(settle_ledger(conn, key) for conn, key in list(pending_postings) if key == batch)
+
+def settle_all(conn):
+    """연결에 쌓인 거래를 묶음과 관계없이 모두 정산 (종료 처리, 벤치마크 정리용)"""
+    return sum(settle_ledger(conn, batch) for key_conn, batch in list(pending_postings) if key_conn is conn)
+
+def settle_ledger(conn, batch=None):
+    """대기 중인 거래를 한 트랜잭션으로 원장에 추가하고 잔액과 아이템 사용 내역에 반영. 정산한 거래 수를 반환
+
+    실패하면 거래를 대기열에 되돌리고 SETTLE_RETRY_DELAY 뒤 다시 정산하도록 예약한 뒤 예외를 다시 던진다.
+    """
+    settle_scheduled.discard((conn, batch))
+    queue = pending_postings.pop((conn, batch), None)
+    if not queue:
+        return 0
+    entries = []
+    deltas = {}
+    usage_by_player = {}
+    for txn_id, game_id, reason, postings, usage, created_at in queue:
+        for account_id, amount in postings:
+            entries.append((txn_id, account_id, amount, game_id, reason, created_at))
+            deltas[account_id] = deltas.get(account_id, 0) + amount
+        for player_id, counts in usage.items():
+            merged = usage_by_player.setdefault(player_id, {})
+            for item, count in counts.items():
+                merged[item] = merged.get(item, 0) + count
+    try:
+        with write_transaction(conn):
+            conn.executemany(
+                "INSERT INTO ledger_entries (txn_id, account_id, amount, game_id, reason, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                entries
+            )
+            for account_id in deltas.keys() | usage_by_player.keys():
+                row = conn.execute("SELECT total_money, item_usage_history FROM player_money WHERE player_id = ?", (account_id,)).fetchone()
+                total_money, usage_history = (row[0], json.loads(row[1])) if row else (0, {})
+                for item, count in usage_by_player.get(account_id, {}).items():
+                    usage_history[item] = usage_history.get(item, 0) + count
+                conn.execute(
+                    "INSERT OR REPLACE INTO player_money (player_id, total_money, item_usage_history) VALUES (?, ?, ?)",
+                    (account_id, total_money + deltas.get(account_id, 0), json.dumps(usage_history))
+                )
+    except sqlite3.Error:
+        pending_postings.setdefault((conn, batch), [])[:0] = queue
+        schedule_settle(conn, batch, SETTLE_RETRY_DELAY)
+        raise
+    ledger_stats["settlements"] += 1
+    return len(queue)
+
+def audit_ledger(conn):
+    """원장 검증: 거래마다 합이 0인지, 계정별 원장 합계가 잔액과 같은지 확인"""
+    started = time.perf_counter()
+    transactions, entries = conn.execute("SELECT COUNT(DISTINCT txn_id), COUNT(*) FROM ledger_entries").fetchone()
+    unbalanced = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT txn_id FROM ledger_entries GROUP BY txn_id HAVING SUM(amount) != 0)"
+    ).fetchone()[0]
+    mismatched = conn.execute('''
+        WITH totals AS (SELECT account_id, SUM(amount) AS total FROM ledger_entries GROUP BY account_id)
+        SELECT p.player_id, p.total_money, COALESCE(t.total, 0) FROM player_money p
+        LEFT JOIN totals t ON t.account_id = p.player_id WHERE p.total_money != COALESCE(t.total, 0)
+        UNION ALL
+        SELECT t.account_id, 0, t.total FROM totals t
+        WHERE t.total != 0 AND t.account_id NOT IN (SELECT player_id FROM player_money)
+    ''').fetchall()
+    return {
+        "transactions": transactions,
+        "entries": entries,
+        "unbalanced": unbalanced,
+        "mismatched": mismatched,  # (계정, 잔액, 원장 합계)
+        "seconds": time.perf_counter() - started,
+    }
+
+def migrate_legacy_items(path=None):
+    """이전 버전의 user.json 아이템을 각 게임의 상태 행으로 옮기고 파일은 .migrated로 바꿔 둠"""
+    path = path or LEGACY_ITEMS_PATH
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    with sqlite3.connect(buckshot_core.DB_PATH) as conn:
+        moved = conn.executemany(
+            "UPDATE game_states SET items = ? WHERE game_id = ? AND items IS NULL",
+            [(json.dumps(items, ensure_ascii=False), game_id) for game_id, items in data.items()]
+        ).rowcount
+    try:
+        os.replace(path, f"{path}.migrated")
+    except FileNotFoundError:  # 다른 샤드 프로세스가 먼저 옮김
+        pass
+    print(f"Moved items of {moved} game states from {path}")
+    return moved
+
+register_migration(migrate_legacy_items)
+
+def load_saved_items(conn, game_id, seats):
+    """게임의 상태 행에서 아이템을 읽음 (좌석 순서의 목록 두 개, 없으면 빈 목록)"""
+    row = conn.execute("SELECT items FROM game_states WHERE game_id = ?", (game_id,)).fetchone()
+    data = json.loads(row[0]) if row and row[0] else {}
+    return [data.get(str(player_id), []) for player_id in seats]
+
+# 클래식 룰셋 아이템 구성 (아이템 클래스는 buckshot_core의 공용 레지스트리)
+# 이 순서가 곧 아이템 ID (비트마스크와 조합 테이블의 순서)
+ITEM_CONFIG = ItemConfig(
+    (
+        Beer(cost=495),
+        MagnifyingGlass(),
+        Cigarette(cost=220, max_hp=4, description="체력을 1 회복합니다. 최대 체력은 4입니다. 3라운드에서 체력 2 이하 시 사용 불가."),
+        Knife(),
+        Handcuffs(),
+        Adrenaline(cost=3000),
+        BurnerPhone(random_position=False),
+        Inverter(),
+        Jammer(),
+        Medicine(name="상한 약", modes=("Double or Nothing",), description="50% 확률로 체력 2 회복 또는 체력 1 감소. 최대 체력 초과 불가."),
+    ),
+    modes=("Normal", "Double or Nothing"),
+    icons=False,
+)
+ITEMS = ITEM_CONFIG.by_name  # 이름 -> 아이템 디스패치 테이블
+CHARGED_ITEMS = tuple(item.name for item in ITEM_CONFIG.items if item.cost)
+ITEM_POOLS = ITEM_CONFIG.pools  # 게임 모드별 아이템 풀
+
+def build_chamber_odds(round_num):
+    """라운드별로 가능한 (실탄, 공포탄) 구성과 정확한 확률을 계산"""
+    odds = {}
+    if round_num == 1:
+        # 실탄 1~3발 균등, 공포탄 2발 고정
+        for live in range(1, 4):
+            odds[(live, 2)] = Fraction(1, 3)
+    else:
+        # 총 탄수 2~8발 균등, 실탄은 1~min(4, 총 탄수 - 1)발 균등
+        for total_bullets in range(2, 9):
+            max_live = min(4, total_bullets - 1)
+            for live in range(1, max_live + 1):
+                key = (live, total_bullets - live)
+                odds[key] = odds.get(key, 0) + Fraction(1, 7 * max_live)
+    return odds
+
+# 클래식 룰셋: 3라운드, 게임 화면 제목에 모드 표시
+RULESET = Ruleset("classic", build_chamber_odds, ITEM_CONFIG, max_rounds=3, show_mode=True)
+
+# Glicko 레이팅 설정
+DEFAULT_RATING = 1500
+DEFAULT_RD = 350
+MIN_RD = 30
+RATING_PERIOD = 86400  # 레이팅 기간(초): RD는 기간 단위로 늘어남
+RD_GROWTH = 34.6  # 기간마다 RD 증가량 (약 100기간 쉬면 50 -> 350)
+GLICKO_Q = math.log(10) / 400
+
+def glicko_g(rd):
+    return 1 / math.sqrt(1 + 3 * GLICKO_Q ** 2 * rd ** 2 / math.pi ** 2)
+
+def glicko_expected(rating, opponent_rating, opponent_rd):
+    return 1 / (1 + 10 ** (-glicko_g(opponent_rd) * (rating - opponent_rating) / 400))
+
+def inflate_rd(rd, periods):
+    """쉬는 동안 불확실성(RD) 증가"""
+    return min(math.sqrt(rd ** 2 + RD_GROWTH ** 2 * periods), DEFAULT_RD)
+
+def glicko_update(rating, rd, results):
+    """한 레이팅 기간의 결과 [(상대 레이팅, 상대 RD, 점수)]로 (레이팅, RD) 갱신"""
+    variance_inv = 0.0
+    delta = 0.0
+    for opponent_rating, opponent_rd, score in results:
+        g = glicko_g(opponent_rd)
+        expected = glicko_expected(rating, opponent_rating, opponent_rd)
+        variance_inv += g ** 2 * expected * (1 - expected)
+        delta += g * (score - expected)
+    denominator = 1 / rd ** 2 + GLICKO_Q ** 2 * variance_inv
+    return rating + GLICKO_Q / denominator * delta, max(math.sqrt(1 / denominator), MIN_RD)
+
+def get_player_rating(player_id, conn=None):
+    """플레이어 레이팅 (레이팅 기록이 없으면 기본값)"""
+    row = (conn or get_db()).execute("SELECT rating FROM player_ratings WHERE player_id = ?", (player_id,)).fetchone()
+    return row[0] if row else DEFAULT_RATING
+
+def load_rating(conn, player_id, now):
+    row = conn.execute("SELECT rating, rd, games, last_played FROM player_ratings WHERE player_id = ?", (player_id,)).fetchone()
+    if not row:
+        return DEFAULT_RATING, DEFAULT_RD, 0
+    rating, rd, games, last_played = row
+    return rating, inflate_rd(rd, max(now - last_played, 0) / RATING_PERIOD), games
+
+def record_match_result(conn, game_id, player1_id, player2_id, winner_id):
+    """경기 결과를 기록하고 두 플레이어의 레이팅을 갱신, 새 (레이팅1, 레이팅2)를 반환"""
+    now = time.time()
+    with write_transaction(conn):
+        conn.execute(
+            "INSERT INTO match_history (game_id, played_at, player1_id, player2_id, winner_id) VALUES (?, ?, ?, ?, ?)",
+            (game_id, now, player1_id, player2_id, winner_id)
+        )
+        rating1, rd1, games1 = load_rating(conn, player1_id, now)
+        rating2, rd2, games2 = load_rating(conn, player2_id, now)
+        score1 = 0.5 if winner_id is None else float(winner_id == player1_id)
+        new_rating1, new_rd1 = glicko_update(rating1, rd1, [(rating2, rd2, score1)])
+        new_rating2, new_rd2 = glicko_update(rating2, rd2, [(rating1, rd1, 1 - score1)])
+        conn.executemany(
+            "INSERT OR REPLACE INTO player_ratings (player_id, rating, rd, games, last_played) VALUES (?, ?, ?, ?, ?)",
+            [(player1_id, new_rating1, new_rd1, games1 + 1, now), (player2_id, new_rating2, new_rd2, games2 + 1, now)]
+        )
+    return new_rating1, new_rating2
+
+def apply_rating_period(ratings, rds, last_period, period, player1, player2, scores):
+    """한 레이팅 기간의 모든 경기를 기간 시작 시점 레이팅 기준으로 한꺼번에 반영 (numpy 벡터 연산)"""
+    np = optional_module("numpy")
+    players = np.unique(np.concatenate((player1, player2)))
+    rds[players] = np.minimum(np.sqrt(rds[players] ** 2 + RD_GROWTH ** 2 * (period - last_period[players])), DEFAULT_RD)
+    g1 = 1 / np.sqrt(1 + 3 * GLICKO_Q ** 2 * rds[player2] ** 2 / math.pi ** 2)
+    g2 = 1 / np.sqrt(1 + 3 * GLICKO_Q ** 2 * rds[player1] ** 2 / math.pi ** 2)
+    expected1 = 1 / (1 + 10 ** (-g1 * (ratings[player1] - ratings[player2]) / 400))
+    expected2 = 1 / (1 + 10 ** (-g2 * (ratings[player2] - ratings[player1]) / 400))
+    variance_inv = np.zeros_like(ratings)
+    delta = np.zeros_like(ratings)
+    np.add.at(variance_inv, player1, g1 ** 2 * expected1 * (1 - expected1))
+    np.add.at(variance_inv, player2, g2 ** 2 * expected2 * (1 - expected2))
+    np.add.at(delta, player1, g1 * (scores - expected1))
+    np.add.at(delta, player2, g2 * (1 - scores - expected2))
+    denominator = 1 / rds[players] ** 2 + GLICKO_Q ** 2 * variance_inv[players]
+    ratings[players] += GLICKO_Q / denominator * delta[players]
+    rds[players] = np.maximum(np.sqrt(1 / denominator), MIN_RD)
+    last_period[players] = period
+
+def recompute_ratings(conn, chunk_size=100000):
+    """match_history 전체를 시간순으로 청크 단위로 읽어 레이팅을 처음부터 다시 계산
+
+    레이팅 기간(RATING_PERIOD) 안의 경기는 기간 시작 레이팅으로 한 번에 계산하므로
+    기간 단위로 벡터 연산이 가능하다. numpy가 없으면 같은 계산을 순수 파이썬으로 수행한다.
+    """
+    started = time.perf_counter()
+    np = optional_module("numpy")
+    index = {}  # player_id -> 배열 인덱스
+    player_ids = []
+    games_played = []
+    total_games = 0
+    if np is not None:
+        ratings, rds, last_period = np.zeros(0), np.zeros(0), np.zeros(0)
+    else:
+        state = {}  # 인덱스 -> [레이팅, RD, 마지막 기간]
+    buffered = []
+
+    def flush(rows):
+        nonlocal ratings, rds, last_period
+        size = len(player_ids)
+        if np is not None and size > len(ratings):
+            grow = max(size, len(ratings) * 2) - len(ratings)
+            ratings = np.concatenate((ratings, np.full(grow, float(DEFAULT_RATING))))
+            rds = np.concatenate((rds, np.full(grow, float(DEFAULT_RD))))
+            last_period = np.concatenate((last_period, np.full(grow, np.nan)))
+        if np is not None:
+            data = np.array(rows, dtype=np.float64)
+            periods, player1, player2, scores = data[:, 0], data[:, 1].astype(np.int64), data[:, 2].astype(np.int64), data[:, 3]
+            # 처음 등장한 플레이어는 현재 기간부터 시작
+            for column in (player1, player2):
+                fresh = np.isnan(last_period[column])
+                last_period[column[fresh]] = periods[0]
+            boundaries = np.flatnonzero(np.diff(periods)) + 1
+            for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(rows)]))):
+                apply_rating_period(ratings, rds, last_period, periods[start], player1[start:end], player2[start:end], scores[start:end])
+            return
+        period_start = 0
+        for idx in range(1, len(rows) + 1):
+            if idx < len(rows) and rows[idx][0] == rows[period_start][0]:
+                continue
+            period = rows[period_start][0]
+            results = {}
+            for _, player1, player2, score in rows[period_start:idx]:
+                for player in (player1, player2):
+                    if player not in state:
+                        state[player] = [DEFAULT_RATING, DEFAULT_RD, period]
+                    entry = state[player]
+                    results.setdefault(player, (entry[0], inflate_rd(entry[1], period - entry[2]), []))
+                results[player1][2].append((player2, score))
+                results[player2][2].append((player1, 1 - score))
+            for player, (rating, rd, games) in results.items():
+                opponents = [(results[opponent][0], results[opponent][1], score) for opponent, score in games]
+                state[player][0], state[player][1] = glicko_update(rating, rd, opponents)
+                state[player][2] = period
+            period_start = idx
+
+    cursor = conn.execute("SELECT played_at, player1_id, player2_id, winner_id FROM match_history ORDER BY played_at, match_id")
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        for played_at, player1_id, player2_id, winner_id in chunk:
+            for player_id in (player1_id, player2_id):
+                if player_id not in index:
+                    index[player_id] = len(player_ids)
+                    player_ids.append(player_id)
+                    games_played.append(0)
+            player1, player2 = index[player1_id], index[player2_id]
+            games_played[player1] += 1
+            games_played[player2] += 1
+            score = 0.5 if winner_id is None else float(winner_id == player1_id)
+            buffered.append((int(played_at // RATING_PERIOD), player1, player2, score))
+        total_games += len(chunk)
+        if not chunk:
+            if buffered:
+                flush(buffered)
+            break
+        # 마지막 기간은 다음 청크에 이어질 수 있으므로 남겨 둠
+        last = buffered[-1][0]
+        split = len(buffered)
+        while split > 0 and buffered[split - 1][0] == last:
+            split -= 1
+        if split:
+            flush(buffered[:split])
+            buffered = buffered[split:]
+
+    now = time.time()
+    if np is not None:
+        final = [(player_id, float(ratings[idx]), float(rds[idx]), games_played[idx], now) for idx, player_id in enumerate(player_ids)]
+    else:
+        final = [(player_id, state[idx][0], state[idx][1], games_played[idx], now) for idx, player_id in enumerate(player_ids)]
+    with conn:
+        conn.execute("DELETE FROM player_ratings")
+        conn.executemany("INSERT INTO player_ratings (player_id, rating, rd, games, last_played) VALUES (?, ?, ?, ?, ?)", final)
+    return {"games": total_games, "players": len(player_ids), "seconds": time.perf_counter() - started}
+
+# 분석용 내보내기 설정
+EXPORT_DIR = "exports"
+EXPORT_CHUNK_ROWS = 50000  # 파일 하나에 담는 행 수 (한 번에 메모리에 올리는 최대 행 수)
+ARCHIVE_COLUMNS = (
+    "archive_id", "game_id", "finished_at", "duration", "end_reason", "mode", "seed", "player1_id", "player2_id",
+    "winner_id", "rounds", "score1", "score2", "prize", "items_used1", "items_used2", "chambers"
+)
+
+def write_export_chunk(path, rows, file_format):
+    """행 묶음 하나를 파일 하나로 씀 (임시 파일에 쓴 뒤 교체해서 반쯤 쓴 파일이 남지 않게)"""
+    temp_path = f"{path}.tmp"
+    if file_format == "parquet":
+        columns = dict(zip(ARCHIVE_COLUMNS, (list(column) for column in zip(*rows))))
+        optional_module("pyarrow.parquet").write_table(optional_module("pyarrow").table(columns), temp_path)
+    else:
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(ARCHIVE_COLUMNS)
+            writer.writerows(rows)
+    os.replace(temp_path, path)
+
+def export_archive(db_path, file_format="csv", incremental=True, export_dir=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """game_archive를 archive_id 순으로 chunk_rows 행씩 읽어 청크 파일로 내보냄
+
+    incremental이면 형식별 워터마크(마지막으로 내보낸 archive_id) 다음 행부터 읽고, 파일 하나를 쓸 때마다 워터마크를
+    갱신해서 중간에 멈춰도 다음 실행이 이어서 내보낸다. archive_id는 커밋 순서대로 늘어나므로 빠지는 행이 없다.
+    """
+    if file_format not in ("csv", "parquet"):
+        raise ValueError(f"지원하지 않는 형식입니다: {file_format}")
+    if file_format == "parquet" and optional_module("pyarrow.parquet") is None:
+        raise ValueError("pyarrow가 설치되어 있지 않아 Parquet으로 내보낼 수 없습니다.")
+    export_dir = export_dir or EXPORT_DIR
+    os.makedirs(export_dir, exist_ok=True)
+    watermark_name = f"game_archive.{file_format}"
+    started = time.perf_counter()
+    reader = sqlite3.connect(db_path)
+    reader.execute("PRAGMA journal_mode=WAL")  # 읽는 도중에 다른 연결이 워터마크를 커밋하려면 WAL이어야 함
+    writer = sqlite3.connect(db_path)  # 워터마크 갱신은 읽기 스냅샷과 다른 연결에서
+    try:
+        row = writer.execute("SELECT last_archive_id FROM export_watermarks WHERE name = ?", (watermark_name,)).fetchone()
+        since = row[0] if row and incremental else 0
+        cursor = reader.execute(
+            f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM game_archive WHERE archive_id > ? ORDER BY archive_id", (since,)
+        )
+        files, total_rows, last_id = [], 0, since
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            path = os.path.join(export_dir, f"game_archive_{rows[0][0]:012d}_{rows[-1][0]:012d}.{file_format}")
+            write_export_chunk(path, rows, file_format)
+            last_id = rows[-1][0]
+            total_rows += len(rows)
+            files.append(path)
+            writer.execute(
+                '''INSERT INTO export_watermarks (name, last_archive_id, exported_at) VALUES (?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET last_archive_id = excluded.last_archive_id, exported_at = excluded.exported_at''',
+                (watermark_name, last_id, time.time())
+            )
+            writer.commit()
+        return {"files": files, "rows": total_rows, "since": since, "watermark": last_id, "seconds": time.perf_counter() - started}
+    finally:
+        reader.close()
+        writer.close()
+
+live_games = {}  # game_id -> 진행 중인 BuckshotGame (관전용)
+# end_game 이후의 게임을 약한 참조로 추적: 정상이라면 화면과 핸들러가 끝나는 대로 사라짐
+finished_games = weakref.WeakValueDictionary()
+LEAK_GRACE = 60.0  # end_game 이후 이 시간(초)이 지나도 살아 있으면 누수로 보고
+LEAK_CHECK_INTERVAL = 300.0
+# 누수 검사는 gc.collect()와 gc.get_referrers()로 힙 전체를 훑어 이벤트 루프를 멈추므로 디버그 실행에서만 켬
+LEAK_CHECK = bool(os.environ.get("BUCKSHOT_DEBUG"))
+
+# 동시 게임 수 제한 (한도 설정과 AdmissionControl은 두 룰셋이 함께 쓰도록 buckshot_core에 있음)
+class ClassicAdmission(AdmissionControl):
+    """클래식 룰셋의 한도: 하우스 AI 게임은 사람 플레이어만 세고, 재시작하면 DB의 게임 행에서 다시 셈"""
+    def game_entry(self, game):
+        humans = [player_id for player_id in game.seats if not (game.ai_difficulty and player_id == game.player2.id)]
+        return self.entry_for(game.status, game.guild_id, humans)
+
+    def rebuild(self, conn):
+        """DB에 남아 있는 이 프로세스의 초대 대기/진행 중 게임을 다시 셈 (재시작, 비정상 종료 후)"""
+        rows = conn.execute(
+            "SELECT game_id, guild_id, player1_id, player2_id, status FROM games WHERE ruleset = 'classic' AND status IN ('pending', 'active')"
+        ).fetchall()
+        # 봇 ID는 하우스 게임을 가려낼 때만 필요 (/bench startup처럼 로그인 없이 on_ready를 부르면 client.user가 없음)
+        bot_id = client.user.id if rows and client.user is not None else None
+        for game_id, guild_id, player1_id, player2_id, status in rows:
+            if game_id in self.tracked or game_id in live_games or not owns_guild(guild_id):
+                continue
+            humans = [player_id for player_id in (player1_id, player2_id) if player_id != bot_id]
+            self._track(game_id, self.entry_for(status, guild_id, humans))
+
+admission = ClassicAdmission()
+commit_observers.append(admission.record_commit)  # 모아 둔 커밋이 느려지면 과부하로 봄
+
+class SeatPair:
+    """두 플레이어의 값을 좌석 순서(player1, player2)로 담는 매핑
+
+    게임의 플레이어 ID 튜플 하나를 모든 SeatPair가 공유하고 값은 슬롯 두 개에 두므로 작은 dict보다 작다.
+    기존 dict처럼 플레이어 ID로 읽고 쓰며, 저장할 때는 dict(pair)로 바꿈.
+    """
+    __slots__ = ("ids", "first", "second")
+
+    def __init__(self, ids, first, second):
+        self.ids = ids
+        self.first = first
+        self.second = second
+
+    def __getitem__(self, player_id):
+        if player_id == self.ids[0]:
+            return self.first
+        if player_id == self.ids[1]:
+            return self.second
+        raise KeyError(player_id)
+
+    def __setitem__(self, player_id, value):
+        if player_id == self.ids[0]:
+            self.first = value
+        elif player_id == self.ids[1]:
+            self.second = value
+        else:
+            raise KeyError(player_id)
+
+    def get(self, player_id, default=None):
+        return self[player_id] if player_id in self.ids else default
+
+    def __contains__(self, player_id):
+        return player_id in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return 2
+
+    def keys(self):
+        return self.ids
+
+    def values(self):
+        return (self.first, self.second)
+
+    def items(self):
+        return ((self.ids[0], self.first), (self.ids[1], self.second))
+
+class ChamberKnowledge:
+    """플레이어 한 명이 아는 탄창 정보
+
+    탄 구성은 장전 때 공개되고 배출된 탄은 모두가 보므로 남은 실탄/공포탄 수는 모두 같고,
+    돋보기처럼 혼자 본 탄만 플레이어마다 다르다. 위치는 탄창 끝 기준(0이 마지막 탄)이라
+    앞에서 탄이 빠져도 남은 탄의 위치가 바뀌지 않으므로 모든 갱신이 탄창 길이와 무관하게 O(1)이다.
+    """
+    __slots__ = ("live", "blank", "known", "known_live")
+
+    def __init__(self, live=0, blank=0, known=None):
+        self.live = live
+        self.blank = blank
+        self.known = dict(known or {})  # 위치 -> 탄
+        self.known_live = sum(1 for bullet in self.known.values() if bullet == "live")
+
+    @classmethod
+    def from_chamber(cls, chamber, known=None):
+        """저장된 탄창에서 되살림 (스냅샷 복원용, 이때만 탄창을 셈)"""
+        return cls(chamber.count("live"), chamber.count("blank"), known)
+
+    @property
+    def remaining(self):
+        return self.live + self.blank
+
+    def learn(self, position, bullet):
+        """position 위치의 탄을 알게 됨 (돋보기, 버너폰)"""
+        if self.known.get(position) == "live":
+            self.known_live -= 1
+        self.known[position] = bullet
+        if bullet == "live":
+            self.known_live += 1
+
+    def eject(self, bullet):
+        """맨 앞의 탄이 빠져 공개됨 (샷, 맥주)"""
+        if bullet == "live":
+            self.live -= 1
+        else:
+            self.blank -= 1
+        if self.known.pop(self.remaining, None) == "live":
+            self.known_live -= 1
+
+    def invert(self, bullet):
+        """맨 앞의 탄이 bullet로 바뀜 (인버터). 바뀐 탄 구성이 공개되므로 그 탄을 알게 됨"""
+        if bullet == "live":
+            self.live, self.blank = self.live + 1, self.blank - 1
+        else:
+            self.live, self.blank = self.live - 1, self.blank + 1
+        self.learn(self.remaining - 1, bullet)
+
+    def live_odds(self, position=None):
+        """position(기본: 다음 탄)이 실탄일 확률을 (분자, 분모)로 반환. 남은 탄이 없으면 분모가 0"""
+        if position is None:
+            position = self.remaining - 1
+        bullet = self.known.get(position)
+        if bullet is not None:
+            return (1 if bullet == "live" else 0), 1
+        return self.live - self.known_live, self.remaining - len(self.known)
 
-init_db()
-init_json()
+class BuckshotGame(ItemHooks):
+    # 게임 수만큼 만들어지므로 인스턴스 dict 없이 슬롯으로 둠. 플레이어별 값은 SeatPair
+    __slots__ = (
+        "conn", "guild_id", "game_id", "rng", "player1", "player2", "seats", "round", "scores", "prize",
+        "last_message", "status", "double_or_nothing", "winner_id", "rated", "new_ratings", "end_callbacks", "last_embed",
+        "view", "ai_difficulty", "ai_task", "channel_id", "tournament_match", "item_usage", "items_used", "chambers",
+        "started_at", "ended_at", "hp", "max_hp", "chamber", "current_turn", "knife_active", "handcuff_active",
+        "jammer_active", "items", "knowledge", "pending_saves", "__weakref__",
+    )
 
-class BuckshotGame:
-    def __init__(self, player1, player2, double_or_nothing=False):
-        self.conn = sqlite3.connect("buckshot.db")
+    def __init__(self, player1, player2, double_or_nothing=False, seed=None, conn=None, guild_id=None):
+        self.conn = conn or get_db()
+        self.guild_id = guild_id  # 게임이 열린 길드 (이 길드를 맡는 샤드에서만 진행)
         self.game_id = str(uuid4())
+        self.rng = GameRNG(seed)
         self.player1 = player1
         self.player2 = player2
+        self.seats = (player1.id, player2.id)
         self.round = 1
-        self.scores = {player1.id: 0, player2.id: 0}
+        self.scores = SeatPair(self.seats, 0, 0)
         self.prize = 0
         self.last_message = None
         self.status = "pending"
         self.double_or_nothing = double_or_nothing
-        self.item_usage = {player1.id: {"담배": 0, "맥주": 0, "주사기": 0}, player2.id: {"담배": 0, "맥주": 0, "주사기": 0}}
+        self.winner_id = None
+        self.rated = False
+        self.new_ratings = None
+        self.end_callbacks = []  # end_game 시 호출되는 훅 (토너먼트 진출 처리 등)
+        self.last_embed = None  # 마지막으로 보낸 플레이어 화면 (관전 시작 시 사용)
+        self.view = None
+        self.ai_difficulty = None  # 하우스 AI 게임이면 난이도 (AI는 player2)
+        self.ai_task = None
+        self.channel_id = None  # 게임 화면이 게시된 채널 (build_game_view에서 설정)
+        self.tournament_match = None  # 토너먼트 경기면 (토너먼트 ID, 경기 ID)
+        self.item_usage = SeatPair(self.seats, dict.fromkeys(CHARGED_ITEMS, 0), dict.fromkeys(CHARGED_ITEMS, 0))
+        self.items_used = SeatPair(self.seats, {}, {})  # 분석용: 사용한 모든 아이템 횟수
+        self.chambers = []  # 분석용: 장전마다 [라운드, 실탄, 공포탄]
+        self.started_at = time.time()
+        self.ended_at = None
+        self.pending_saves = None  # action 안에서 미뤄 둔 저장 (None이면 action 밖)
         self._init_game_state()
         self._save_to_db()
-
-    def __del__(self):
-        self.conn.close()
+        live_games[self.game_id] = self
 
     def _init_game_state(self):
         if self.round == 1:
-            self.hp = {self.player1.id: 2, self.player2.id: 2}
+            self.hp = SeatPair(self.seats, 2, 2)
             self.max_hp = 2
             item_count = 2
         elif self.round == 2:
-            self.hp = {self.player1.id: 4, self.player2.id: 4}
+            self.hp = SeatPair(self.seats, 4, 4)
             self.max_hp = 4
             item_count = 2
         else:
-            self.hp = {self.player1.id: 6, self.player2.id: 6}
+            self.hp = SeatPair(self.seats, 6, 6)
             self.max_hp = 6
             item_count = 4
         self.chamber = []
         self.current_turn = self.player1.id
-        self.knife_active = {self.player1.id: False, self.player2.id: False}
-        self.handcuff_active = {self.player1.id: False, self.player2.id: False}
-        self.jammer_active = {self.player1.id: False, self.player2.id: False}
-        self.items = {self.player1.id: [], self.player2.id: []}
+        self.knife_active = SeatPair(self.seats, False, False)
+        self.handcuff_active = SeatPair(self.seats, False, False)
+        self.jammer_active = SeatPair(self.seats, False, False)
+        self.items = SeatPair(self.seats, [], [])
         self.assign_items(initial=True, count=item_count)
         self.load_chamber(skip_items=True)
         self._save_state()
 
+    def get_mode(self):
+        return "Double or Nothing" if self.double_or_nothing else "Normal"
+
     def assign_items(self, initial=False, count=2):
         """플레이어에게 아이템을 할당하는 메서드"""
-        item_pool = ["맥주", "돋보기", "담배", "칼", "수갑", "주사기", "버너폰", "인버터", "재머"]
-        if self.double_or_nothing:
-            item_pool.append("상한 약")
-        
+        mode = self.get_mode()
+        rng = self.rng.stream("items")
         for player_id in [self.player1.id, self.player2.id]:
             if initial:
                 self.items[player_id] = []
             # 현재 플레이어가 이미 가진 아이템 제외
-            available_items = [item for item in item_pool if item not in self.items[player_id]]
-            if len(available_items) < count:
-                count = len(available_items)
+            held_mask = ITEM_CONFIG.mask(self.items[player_id])
+            available_count = len(ITEM_POOLS[mode]) - bin(held_mask).count("1")
+            if available_count < count:
+                count = available_count
             if count > 0:
-                new_items = random.sample(available_items, count)
-                new_items = list(dict.fromkeys(new_items))  # 중복 아이템 제거
+                new_items = ITEM_CONFIG.draw(rng, count, mode, held_mask)
                 self.items[player_id].extend(new_items)
                 print(f"Assigned items to player {player_id}: {new_items}")  # 디버깅 로그
             self.items[player_id] = self.items[player_id][:8]  # 최대 8개 아이템 제한
-        save_items_to_json(self.game_id, self.player1.id, self.player2.id, self.items)
+        self.save_items()
 
     def load_chamber(self, skip_items=False):
-        if self.round == 1:
-            live = random.randint(1, 3)
-            blank = 2
-            item_count = 2
-        elif self.round == 2:
-            total_bullets = random.randint(2, 8)
-            live = random.randint(1, min(4, total_bullets - 1))
-            blank = total_bullets - live
-            item_count = 2
-        else:
-            total_bullets = random.randint(2, 8)
-            live = random.randint(1, min(4, total_bullets - 1))
-            blank = total_bullets - live
-            item_count = 4
-        self.chamber = ["live"] * live + ["blank"] * blank
-        random.shuffle(self.chamber)
+        item_count = 4 if self.round >= 3 else 2
+        self.chamber, live, blank = RULESET.draw_chamber(self.rng.stream("chamber"), self.round)
+        self.chambers.append([self.round, live, blank])
+        self.knowledge = SeatPair(self.seats, ChamberKnowledge(live, blank), ChamberKnowledge(live, blank))  # 플레이어별로 아는 탄
         if not skip_items:
             self.assign_items(initial=False, count=item_count)
             self._save_state()
-            return (f"샷건이 새로운 탄환으로 장전되었습니다! 🔴 실탄: {self.chamber.count('live')}발 | 🔵 공포탄: {self.chamber.count('blank')}발\n"
+            return (f"샷건이 새로운 탄환으로 장전되었습니다! 🔴 실탄: {live}발 | 🔵 공포탄: {blank}발\n"
                     f"각 플레이어에게 아이템 {item_count}개가 추가되었습니다!")
         self._save_state()
-        return f"샷건이 새로운 탄환으로 장전되었습니다! 🔴 실탄: {self.chamber.count('live')}발 | 🔵 공포탄: {self.chamber.count('blank')}발"
+        return f"샷건이 새로운 탄환으로 장전되었습니다! 🔴 실탄: {live}발 | 🔵 공포탄: {blank}발"
+
+    def pregenerate_chambers(self, n):
+        """현재 라운드 규칙으로 앞으로 장전될 탄창 n개를 미리 생성 (시뮬레이션용)"""
+        return self.rng.pregenerate("chamber", lambda rng: RULESET.draw_chamber(rng, self.round)[0], n)
+
+    def pregenerate_items(self, n, count=2):
+        """빈 인벤토리 기준으로 앞으로 n번의 아이템 배분 결과를 미리 생성 (시뮬레이션용)"""
+        mode = self.get_mode()
+        return self.rng.pregenerate("items", lambda rng: [ITEM_CONFIG.draw(rng, count, mode) for _ in range(2)], n)
 
     # 나머지 메서드들은 기존 코드와 동일하므로 생략
     # 전체 코드가 필요하면 요청해 주세요!
 
+    # 아이템 효과가 쓰는 훅 (ItemHooks): 탄 정보는 플레이어별 ChamberKnowledge에 반영
+    def bullet_ejected(self, bullet):
+        """앞에서 빠진 탄을 두 플레이어의 정보에 반영"""
+        for knowledge in self.knowledge.values():
+            knowledge.eject(bullet)
+
+    def bullet_revealed(self, index, user=None):
+        position = len(self.chamber) - 1 - index
+        for player_id, knowledge in self.knowledge.items():
+            if user is None or player_id == user:
+                knowledge.learn(position, self.chamber[index])
+
+    def bullet_inverted(self):
+        for knowledge in self.knowledge.values():
+            knowledge.invert(self.chamber[0])
+
+    def charge_item(self, user_id, name):
+        self.item_usage[user_id][name] += 1
+
+    def heal_locked(self, user_id):
+        return self.round == 3 and self.hp[user_id] <= 2
+
+    def hp_change(self, user_id, old_hp):
+        return ""  # 3라운드에서 체력을 숨기므로 아이템 결과에 체력을 쓰지 않음
+
+    def knock_out(self, user_id):
+        return None  # 체력 0은 다음 샷에서 라운드 종료로 처리
+
     def get_chamber_info(self):
-        live_count = self.chamber.count("live")
-        blank_count = self.chamber.count("blank")
-        return f"🔴 실탄: {live_count}발 | 🔵 공포탄: {blank_count}발"
+        knowledge = self.knowledge[self.player1.id]  # 남은 탄 수는 두 플레이어가 같음
+        return f"🔴 실탄: {knowledge.live}발 | 🔵 공포탄: {knowledge.blank}발"
 
     def get_hp_bar(self, player_id, viewer_id):
         current_hp = self.hp[player_id]
@@ -223,10 +782,9 @@ class BuckshotGame:
         empty = "⬜" * (max_hp - current_hp)
         return f"{hearts}{empty} ({current_hp}/{max_hp})"
 
-    def get_items(self):
-        """아이템을 JSON에서 로드"""
-        self.items = load_items_from_json(self.game_id, self.player1.id, self.player2.id)
-        return self.items
+    def save_items(self):
+        """아이템 변경을 저장 (아이템은 상태 행에 함께 들어가므로 상태 저장과 같음)"""
+        self._save_state()
 
     def start_new_round(self):
         self.round += 1
@@ -242,6 +800,7 @@ class BuckshotGame:
             reload_message = self.load_chamber()
             return None, False, 0, reload_message, False, False, 0
         bullet = self.chamber.pop(0)
+        self.bullet_ejected(bullet)
         extra_turn = False
         damage = 2 if self.knife_active[shooter_id] else 1
         knife_used = self.knife_active[shooter_id]
@@ -258,74 +817,48 @@ class BuckshotGame:
         elif target_id == shooter_id:
             extra_turn = True
         reload_message = None
-        if self.chamber.count("blank") == 0 and self.chamber.count("live") == 0:
+        if not self.chamber:
             reload_message = self.load_chamber()
         self._save_state()
         return bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp
 
     def use_item(self, user_id, item, opponent_id=None):
-        self.get_items()  # 최신 아이템 로드
         if item not in self.items[user_id]:
             return "해당 아이템을 가지고 있지 않습니다!"
+        self.items_used[user_id][item] = self.items_used[user_id].get(item, 0) + 1
         if self.jammer_active.get(opponent_id, False):
             self.jammer_active[opponent_id] = False
             self._save_state()
             return "재머: 상대의 재머로 인해 아이템 사용이 무효화되었습니다!"
-        if item == "맥주" and self.chamber:
-            self.item_usage[user_id]["맥주"] += 1
-            bullet = self.chamber.pop(0)
-            self._save_state()
-            return f"맥주: {'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}을 배출했습니다!"
-        elif item == "돋보기" and self.chamber:
-            return f"돋보기: 다음 탄환은 {'🔴 실탄' if self.chamber[0] == 'live' else '🔵 공포탄'}입니다!"
-        elif item == "담배":
-            if self.round == 3 and self.hp[user_id] <= 2:
-                return "담배: 체력 2 이하에서는 회복 불가!"
-            if self.hp[user_id] < 4:
-                self.item_usage[user_id]["담배"] += 1
-                self.hp[user_id] += 1
-                self._save_state()
-                return "담배: 체력 1 회복!"
-            return "담배: 이미 최대 체력입니다!"
-        elif item == "칼":
-            self.knife_active[user_id] = True
-            self._save_state()
-            return "칼: 다음 샷 대미지 2배!"
-        elif item == "수갑":
-            self.handcuff_active[user_id] = True
-            self._save_state()
-            return "수갑: 다음 상대 샷 후에도 턴을 유지합니다!"
-        elif item == "주사기" and opponent_id and self.items[opponent_id]:
-            self.item_usage[user_id]["주사기"] += 1
-            return "주사기: 상대의 아이템을 선택해 훔쳐 즉시 사용합니다."
-        elif item == "버너폰" and self.chamber:
-            if len(self.chamber) >= 3:
-                bullet_type = "실탄" if self.chamber[-1] == "live" else "공포탄"
-                self._save_state()
-                return f"버너폰: {len(self.chamber)}번째 탄은 {bullet_type}이야..."
-            elif len(self.chamber) == 2:
-                self._save_state()
-                return "버너폰: 안타깝게... 됐군..."
-            else:
-                return "버너폰: 잔탄이 너무 적어 사용할 수 없습니다!"
-        elif item == "인버터" and self.chamber:
-            self.chamber[0] = "live" if self.chamber[0] == "blank" else "blank"
-            self._save_state()
-            return "인버터: 다음 탄환의 상태가 변경되었습니다!"
-        elif item == "상한 약":
-            if random.random() < 0.5:
-                self.hp[user_id] = min(self.hp[user_id] + 2, self.max_hp)
-                self._save_state()
-                return "상한 약: 체력 2 회복!"
+        if item not in ITEMS:
+            return "아이템 사용 실패! 조건이 맞지 않습니다."
+        result, _ = ITEMS[item].apply(self, user_id, opponent_id)
+        self._save_state()
+        return result
+
+    def resolve_shot(self, shooter_id, target_id):
+        """샷 한 번과 그에 따른 턴 넘김, 라운드/게임 종료까지 처리 (버튼 없이 진행하는 AI와 시뮬레이션용)"""
+        bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = self.shoot(shooter_id, target_id)
+        outcome = {
+            "bullet": bullet, "damage": damage, "old_hp": old_hp, "reload_message": reload_message,
+            "handcuff_used": handcuff_used, "knife_used": knife_used,
+            "round_winner": None, "game_end": None, "new_round": False,
+        }
+        if self.hp[target_id] <= 0:
+            winner_id = self.player2.id if target_id == self.player1.id else self.player1.id
+            self.scores[winner_id] += 1
+            outcome["round_winner"] = winner_id
+            game_end = self.check_game_end()
+            if game_end is None and not self.start_new_round():
+                game_end = self.check_game_end()
+            if game_end:
+                outcome["game_end"] = game_end
+                self.end_game()
             else:
-                self.hp[user_id] = max(self.hp[user_id] - 1, 0)
-                self._save_state()
-                return "상한 약: 체력 1 감소!"
-        elif item == "재머" and opponent_id:
-            self.jammer_active[opponent_id] = True
-            self._save_state()
-            return "재머: 상대의 다음 아이템 사용을 무효화합니다!"
-        return "아이템 사용 실패! 조건이 맞지 않습니다."
+                outcome["new_round"] = True
+        elif bullet and not (extra_turn if target_id == shooter_id else handcuff_used):
+            self.switch_turn()
+        return outcome
 
     def switch_turn(self):
         self.current_turn = self.player2.id if self.current_turn == self.player1.id else self.player1.id
@@ -334,472 +867,1478 @@ class BuckshotGame:
     def check_game_end(self):
         if self.round >= 3:
             if self.scores[self.player1.id] > self.scores[self.player2.id]:
+                self.winner_id = self.player1.id
                 self.prize = self.calculate_prize(self.player1.id)
                 self.update_player_money(self.player1.id, self.prize)
-                return f"{self.player1.display_name} 최종 승리! 🏆 상금: ${self.prize:,} ({self.scores[self.player1.id]}:{self.scores[self.player2.id]})"
+                result = f"{self.player1.display_name} 최종 승리! 🏆 상금: ${self.prize:,} ({self.scores[self.player1.id]}:{self.scores[self.player2.id]}) | 시드: {self.rng.seed}"
             elif self.scores[self.player2.id] > self.scores[self.player1.id]:
+                self.winner_id = self.player2.id
                 self.prize = self.calculate_prize(self.player2.id)
                 self.update_player_money(self.player2.id, self.prize)
-                return f"{self.player2.display_name} 최종 승리! 🏆 상금: ${self.prize:,} ({self.scores[self.player1.id]}:{self.scores[self.player2.id]})"
-            return f"무승부! (${self.prize:,}) ({self.scores[self.player1.id]}:{self.scores[self.player2.id]})"
+                result = f"{self.player2.display_name} 최종 승리! 🏆 상금: ${self.prize:,} ({self.scores[self.player1.id]}:{self.scores[self.player2.id]}) | 시드: {self.rng.seed}"
+            else:
+                result = f"무승부! (${self.prize:,}) ({self.scores[self.player1.id]}:{self.scores[self.player2.id]}) | 시드: {self.rng.seed}"
+            if not self.rated:
+                self.rated = True
+                self.new_ratings = record_match_result(self.conn, self.game_id, self.player1.id, self.player2.id, self.winner_id)
+            rating1, rating2 = self.new_ratings
+            return f"{result}\n레이팅: {self.player1.display_name} {rating1:.0f} | {self.player2.display_name} {rating2:.0f}"
         return None
 
     def calculate_prize(self, winner_id):
         base_prize = 70000
-        usage = self.item_usage.get(winner_id, {"담배": 0, "맥주": 0, "주사기": 0})
-        deductions = (usage["담배"] * 220) + (usage["맥주"] * 495) + (usage["주사기"] * 3000)
+        usage = self.item_usage.get(winner_id, {})
+        deductions = sum(usage.get(name, 0) * ITEMS[name].cost for name in CHARGED_ITEMS)
         return max(0, base_prize - deductions)
 
     def update_player_money(self, player_id, prize):
-        c = self.conn.cursor()
-        c.execute("SELECT total_money, item_usage_history FROM player_money WHERE player_id = ?", (player_id,))
-        result = c.fetchone()
-        if result:
-            total_money, usage_history = result
-            usage_history = json.loads(usage_history)
-            for item, count in self.item_usage[player_id].items():
-                usage_history[item] = usage_history.get(item, 0) + count
-            total_money += prize
-            c.execute("UPDATE player_money SET total_money = ?, item_usage_history = ? WHERE player_id = ?",
-                      (total_money, json.dumps(usage_history), player_id))
-        else:
-            usage_history = self.item_usage[player_id]
-            c.execute("INSERT INTO player_money (player_id, total_money, item_usage_history) VALUES (?, ?, ?)",
-                      (player_id, prize, json.dumps(usage_history)))
-        self.conn.commit()
+        """하우스 -> 우승자 상금 거래를 원장 정산 대기열에 올림 (잔액과 아이템 사용 내역은 정산 때 반영)"""
+        reason = "double_or_nothing_prize" if self.double_or_nothing else "prize"
+        batch = ("tournament", self.tournament_match[0]) if self.tournament_match else None
+        post_transaction(self.conn, self.game_id, reason, [(HOUSE_ACCOUNT, -prize), (player_id, prize)],
+                         usage={player_id: self.item_usage[player_id]}, batch=batch)
+
+    @contextmanager
+    def action(self, handler=None):
+        """행동 하나(샷, 아이템 사용 등)를 한 작업 단위로 처리
+
+        안에서 일어난 변경은 메모리에만 적용했다가 끝날 때 게임 행과 상태 행(아이템 포함)을
+        한 쓰기 트랜잭션으로 바로 커밋한다 (같은 저장을 여러 번 요청해도 한 번만 씀).
+        도중에 예외가 나면 아무것도 쓰지 않고 메모리 상태를 시작 시점으로 되돌린다.
+        handler를 주면 compute, persist 단계 시간을 잰다.
+        """
+        if self.pending_saves is not None:  # 이미 action 안이면 바깥 작업 단위에 합침
+            yield self
+            return
+        checkpoint = copy.deepcopy((self.to_snapshot(), self.status))
+        self.pending_saves = set()
+        try:
+            with timed_stage("compute", handler) if handler else nullcontext():
+                yield self
+        except BaseException:
+            self.pending_saves = None
+            if self.status != "finished":  # end_game은 행을 바로 지우므로 되돌릴 것이 없음
+                self._restore(*checkpoint)
+            raise
+        with timed_stage("persist", handler) if handler else nullcontext():
+            self.persist()
+
+    def _restore(self, state, status):
+        """action을 시작한 시점의 상태로 되돌림"""
+        self._load_progress(state)
+        self.status = status
+
+    def persist(self):
+        """action에서 미뤄 둔 저장을 한 트랜잭션으로 씀 (모아서 커밋하지 않고 바로 커밋)"""
+        pending, self.pending_saves = self.pending_saves, None
+        if not pending:
+            return
+        with write_transaction(self.conn):
+            if "game" in pending:
+                self._write_game_row()
+            if "state" in pending:
+                self._write_state_row()
+        if "game" in pending:
+            admission.update(self)
 
     def _save_to_db(self):
-        c = self.conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO games (game_id, player1_id, player2_id, round, scores, status, prize, double_or_nothing)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (self.game_id, self.player1.id, self.player2.id, self.round, json.dumps(self.scores), self.status, self.prize, self.double_or_nothing))
-        self.conn.commit()
+        if self.pending_saves is not None:
+            self.pending_saves.add("game")
+            return
+        self._write_game_row()
+        request_commit(self.conn)
+        admission.update(self)
 
     def _save_state(self):
+        if self.pending_saves is not None:
+            self.pending_saves.add("state")
+            return
+        self._write_state_row()
+        request_commit(self.conn)
+
+    def _write_game_row(self):
+        io_stats["db_writes"] += 1
         c = self.conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO game_states (game_id, turn, current_turn_id, hp, chamber, knife_active, handcuff_active, jammer_active, item_usage)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (self.game_id, self.round, self.current_turn, json.dumps(self.hp), json.dumps(self.chamber),
-                   json.dumps(self.knife_active), json.dumps(self.handcuff_active),
-                   json.dumps(self.jammer_active), json.dumps(self.item_usage)))
-        self.conn.commit()
+        c.execute('''INSERT OR REPLACE INTO games (game_id, player1_id, player2_id, round, scores, status, prize, double_or_nothing, seed, guild_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (self.game_id, self.player1.id, self.player2.id, self.round, json.dumps(dict(self.scores)), self.status, self.prize, self.double_or_nothing,
+                   self.rng.seed, self.guild_id))
+
+    def _write_state_row(self):
+        io_stats["db_writes"] += 1
+        c = self.conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO game_states (game_id, turn, current_turn_id, hp, chamber, knife_active, handcuff_active, jammer_active, item_usage, rng_state, items)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (self.game_id, self.round, self.current_turn, json.dumps(dict(self.hp)), json.dumps(self.chamber),
+                   json.dumps(dict(self.knife_active)), json.dumps(dict(self.handcuff_active)),
+                   json.dumps(dict(self.jammer_active)), json.dumps(dict(self.item_usage)), self.rng.get_state(),
+                   json.dumps(dict(self.items), ensure_ascii=False)))
 
-    def end_game(self):
+    def end_game(self, reason="finished"):
+        if self.status == "finished":
+            return
+        if self.status == "active":
+            self._archive(reason)
+        self.status = "finished"
+        live_games.pop(self.game_id, None)
+        admission.update(self)
+        if self.pending_saves:
+            self.pending_saves.clear()  # 행을 지우므로 미뤄 둔 저장은 버림
         c = self.conn.cursor()
         c.execute("DELETE FROM games WHERE game_id = ?", (self.game_id,))
         c.execute("DELETE FROM game_states WHERE game_id = ?", (self.game_id,))
-        self.conn.commit()
-        delete_items_from_json(self.game_id)
+        request_commit(self.conn)
+        for callback in self.end_callbacks:
+            callback(self)
+        self.teardown()
 
-# 나머지 코드는 기존과 동일 (명령어, 이벤트 핸들러 등)
-# 전체 코드가 필요하면 요청해 주세요!
+    def teardown(self):
+        """끝난 게임이 붙잡고 있던 화면, AI 작업, 훅을 놓음
 
-@tree.command(name="buckshot", description="다른 유저와 벅샷 룰렛 대결을 시작합니다!")
-@app_commands.describe(opponent="대결할 상대를 선택하세요", mode="게임 모드: Normal 또는 Double or Nothing")
-async def buckshot(interaction: discord.Interaction, opponent: discord.Member, mode: str = "Normal"):
-    print(f"Received /buckshot command from {interaction.user.id} for opponent {opponent.id} with mode {mode}")
-    if opponent == interaction.user:
-        await interaction.response.send_message("자신과 대결할 수 없습니다!", ephemeral=True)
-        return
-    if opponent.bot:
-        await interaction.response.send_message("봇과 대결할 수 없습니다!", ephemeral=True)
-        return
-    if mode not in ["Normal", "Double or Nothing"]:
-        await interaction.response.send_message("유효하지 않은 모드입니다! Normal 또는 Double or Nothing을 선택하세요.", ephemeral=True)
-        return
+        버튼 콜백 클로저가 게임을 참조하므로 화면을 멈추고 비워야 게임이 바로 해제된다.
+        이후에도 살아 있으면 finished_games를 통해 누수로 보고된다.
+        """
+        if self.view is not None:
+            self.view.stop()
+            self.view.clear_items()
+            self.view = None
+        if self.ai_task is not None:
+            try:
+                current = asyncio.current_task()
+            except RuntimeError:
+                current = None
+            if self.ai_task is not current:
+                self.ai_task.cancel()
+            self.ai_task = None
+        self.end_callbacks = []
+        self.last_embed = None
+        self.ended_at = time.monotonic()
+        finished_games[self.game_id] = self
 
-    with sqlite3.connect("buckshot.db") as conn:
-        c = conn.execute("SELECT game_id FROM games WHERE (player1_id = ? OR player2_id = ?) AND status = 'active'",
-                         (interaction.user.id, interaction.user.id))
-        if c.fetchone():
-            await interaction.response.send_message("이미 진행 중인 게임이 있습니다!", ephemeral=True)
-            return
+    def _archive(self, reason):
+        """끝난 게임을 분석용 game_archive에 한 행으로 기록 (reason: finished 또는 timeout)"""
+        order = (self.player1.id, self.player2.id)
+        self.conn.execute(
+            '''INSERT INTO game_archive (game_id, finished_at, duration, end_reason, mode, seed, player1_id, player2_id,
+                                          winner_id, rounds, score1, score2, prize, items_used1, items_used2, chambers)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (self.game_id, time.time(), time.time() - self.started_at, reason, self.get_mode(), self.rng.seed,
+             self.player1.id, self.player2.id, self.winner_id, min(self.round, 3),
+             self.scores[order[0]], self.scores[order[1]], self.prize,
+             json.dumps(self.items_used[order[0]], ensure_ascii=False), json.dumps(self.items_used[order[1]], ensure_ascii=False),
+             json.dumps(self.chambers))
+        )
+        request_commit(self.conn)
 
-    double_or_nothing = mode == "Double or Nothing"
-    game = BuckshotGame(interaction.user, opponent, double_or_nothing=double_or_nothing)
-    current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-    game.get_items()  # 초기 아이템 로드
-    embed = discord.Embed(
-        title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-        description=f"{interaction.user.mention} vs {opponent.mention}",
-        color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-    )
-    embed.add_field(
-        name=f"{interaction.user.display_name} 체력",
-        value=game.get_hp_bar(interaction.user.id, interaction.user.id),
-        inline=True
+    def to_snapshot(self):
+        """종료 스냅샷에 넣을 상태 (플레이어별 값은 player1, player2 순서의 리스트)"""
+        order = (self.player1.id, self.player2.id)
+        return {
+            "game_id": self.game_id,
+            "players": [[player.id, player.display_name] for player in (self.player1, self.player2)],
+            "channel_id": self.channel_id,
+            "guild_id": self.guild_id,
+            "double_or_nothing": self.double_or_nothing,
+            "ai_difficulty": self.ai_difficulty,
+            "tournament_match": self.tournament_match,
+            "rng_state": self.rng.get_state(),
+            "round": self.round,
+            "prize": self.prize,
+            "current_turn": self.current_turn,
+            "max_hp": self.max_hp,
+            "chamber": self.chamber,
+            "scores": [self.scores[player_id] for player_id in order],
+            "hp": [self.hp[player_id] for player_id in order],
+            "knife_active": [self.knife_active[player_id] for player_id in order],
+            "handcuff_active": [self.handcuff_active[player_id] for player_id in order],
+            "jammer_active": [self.jammer_active[player_id] for player_id in order],
+            "item_usage": [self.item_usage[player_id] for player_id in order],
+            "items": [self.items[player_id] for player_id in order],
+            "known": [sorted(self.knowledge[player_id].known.items()) for player_id in order],
+            "items_used": [self.items_used[player_id] for player_id in order],
+            "chambers": self.chambers,
+            "started_at": self.started_at,
+        }
+
+    def _load_progress(self, state):
+        """스냅샷에서 진행 중에 바뀌는 값(라운드, 체력, 탄창 등)을 읽어 들임"""
+        order = self.seats
+        self.rng = GameRNG.from_state(state["rng_state"])
+        self.round = state["round"]
+        self.prize = state["prize"]
+        self.current_turn = state["current_turn"]
+        self.max_hp = state["max_hp"]
+        self.chamber = state["chamber"]
+        self.scores = SeatPair(order, *state["scores"])
+        self.hp = SeatPair(order, *state["hp"])
+        self.knife_active = SeatPair(order, *state["knife_active"])
+        self.handcuff_active = SeatPair(order, *state["handcuff_active"])
+        self.jammer_active = SeatPair(order, *state["jammer_active"])
+        self.item_usage = SeatPair(order, *state["item_usage"])
+        self.knowledge = SeatPair(order, *(ChamberKnowledge.from_chamber(self.chamber, dict(known)) for known in state["known"]))
+        self.items_used = SeatPair(order, *state.get("items_used", [{}, {}]))
+        self.chambers = state.get("chambers", [])
+        if "items" in state:  # 아이템이 없는 이전 스냅샷은 from_snapshot이 상태 행에서 읽음
+            self.items = SeatPair(order, *state["items"])
+
+    @classmethod
+    def from_snapshot(cls, state, conn=None):
+        """스냅샷 상태로 게임을 되살림 (DB 행은 이미 있으므로 새로 쓰지 않고, live_games 등록은 호출하는 쪽에서)"""
+        game = cls.__new__(cls)
+        game.conn = conn or get_db()
+        game.game_id = state["game_id"]
+        game.player1, game.player2 = (StoredPlayer(player_id, name) for player_id, name in state["players"])
+        order = game.seats = (game.player1.id, game.player2.id)
+        game.channel_id = state["channel_id"]
+        game.guild_id = state["guild_id"]
+        game.double_or_nothing = state["double_or_nothing"]
+        game.ai_difficulty = state["ai_difficulty"]
+        game.tournament_match = tuple(state["tournament_match"]) if state["tournament_match"] else None
+        game._load_progress(state)
+        game.started_at = state.get("started_at", time.time())
+        game.ended_at = None
+        game.pending_saves = None
+        if "items" not in state:
+            game.items = SeatPair(order, *load_saved_items(game.conn, game.game_id, order))
+        game.status = "active"
+        game.winner_id = None
+        game.rated = False
+        game.new_ratings = None
+        game.end_callbacks = []
+        game.last_message = None
+        game.last_embed = None
+        game.view = None
+        game.ai_task = None
+        return game
+
+# 관전 설정
+SPECTATOR_PUBLIC_FIELDS = ("장전", "결과", "수갑 효과", "탄환", "라운드 종료", "새 라운드", "게임 종료")  # 관전 화면에 그대로 옮기는 공개 필드
+MAX_SPECTATORS_PER_GAME = 100
+
+def render_spectator_embed(game, embed=None):
+    """관전용 화면 생성 (아이템과 3라운드 체력 2 이하의 체력은 숨김)"""
+    current_player = game.player1 if game.current_turn == game.player1.id else game.player2
+    spectator_embed = discord.Embed(
+        title=f"👀 관전 | 벅샷 룰렛 🔫 | 라운드 {min(game.round, 3)}/3 | {current_player.display_name}의 턴 | 모드: {game.get_mode()}",
+        description=f"{game.player1.mention} vs {game.player2.mention}",
+        color=discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
     )
-    embed.add_field(
-        name=f"{opponent.display_name} 체력",
-        value=game.get_hp_bar(opponent.id, interaction.user.id),
+    for field in (embed.fields if embed else []):
+        if field.name in SPECTATOR_PUBLIC_FIELDS:
+            spectator_embed.add_field(name=field.name, value=field.value, inline=field.inline)
+    for player in (game.player1, game.player2):
+        spectator_embed.add_field(name=f"{player.display_name} 체력", value=game.get_hp_bar(player.id, None), inline=True)
+    spectator_embed.add_field(
+        name="스코어",
+        value=f"{game.player1.display_name}: {game.scores[game.player1.id]} | {game.player2.display_name}: {game.scores[game.player2.id]}",
         inline=True
     )
-    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-    embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[interaction.user.id]) or "없음", inline=False)
-    embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-    embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
+    if game.status == "finished":
+        spectator_embed.set_footer(text="경기가 종료되었습니다.")
+    return spectator_embed
+
+class SpectatorSubscription:
+    """관전자 한 명(채널 하나)의 전송 담당
+
+    최신 상태 칸 하나만 두고, 전송이 밀리면 중간 상태는 버리고 마지막 상태만 보낸다.
+    """
+    def __init__(self, sink):
+        self.sink = sink  # async (state) -> None
+        self.latest = None
+        self.closing = False
+        self.sent = 0
+        self.coalesced = 0
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def offer(self, state):
+        if self.latest is not None:
+            self.coalesced += 1
+        self.latest = state
+        self.wakeup.set()
+
+    def close(self):
+        self.closing = True
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            state, self.latest = self.latest, None
+            if state is not None:
+                try:
+                    await self.sink(state)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"Spectator update failed: {e}")  # 디버깅 로그
+            if self.closing and self.latest is None:
+                return
+
+class SpectatorHub:
+    """게임 상태를 관전자에게 퍼뜨리는 발행/구독 허브
+
+    publish는 게임당 한 번만 렌더링하고 각 구독의 최신 상태 칸을 바꾼 뒤 바로 반환한다.
+    실제 전송은 구독별 태스크가 하므로 느린 관전 채널이 플레이어 화면 갱신을 지연시키지 않는다.
+    """
+    def __init__(self, renderer=render_spectator_embed):
+        self.renderer = renderer
+        self.subscriptions = {}  # game_id -> {key: SpectatorSubscription}
+
+    def subscribe(self, game, key, sink, embed=None):
+        subscriptions = self.subscriptions.setdefault(game.game_id, {})
+        if key in subscriptions:
+            return None
+        subscription = SpectatorSubscription(sink)
+        subscriptions[key] = subscription
+        subscription.offer(self.renderer(game, embed if embed is not None else getattr(game, "last_embed", None)))
+        return subscription
+
+    def unsubscribe(self, game_id, key):
+        subscription = self.subscriptions.get(game_id, {}).pop(key, None)
+        if subscription:
+            subscription.close()
+        return subscription is not None
+
+    def publish(self, game, embed=None):
+        subscriptions = self.subscriptions.get(game.game_id)
+        if not subscriptions:
+            return
+        state = self.renderer(game, embed)
+        for subscription in subscriptions.values():
+            subscription.offer(state)
+        if game.status == "finished":
+            self.close_game(game.game_id)
+
+    def close_game(self, game_id):
+        for subscription in self.subscriptions.pop(game_id, {}).values():
+            subscription.close()
+
+    def count(self, game_id):
+        return len(self.subscriptions.get(game_id, {}))
+
+spectator_hub = SpectatorHub()
+
+def publish_game_state(game, embed):
+    """플레이어 화면을 보내기 직전에 호출 (관전 안내를 붙이고 관전자에게 발행)"""
+    spectators = spectator_hub.count(game.game_id)
+    embed.set_footer(text=f"관전: /spectate {game.game_id}" + (f" | 👀 {spectators}" if spectators else ""))
+    game.last_embed = embed
+    spectator_hub.publish(game, embed)
+
+class SpectatorMessageSink:
+    """관전 채널에 메시지 하나를 보내고 이후에는 그 메시지를 수정"""
+    def __init__(self, channel):
+        self.channel = channel
+        self.message = None
+
+    async def __call__(self, state):
+        if self.message is None:
+            self.message = await self.channel.send(embed=state)
+        else:
+            await self.message.edit(embed=state)
+
+# 나머지 코드는 기존과 동일 (명령어, 이벤트 핸들러 등)
+# 전체 코드가 필요하면 요청해 주세요!
+
+# 상호작용 기록 파일: <BUCKSHOT_RECORD>-classic[-샤드 번호].jsonl (buckshot_core.InteractionRecorder)
+def component_action(custom_id, is_select=False):
+    """컴포넌트의 동작 이름 (게임 버튼은 custom_id 'bs:<게임 ID>:<동작>'의 동작, 아이템 선택 메뉴는 'select')"""
+    if custom_id and custom_id.startswith("bs:"):
+        return custom_id.rsplit(":", 1)[1]
+    return "select" if is_select else None
+
+recorder = InteractionRecorder(record_path("classic"), "classic", component_action)
+
+def build_odds_embed(game, player_id):
+    """플레이어 본인이 아는 정보만으로 계산한 탄 확률 화면 (본인에게만 보임)"""
+    knowledge = game.knowledge[player_id]
+    embed = discord.Embed(title="🎲 확률", description="당신이 아는 정보만으로 계산했습니다.", color=discord.Color.dark_grey())
+    embed.add_field(name="남은 탄", value=f"🔴 실탄: {knowledge.live}발 | 🔵 공포탄: {knowledge.blank}발", inline=False)
+    known = [
+        f"{knowledge.remaining - position}번째: {'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}"
+        for position, bullet in sorted(knowledge.known.items(), reverse=True)
+    ]
+    embed.add_field(name="확인한 탄", value="\n".join(known) or "없음", inline=False)
+    live, total = knowledge.live_odds()
+    if total == 0:
+        odds = "남은 탄이 없습니다. 다음 샷에서 새로 장전됩니다."
+    elif knowledge.remaining - 1 in knowledge.known:
+        odds = f"{live * 100}% (확인함)"
+    else:
+        odds = f"{live}/{total} ({live / total:.0%})"
+    embed.add_field(name="다음 탄이 실탄일 확률", value=odds, inline=False)
+    return embed
+
+def build_game_view(game, channel_id):
+    """게임 화면(embed)과 조작 버튼(view)을 생성"""
+    player1 = game.player1
+    opponent = game.player2
+    embed = render_game_embed(game, RULESET, viewer_id=player1.id, show_chamber=True)
 
     view = discord.ui.View(timeout=300)
+    game.view = view
+    game.channel_id = channel_id
 
     async def on_timeout():
-        game.end_game()
-        channel = client.get_channel(interaction.channel_id)
-        if game.last_message:
-            await game.last_message.edit(content="게임이 타임아웃으로 종료되었습니다.", view=None, embed=None)
+        message = game.last_message
+        game.end_game("timeout")
+        spectator_hub.publish(game, discord.Embed(title="게임 종료").add_field(name="게임 종료", value="게임이 타임아웃으로 종료되었습니다.", inline=False))
+        channel = client.get_channel(channel_id)
+        if message:
+            await message.edit(content="게임이 타임아웃으로 종료되었습니다.", view=None, embed=None)
         else:
             await channel.send("게임이 타임아웃으로 종료되었습니다.")
 
     view.on_timeout = on_timeout
 
-    shoot_self = discord.ui.Button(label="자신 쏘기", style=discord.ButtonStyle.red, emoji="🔫")
+    async def interaction_check(interaction: discord.Interaction):
+        recorder.record(game.game_id, interaction)
+        return await throttle(interaction, game.game_id, game.seats)
+
+    view.interaction_check = interaction_check
+
+    def other_player(player_id):
+        return opponent if player_id == player1.id else player1
+
+    async def turn_taken(interaction, actor):
+        """ack를 보내는 동안 같은 게임의 다른 클릭이 먼저 처리됐는지 다시 확인하고, 그렇다면 알림
+
+        확인과 처리 사이에 await가 없어야 하므로 호출한 쪽은 False를 받은 뒤 바로 game.action()에 들어간다.
+        """
+        if game.status == "active" and actor.id == game.current_turn:
+            return False
+        await interaction.followup.send("당신의 턴이 아닙니다!", ephemeral=True)
+        return True
+
+    def end_round(winner, events):
+        """체력이 0이 된 라운드를 winner의 승리로 끝내고 게임 종료나 새 라운드를 처리
+
+        화면에 붙일 (events, results, 탄환 표시 여부)를 반환한다. 새 라운드가 시작되면 이전 결과 대신 새 라운드 안내만 남긴다.
+        """
+        game.scores[winner.id] += 1
+        results = [("라운드 종료", f"{winner.display_name}이(가) 라운드 {game.round} 승리!")]
+        game_end = game.check_game_end()
+        if not game_end and game.start_new_round():
+            return [("새 라운드", f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.")], [], True
+        results.append(("게임 종료", game_end or game.check_game_end()))
+        view.clear_items()
+        game.end_game()
+        return events, results, False
+
+    # 버튼 ID를 게임 ID로 고정해 두면 재시작 후에도 이전 메시지의 버튼으로 게임을 이어갈 수 있음
+    shoot_self = discord.ui.Button(label="자신 쏘기", style=discord.ButtonStyle.red, emoji="🔫", custom_id=f"bs:{game.game_id}:shoot_self")
     async def shoot_self_callback(button_interaction: discord.Interaction):
-        if button_interaction.user.id != game.current_turn:
+        actor = button_interaction.user
+        if actor.id != game.current_turn:
             await button_interaction.response.send_message("당신의 턴이 아닙니다!", ephemeral=True)
             return
-        shoot_self.disabled = True
-        shoot_opponent.disabled = True
-        use_item.disabled = True
-        bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = game.shoot(button_interaction.user.id, button_interaction.user.id)
-        current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-        show_chamber = bool(reload_message)
-        game.get_items()  # 최신 아이템 로드
-        embed = discord.Embed(
-            title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-            description=f"{interaction.user.mention} vs {opponent.mention}",
-            color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-        )
-        if reload_message:
-            embed.add_field(name="장전", value=reload_message, inline=False)
-        else:
-            result = f"{'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}! "
-            if bullet == "live":
-                result += f"{button_interaction.user.display_name}이(가) {damage} 피해를 입었습니다! "
-                if knife_used:
-                    result += "(칼 효과: 대미지 2배) "
-                result += f"(체력: {old_hp} → {game.hp[button_interaction.user.id]})"
-            else:
-                result += f"{button_interaction.user.display_name}에게 피해 없음! (추가 턴)"
-            embed.add_field(name="결과", value=result, inline=False)
-        embed.add_field(
-            name=f"{interaction.user.display_name} 체력",
-            value=game.get_hp_bar(interaction.user.id, button_interaction.user.id),
-            inline=True
-        )
-        embed.add_field(
-            name=f"{opponent.display_name} 체력",
-            value=game.get_hp_bar(opponent.id, button_interaction.user.id),
-            inline=True
-        )
-        if show_chamber:
-            embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-        embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[button_interaction.user.id]) or "없음", inline=False)
-        embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-        embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[button_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
-
-        if game.hp[button_interaction.user.id] <= 0:
-            game.scores[opponent.id] += 1
-            embed.add_field(name="라운드 종료", value=f"{opponent.display_name}이(가) 라운드 {game.round} 승리!", inline=False)
-            game_end = game.check_game_end()
-            if game_end:
-                embed.add_field(name="게임 종료", value=game_end, inline=False)
-                view.clear_items()
-                game.end_game()
+        await acknowledge(button_interaction, "shoot_self")
+        if await turn_taken(button_interaction, actor):
+            return
+        with game.action("shoot_self"):
+            shoot_self.disabled = True
+            shoot_opponent.disabled = True
+            use_item.disabled = True
+            bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = game.shoot(actor.id, actor.id)
+            show_chamber = bool(reload_message)
+            if reload_message:
+                events = [("장전", reload_message)]
             else:
-                if not game.start_new_round():
-                    game_end = game.check_game_end()
-                    embed.add_field(name="게임 종료", value=game_end, inline=False)
-                    view.clear_items()
-                    game.end_game()
+                result = f"{'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}! "
+                if bullet == "live":
+                    result += f"{actor.display_name}이(가) {damage} 피해를 입었습니다! "
+                    if knife_used:
+                        result += "(칼 효과: 대미지 2배) "
+                    result += f"(체력: {old_hp} → {game.hp[actor.id]})"
                 else:
-                    current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-                    game.get_items()
-                    embed = discord.Embed(
-                        title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-                        description=f"{interaction.user.mention} vs {opponent.mention}",
-                        color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-                    )
-                    embed.add_field(name="새 라운드", value=f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.", inline=False)
-                    embed.add_field(
-                        name=f"{interaction.user.display_name} 체력",
-                        value=game.get_hp_bar(interaction.user.id, button_interaction.user.id),
-                        inline=True
-                    )
-                    embed.add_field(
-                        name=f"{opponent.display_name} 체력",
-                        value=game.get_hp_bar(opponent.id, button_interaction.user.id),
-                        inline=True
-                    )
-                    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                    embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[button_interaction.user.id]) or "없음", inline=False)
-                    embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-                    embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[button_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
-        else:
-            if bullet and not extra_turn:
+                    result += f"{actor.display_name}에게 피해 없음! (추가 턴)"
+                events = [("결과", result)]
+            results = []
+            if game.hp[actor.id] <= 0:
+                events, results, new_round = end_round(other_player(actor.id), events)
+                show_chamber = show_chamber or new_round
+            elif bullet and not extra_turn:
                 game.switch_turn()
-            current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-            embed.title = f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}"
-            embed.color = discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
+            embed = render_game_embed(game, RULESET, events, results, viewer_id=actor.id, show_chamber=show_chamber)
 
-        shoot_self.disabled = False
-        shoot_opponent.disabled = False
-        use_item.disabled = False
-        if game.last_message:
-            await game.last_message.delete()
-        game.last_message = await button_interaction.response.send_message(embed=embed, view=view)
+            shoot_self.disabled = False
+            shoot_opponent.disabled = False
+            use_item.disabled = False
+        with timed_stage("render", "shoot_self"):
+            if game.last_message:
+                await game.last_message.delete()
+            publish_game_state(game, embed)
+            game.last_message = await button_interaction.followup.send(embed=embed, view=view, wait=True)
+        schedule_ai_turn(game, channel_id)
 
     shoot_self.callback = shoot_self_callback
     view.add_item(shoot_self)
 
-    shoot_opponent = discord.ui.Button(label="상대 쏘기", style=discord.ButtonStyle.green, emoji="🎯")
+    shoot_opponent = discord.ui.Button(label="상대 쏘기", style=discord.ButtonStyle.green, emoji="🎯", custom_id=f"bs:{game.game_id}:shoot_opponent")
     async def shoot_opponent_callback(button_interaction: discord.Interaction):
-        if button_interaction.user.id != game.current_turn:
+        actor = button_interaction.user
+        if actor.id != game.current_turn:
             await button_interaction.response.send_message("당신의 턴이 아닙니다!", ephemeral=True)
             return
-        shoot_self.disabled = True
-        shoot_opponent.disabled = True
-        use_item.disabled = True
-        target_id = opponent.id if button_interaction.user.id == interaction.user.id else interaction.user.id
-        bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = game.shoot(button_interaction.user.id, target_id)
-        current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-        show_chamber = bool(reload_message)
-        game.get_items()
-        embed = discord.Embed(
-            title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-            description=f"{interaction.user.mention} vs {opponent.mention}",
-            color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-        )
-        if reload_message:
-            embed.add_field(name="장전", value=reload_message, inline=False)
-        else:
-            target_name = opponent.display_name if button_interaction.user.id == interaction.user.id else interaction.user.display_name
-            result = f"{'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}! "
-            if bullet == "live":
-                result += f"{target_name}이(가) {damage} 피해를 입었습니다! "
-                if knife_used:
-                    result += "(칼 효과: 대미지 2배) "
-                result += f"(체력: {old_hp} → {game.hp[target_id]})"
-            else:
-                result += f"{target_name}에게 피해 없음!"
-            embed.add_field(name="결과", value=result, inline=False)
-            if handcuff_used:
-                embed.add_field(name="수갑 효과", value=f"🔗 {button_interaction.user.display_name}이(가) 수갑으로 턴을 유지했습니다!", inline=False)
-        embed.add_field(
-            name=f"{interaction.user.display_name} 체력",
-            value=game.get_hp_bar(interaction.user.id, button_interaction.user.id),
-            inline=True
-        )
-        embed.add_field(
-            name=f"{opponent.display_name} 체력",
-            value=game.get_hp_bar(opponent.id, button_interaction.user.id),
-            inline=True
-        )
-        if show_chamber:
-            embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-        embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[button_interaction.user.id]) or "없음", inline=False)
-        embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-        embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[button_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
-
-        if game.hp[target_id] <= 0:
-            game.scores[button_interaction.user.id] += 1
-            embed.add_field(name="라운드 종료", value=f"{button_interaction.user.display_name}이(가) 라운드 {game.round} 승리!", inline=False)
-            game_end = game.check_game_end()
-            if game_end:
-                embed.add_field(name="게임 종료", value=game_end, inline=False)
-                view.clear_items()
-                game.end_game()
+        await acknowledge(button_interaction, "shoot_opponent")
+        if await turn_taken(button_interaction, actor):
+            return
+        with game.action("shoot_opponent"):
+            shoot_self.disabled = True
+            shoot_opponent.disabled = True
+            use_item.disabled = True
+            target = other_player(actor.id)
+            bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = game.shoot(actor.id, target.id)
+            show_chamber = bool(reload_message)
+            if reload_message:
+                events = [("장전", reload_message)]
             else:
-                if not game.start_new_round():
-                    game_end = game.check_game_end()
-                    embed.add_field(name="게임 종료", value=game_end, inline=False)
-                    view.clear_items()
-                    game.end_game()
+                result = f"{'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}! "
+                if bullet == "live":
+                    result += f"{target.display_name}이(가) {damage} 피해를 입었습니다! "
+                    if knife_used:
+                        result += "(칼 효과: 대미지 2배) "
+                    result += f"(체력: {old_hp} → {game.hp[target.id]})"
                 else:
-                    current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-                    game.get_items()
-                    embed = discord.Embed(
-                        title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-                        description=f"{interaction.user.mention} vs {opponent.mention}",
-                        color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-                    )
-                    embed.add_field(name="새 라운드", value=f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.", inline=False)
-                    embed.add_field(
-                        name=f"{interaction.user.display_name} 체력",
-                        value=game.get_hp_bar(interaction.user.id, button_interaction.user.id),
-                        inline=True
-                    )
-                    embed.add_field(
-                        name=f"{opponent.display_name} 체력",
-                        value=game.get_hp_bar(opponent.id, button_interaction.user.id),
-                        inline=True
-                    )
-                    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                    embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[button_interaction.user.id]) or "없음", inline=False)
-                    embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-                    embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[button_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
-        else:
-            if bullet and not handcuff_used:
+                    result += f"{target.display_name}에게 피해 없음!"
+                events = [("결과", result)]
+                if handcuff_used:
+                    events.append(("수갑 효과", f"🔗 {actor.display_name}이(가) 수갑으로 턴을 유지했습니다!"))
+            results = []
+            if game.hp[target.id] <= 0:
+                events, results, new_round = end_round(actor, events)
+                show_chamber = show_chamber or new_round
+            elif bullet and not handcuff_used:
                 game.switch_turn()
-            current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-            embed.title = f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}"
-            embed.color = discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
+            embed = render_game_embed(game, RULESET, events, results, viewer_id=actor.id, show_chamber=show_chamber)
 
-        shoot_self.disabled = False
-        shoot_opponent.disabled = False
-        use_item.disabled = False
-        if game.last_message:
-            await game.last_message.delete()
-        game.last_message = await button_interaction.response.send_message(embed=embed, view=view)
+            shoot_self.disabled = False
+            shoot_opponent.disabled = False
+            use_item.disabled = False
+        with timed_stage("render", "shoot_opponent"):
+            if game.last_message:
+                await game.last_message.delete()
+            publish_game_state(game, embed)
+            game.last_message = await button_interaction.followup.send(embed=embed, view=view, wait=True)
+        schedule_ai_turn(game, channel_id)
 
     shoot_opponent.callback = shoot_opponent_callback
     view.add_item(shoot_opponent)
 
-    use_item = discord.ui.Button(label="아이템 사용", style=discord.ButtonStyle.blurple, emoji="🧪")
+    use_item = discord.ui.Button(label="아이템 사용", style=discord.ButtonStyle.blurple, emoji="🧪", custom_id=f"bs:{game.game_id}:use_item")
     async def use_item_callback(button_interaction: discord.Interaction):
-        if button_interaction.user.id != game.current_turn:
+        actor = button_interaction.user
+        if actor.id != game.current_turn:
             await button_interaction.response.send_message("당신의 턴이 아닙니다!", ephemeral=True)
             return
-        game.get_items()
-        items = game.items[button_interaction.user.id]
+        await acknowledge(button_interaction, "use_item")
+        if await turn_taken(button_interaction, actor):
+            return
+        with timed_stage("compute", "use_item"):
+            items = game.items[actor.id]
         if not items:
-            await button_interaction.response.send_message("사용 가능한 아이템이 없습니다!", ephemeral=True)
+            await button_interaction.followup.send("사용 가능한 아이템이 없습니다!", ephemeral=True)
             return
 
         item_select = discord.ui.Select(placeholder="아이템을 선택하세요", options=[
             discord.SelectOption(label=item, value=f"{item}_{idx}") for idx, item in enumerate(items)
         ])
         async def item_select_callback(select_interaction: discord.Interaction):
+            actor = select_interaction.user
             selected_value = select_interaction.data["values"][0]
             item = selected_value.split("_")[0]
-            opponent_id = opponent.id if select_interaction.user.id == interaction.user.id else interaction.user.id
+            opponent_id = other_player(actor.id).id
+            await acknowledge(select_interaction, "item_select")
+            # 메뉴가 열려 있는 동안 턴이 넘어갔거나 아이템이 이미 쓰였을 수 있으므로 ack 이후에 다시 확인
+            if await turn_taken(select_interaction, actor):
+                return
+            if item not in game.items[actor.id]:
+                await select_interaction.followup.send("이미 사용되었거나 없는 아이템입니다!", ephemeral=True)
+                return
             if item == "주사기" and game.items[opponent_id]:
                 opponent_items = game.items[opponent_id]
                 steal_select = discord.ui.Select(placeholder="훔칠 아이템을 선택하세요", options=[
                     discord.SelectOption(label=opponent_item, value=f"{opponent_item}_{idx}") for idx, opponent_item in enumerate(opponent_items)
                 ])
                 async def steal_select_callback(steal_interaction: discord.Interaction):
+                    actor = steal_interaction.user
                     stolen_value = steal_interaction.data["values"][0]
                     stolen_item = stolen_value.split("_")[0]
-                    game.get_items()
-                    game.items[opponent_id].remove(stolen_item)
-                    result = game.use_item(steal_interaction.user.id, stolen_item, opponent_id)
-                    game.items[steal_interaction.user.id].remove(item)
-                    save_items_to_json(game.game_id, game.player1.id, game.player2.id, game.items)
-                    current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-                    show_chamber = stolen_item in ["맥주", "인버터"]
-                    embed = discord.Embed(
-                        title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-                        description=f"{interaction.user.mention} vs {opponent.mention}",
-                        color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-                    )
-                    embed.add_field(name="아이템 사용", value=f"주사기: {stolen_item}을(를) 훔쳐 즉시 사용했습니다! {result}", inline=False)
-                    embed.add_field(
-                        name=f"{interaction.user.display_name} 체력",
-                        value=game.get_hp_bar(interaction.user.id, steal_interaction.user.id),
-                        inline=True
-                    )
-                    embed.add_field(
-                        name=f"{opponent.display_name} 체력",
-                        value=game.get_hp_bar(opponent.id, steal_interaction.user.id),
-                        inline=True
+                    await acknowledge(steal_interaction, "steal_select")
+                    # 확인과 응답은 action 밖에서 끝내고, 통과하면 await 없이 바로 action에 들어감
+                    if await turn_taken(steal_interaction, actor):
+                        return
+                    if stolen_item not in game.items[opponent_id] or item not in game.items[actor.id]:
+                        await steal_interaction.followup.send("이미 사용되었거나 없는 아이템입니다!", ephemeral=True)
+                        return
+                    with game.action("steal_select"):
+                        # 훔친 아이템을 손에 옮겨 즉시 사용한 뒤 주사기와 함께 없앰 (저장은 action이 끝날 때 한 번)
+                        game.items[opponent_id].remove(stolen_item)
+                        game.items[actor.id].append(stolen_item)
+                        result = game.use_item(actor.id, stolen_item, opponent_id)
+                        game.items[actor.id].remove(stolen_item)
+                        game.items[actor.id].remove(item)
+                        game.save_items()
+                        embed = render_game_embed(
+                            game, RULESET, [("아이템 사용", f"주사기: {stolen_item}을(를) 훔쳐 즉시 사용했습니다! {result}")],
+                            viewer_id=actor.id, show_chamber=ITEMS[stolen_item].reveals_chamber
+                        )
+
+                        shoot_self.disabled = False
+                        shoot_opponent.disabled = False
+                        use_item.disabled = False
+                    with timed_stage("render", "steal_select"):
+                        if game.last_message:
+                            await game.last_message.delete()
+                        publish_game_state(game, embed)
+                        game.last_message = await steal_interaction.followup.send(embed=embed, view=view, wait=True)
+                    schedule_ai_turn(game, channel_id)
+
+                steal_select.callback = steal_select_callback
+                steal_view = discord.ui.View()
+                steal_view.interaction_check = interaction_check
+                steal_view.add_item(steal_select)
+                await select_interaction.followup.send("훔칠 아이템을 선택하세요:", view=steal_view, ephemeral=True)
+            else:
+                with game.action("item_select"):
+                    result = game.use_item(actor.id, item, opponent_id)
+                    if item in game.items[actor.id]:
+                        game.items[actor.id].remove(item)
+                    game.save_items()
+                    used = f"{actor.display_name}이(가) 돋보기를 사용했습니다." if item == "돋보기" else result
+                    embed = render_game_embed(
+                        game, RULESET, [("아이템 사용", used)], viewer_id=actor.id, show_chamber=ITEMS[item].reveals_chamber
                     )
-                    if show_chamber:
-                        embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                    embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[steal_interaction.user.id]) or "없음", inline=False)
-                    embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-                    embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[steal_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
 
                     shoot_self.disabled = False
                     shoot_opponent.disabled = False
                     use_item.disabled = False
+                with timed_stage("render", "item_select"):
+                    if item == "돋보기":
+                        await select_interaction.followup.send(result, ephemeral=True)
                     if game.last_message:
                         await game.last_message.delete()
-                    game.last_message = await steal_interaction.response.send_message(embed=embed, view=view)
-
-                steal_select.callback = steal_select_callback
-                steal_view = discord.ui.View()
-                steal_view.add_item(steal_select)
-                await select_interaction.response.send_message("훔칠 아이템을 선택하세요:", view=steal_view, ephemeral=True)
-            else:
-                result = game.use_item(select_interaction.user.id, item, opponent_id)
-                game.get_items()
-                if item in game.items[select_interaction.user.id]:
-                    game.items[select_interaction.user.id].remove(item)
-                save_items_to_json(game.game_id, game.player1.id, game.player2.id, game.items)
-                current_player = interaction.user if game.current_turn == interaction.user.id else opponent
-                show_chamber = item in ["맥주", "인버터"]
-                embed = discord.Embed(
-                    title=f"벅샷 룰렛 🔫 | 라운드 {game.round}/3 | {current_player.display_name}의 턴 | 모드: {mode}",
-                    description=f"{interaction.user.mention} vs {opponent.mention}",
-                    color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
-                )
-                if item == "돋보기":
-                    await select_interaction.response.send_message(result, ephemeral=True)
-                    embed.add_field(name="아이템 사용", value=f"{select_interaction.user.display_name}이(가) 돋보기를 사용했습니다.", inline=False)
-                else:
-                    embed.add_field(name="아이템 사용", value=result, inline=False)
-                embed.add_field(
-                    name=f"{interaction.user.display_name} 체력",
-                    value=game.get_hp_bar(interaction.user.id, select_interaction.user.id),
-                    inline=True
-                )
-                embed.add_field(
-                    name=f"{opponent.display_name} 체력",
-                    value=game.get_hp_bar(opponent.id, select_interaction.user.id),
-                    inline=True
-                )
-                if show_chamber:
-                    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                embed.add_field(name=f"{interaction.user.display_name} 아이템", value=", ".join(game.items[select_interaction.user.id]) or "없음", inline=False)
-                embed.add_field(name=f"{opponent.display_name} 아이템", value=", ".join(game.items[opponent.id]) or "없음", inline=False)
-                embed.add_field(name="스코어", value=f"{interaction.user.display_name}: {game.scores[select_interaction.user.id]} | {opponent.display_name}: {game.scores[opponent.id]}", inline=True)
-
-                shoot_self.disabled = False
-                shoot_opponent.disabled = False
-                use_item.disabled = False
-                if game.last_message:
-                    await game.last_message.delete()
-                game.last_message = await select_interaction.response.send_message(embed=embed, view=view)
+                    publish_game_state(game, embed)
+                    game.last_message = await select_interaction.followup.send(embed=embed, view=view, wait=True)
+                schedule_ai_turn(game, channel_id)
 
         item_select.callback = item_select_callback
         item_view = discord.ui.View()
+        item_view.interaction_check = interaction_check
         item_view.add_item(item_select)
-        await button_interaction.response.send_message("아이템을 선택하세요:", view=item_view, ephemeral=True)
+        await button_interaction.followup.send("아이템을 선택하세요:", view=item_view, ephemeral=True)
 
     use_item.callback = use_item_callback
     view.add_item(use_item)
 
-    invite_embed = discord.Embed(title="벅샷 룰렛 초대 🔫", description=f"{opponent.mention}, {interaction.user.mention}이(가) 대결을 요청했습니다! (모드: {mode}) 수락하시겠습니까?")
-    invite_view = discord.ui.View()
-    accept_button = discord.ui.Button(label="수락", style=discord.ButtonStyle.green, emoji="✅")
-    async def accept_callback(button_interaction: discord.Interaction):
-        if button_interaction.user.id != opponent.id:
-            await button_interaction.response.send_message("당신은 초대를 수락할 수 없습니다!", ephemeral=True)
+    odds_button = discord.ui.Button(label="확률", style=discord.ButtonStyle.gray, emoji="🎲", custom_id=f"bs:{game.game_id}:odds")
+    async def odds_callback(button_interaction: discord.Interaction):
+        # 게임 상태를 바꾸지 않고 메모리만 읽으므로 바로 응답
+        if button_interaction.user.id not in game.seats:
+            await button_interaction.response.send_message("게임 참가자만 확인할 수 있습니다!", ephemeral=True)
             return
-        game.status = "active" 
-        game._save_to_db()
-        if game.last_message:
-            await game.last_message.delete()
-        game.last_message = await button_interaction.response.send_message(embed=embed, view=view)
-        invite_view.clear_items()
+        await button_interaction.response.send_message(embed=build_odds_embed(game, button_interaction.user.id), ephemeral=True)
 
-    accept_button.callback = accept_callback
-    invite_view.add_item(accept_button)
+    odds_button.callback = odds_callback
+    view.add_item(odds_button)
 
-    reject_button = discord.ui.Button(label="거절", style=discord.ButtonStyle.red, emoji="❌")
-    async def reject_callback(button_interaction: discord.Interaction):
-        if button_interaction.user.id != opponent.id:
-            await button_interaction.response.send_message("당신은 초대를 거절할 수 없습니다!", ephemeral=True)
+    return embed, view
+
+@tree.command(name="buckshot", description="다른 유저와 벅샷 룰렛 대결을 시작합니다!")
+@app_commands.describe(
+    opponent="대결할 상대를 선택하세요 (이 봇을 선택하면 하우스 AI와 대결)",
+    mode="게임 모드: Normal 또는 Double or Nothing",
+    difficulty="하우스 AI 난이도: easy, normal, hard"
+)
+async def buckshot(interaction: discord.Interaction, opponent: discord.Member, mode: str = "Normal", difficulty: str = "normal"):
+    print(f"Received /buckshot command from {interaction.user.id} for opponent {opponent.id} with mode {mode}")
+    house_game = client.user is not None and opponent.id == client.user.id  # 기록 재생은 로그인하지 않고 실행
+    if opponent == interaction.user:
+        await interaction.response.send_message("자신과 대결할 수 없습니다!", ephemeral=True)
+        return
+    if opponent.bot and not house_game:
+        await interaction.response.send_message("봇과 대결할 수 없습니다! (하우스 AI와 대결하려면 이 봇을 선택하세요)", ephemeral=True)
+        return
+    if mode not in ["Normal", "Double or Nothing"]:
+        await interaction.response.send_message("유효하지 않은 모드입니다! Normal 또는 Double or Nothing을 선택하세요.", ephemeral=True)
+        return
+    if house_game and difficulty not in AI_DIFFICULTIES:
+        await interaction.response.send_message(f"유효하지 않은 난이도입니다! ({', '.join(AI_DIFFICULTIES)})", ephemeral=True)
+        return
+
+    # 한도와 과부하는 메모리의 카운터만 보고 DB에 닿기 전에 거절
+    overload = admission.overloaded()
+    if overload:
+        print(f"Shedding /buckshot from {interaction.user.id}: {overload}")
+        await interaction.response.send_message("지금은 요청이 많아 새 게임을 받을 수 없습니다. 잠시 후 다시 시도해 주세요!", ephemeral=True)
+        return
+    position = admission.position(interaction.user.id)
+    if position:
+        await interaction.response.send_message(f"이미 대기열 {position}번째에서 기다리는 게임이 있습니다!", ephemeral=True)
+        return
+    kind = "active" if house_game else "pending"
+    blocked = admission.check(kind, interaction.guild_id, [interaction.user.id])
+    if blocked == "user":
+        await interaction.response.send_message("이미 진행 중인 게임이 있거나 응답을 기다리는 초대가 너무 많습니다!", ephemeral=True)
+        return
+
+    with connect_db() as conn:
+        c = conn.execute("SELECT game_id FROM games WHERE ruleset = 'classic' AND (player1_id = ? OR player2_id = ?) AND status = 'active'",
+                         (interaction.user.id, interaction.user.id))
+        if c.fetchone():
+            await interaction.response.send_message("이미 진행 중인 게임이 있습니다!", ephemeral=True)
             return
-        if game.last_message:
-            await game.last_message.delete()
-        await button_interaction.response.send_message(f"{opponent.display_name}이(가) 초대를 거절했습니다!", ephemeral=False)
-        game.end_game()
+
+    await acknowledge(interaction, "buckshot")
+
+    def create_game():
+        double_or_nothing = mode == "Double or Nothing"
+        game = BuckshotGame(interaction.user, opponent, double_or_nothing=double_or_nothing, guild_id=interaction.guild_id,
+                            seed=interaction.extras.get("replay_seed"))  # 기록 재생 중에는 기록된 시드
+        admission.admit(game)
+        matchmaking.leave(interaction.user.id)  # 게임에 들어가면 매칭 대기열에서 뺌
+        if recorder.path:
+            recorder.start(game.game_id, game.rng.seed, game.seats, mode=mode, ai=difficulty if house_game else None)
+            game.end_callbacks.append(lambda finished_game: recorder.finish(finished_game.game_id))
+        return game
+
+    if blocked:  # 전체 또는 길드 한도: 대기열에서 자리가 날 때까지 기다림
+        queued = admission.enqueue(kind, interaction.guild_id, (interaction.user.id,), create_game)
+        if queued is None:
+            await interaction.followup.send("대기열이 가득 찼습니다. 잠시 후 다시 시도해 주세요!", ephemeral=True)
+            return
+        position, future = queued
+        if future is None:
+            await interaction.followup.send(f"이미 대기열 {position}번째에서 기다리는 게임이 있습니다!", ephemeral=True)
+            return
+        notice = await interaction.followup.send(
+            f"⏳ 동시에 진행할 수 있는 게임 수가 가득 차 대기열 {position}번째로 등록했습니다. 자리가 나면 바로 이어서 시작합니다.",
+            ephemeral=True, wait=True
+        )
+        try:
+            game = await asyncio.wait_for(future, INVITE_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            admission.cancel(interaction.user.id, future)
+            await notice.edit(content="대기 시간이 지나 취소되었습니다. 다시 시도해 주세요.")
+            return
+        await notice.edit(content="✅ 차례가 되어 시작합니다!")
+    else:
+        with timed_stage("compute", "buckshot"):
+            game = create_game()
+    if house_game:
+        with game.action("buckshot"):
+            game.ai_difficulty = difficulty
+            game.status = "active"
+            game._save_to_db()
+    embed, view = build_game_view(game, interaction.channel_id)
+    if house_game:
+        with timed_stage("render", "buckshot"):
+            publish_game_state(game, embed)
+            game.last_message = await interaction.followup.send(
+                content=f"🤖 하우스 AI와 대결합니다! (난이도: {difficulty})", embed=embed, view=view, wait=True
+            )
+        return
+
+    invite_embed = discord.Embed(title="벅샷 룰렛 초대 🔫", description=f"{opponent.mention}, {interaction.user.mention}이(가) 대결을 요청했습니다! (모드: {mode}) 수락하시겠습니까?")
+    invite_view = discord.ui.View()
+
+    async def on_invite_timeout():
+        if game.status == "pending":  # 응답 없는 초대는 초대 대기 자리를 돌려줌
+            game.end_game("timeout")
+
+    invite_view.on_timeout = on_invite_timeout
+
+    async def invite_interaction_check(button_interaction: discord.Interaction):
+        recorder.record(game.game_id, button_interaction)
+        return await throttle(button_interaction, game.game_id, game.seats)
+
+    invite_view.interaction_check = invite_interaction_check
+
+    accept_button = discord.ui.Button(label="수락", style=discord.ButtonStyle.green, emoji="✅", custom_id=f"bs:{game.game_id}:accept")
+    async def accept_callback(button_interaction: discord.Interaction):
+        if button_interaction.user.id != opponent.id:
+            await button_interaction.response.send_message("당신은 초대를 수락할 수 없습니다!", ephemeral=True)
+            return
+        if admission.check("active", game.guild_id, [interaction.user.id, opponent.id], reserved=True):
+            await button_interaction.response.send_message("진행 중인 게임이 있는 플레이어가 있어 아직 시작할 수 없습니다!", ephemeral=True)
+            return
+        await acknowledge(button_interaction, "accept")
+        with game.action("accept"):
+            game.status = "active"
+            game._save_to_db()
+        for player_id in game.seats:
+            matchmaking.leave(player_id)
+        with timed_stage("render", "accept"):
+            if game.last_message:
+                await game.last_message.delete()
+            publish_game_state(game, embed)
+            game.last_message = await button_interaction.followup.send(embed=embed, view=view, wait=True)
+        invite_view.clear_items()
+
+    accept_button.callback = accept_callback
+    invite_view.add_item(accept_button)
+
+    reject_button = discord.ui.Button(label="거절", style=discord.ButtonStyle.red, emoji="❌", custom_id=f"bs:{game.game_id}:reject")
+    async def reject_callback(button_interaction: discord.Interaction):
+        if button_interaction.user.id != opponent.id:
+            await button_interaction.response.send_message("당신은 초대를 거절할 수 없습니다!", ephemeral=True)
+            return
+        await acknowledge(button_interaction, "reject")
+        with timed_stage("render", "reject"):
+            if game.last_message:
+                await game.last_message.delete()
+            await button_interaction.followup.send(f"{opponent.display_name}이(가) 초대를 거절했습니다!")
+        with timed_stage("persist", "reject"):
+            game.end_game()
         invite_view.clear_items()
 
     reject_button.callback = reject_callback
     invite_view.add_item(reject_button)
 
-    await interaction.response.send_message(embed=invite_embed, view=invite_view)
+    with timed_stage("render", "buckshot"):
+        await interaction.followup.send(embed=invite_embed, view=invite_view)
+
+# 토너먼트 설정
+MAX_TOURNAMENT_PLAYERS = 256
+TOURNAMENT_FORMATS = {"single": 1, "double": 2}  # 탈락까지 허용되는 패배 수
+
+def pair_players(entrants):
+    """패배 수가 같은 플레이어끼리 시드 순으로 대진을 짬
+
+    entrants는 (player_id, seed, losses) 목록이다. 그룹 인원이 홀수면 최상위 시드가 부전승이고,
+    승자조와 패자조에 한 명씩만 남으면 두 사람을 결승으로 묶는다.
+    """
+    groups = {}
+    for player_id, seed, losses in sorted(entrants, key=lambda entrant: entrant[1]):
+        groups.setdefault(losses, []).append(player_id)
+    if len(entrants) == 2:
+        first, second = (player_id for group in sorted(groups.items()) for player_id in group[1])
+        return [(first, second, "final")], []
+    pairs, byes = [], []
+    for losses, group in sorted(groups.items()):
+        bracket = "winners" if losses == 0 else "losers"
+        if len(group) % 2:
+            byes.append((group.pop(0), bracket))
+        for idx in range(len(group) // 2):
+            pairs.append((group[idx], group[-1 - idx], bracket))
+    return pairs, byes
+
+class TournamentManager:
+    """토너먼트 대진 저장과 라운드 진행을 담당
+
+    모든 토너먼트가 연결 하나를 공유한다. 한 라운드의 대진은 한 번의 커밋으로 기록하고,
+    경기 결과는 request_commit으로 모아서 기록한다. 한 라운드의 경기는 모두 동시에 진행된다.
+    """
+    def __init__(self, conn, match_runner, announcer=None):
+        self.conn = conn
+        self.match_runner = match_runner  # async (manager, tournament, match_id, player1_id, player2_id)
+        self.announcer = announcer  # async (tournament, message)
+        self.pending = {}  # tournament_id -> 진행 중인 match_id 집합
+        self.finished = {}  # tournament_id -> asyncio.Event
+
+    def create(self, guild_id, channel_id, creator_id, name, fmt, max_players):
+        tournament_id = uuid4().hex[:8]
+        self.conn.execute(
+            '''INSERT INTO tournaments (tournament_id, guild_id, channel_id, creator_id, name, format, status, round, max_players, champion_id)
+               VALUES (?, ?, ?, ?, ?, ?, 'registration', 0, ?, NULL)''',
+            (tournament_id, guild_id, channel_id, creator_id, name, fmt, max_players)
+        )
+        self.conn.commit()
+        return tournament_id
+
+    def get(self, tournament_id):
+        row = self.conn.execute(
+            '''SELECT tournament_id, guild_id, channel_id, creator_id, name, format, status, round, max_players, champion_id
+               FROM tournaments WHERE tournament_id = ?''',
+            (tournament_id,)
+        ).fetchone()
+        if not row:
+            return None
+        keys = ("tournament_id", "guild_id", "channel_id", "creator_id", "name", "format", "status", "round", "max_players", "champion_id")
+        return dict(zip(keys, row))
+
+    def join(self, tournament_id, player_id):
+        tournament = self.get(tournament_id)
+        if not tournament:
+            return False, "존재하지 않는 토너먼트입니다!"
+        if tournament["status"] != "registration":
+            return False, "이미 시작된 토너먼트입니다!"
+        count = self.conn.execute("SELECT COUNT(*) FROM tournament_players WHERE tournament_id = ?", (tournament_id,)).fetchone()[0]
+        if count >= tournament["max_players"]:
+            return False, "참가 인원이 가득 찼습니다!"
+        try:
+            self.conn.execute(
+                "INSERT INTO tournament_players (tournament_id, player_id, seed, losses) VALUES (?, ?, ?, 0)",
+                (tournament_id, player_id, count + 1)
+            )
+        except sqlite3.IntegrityError:
+            return False, "이미 참가한 토너먼트입니다!"
+        self.conn.commit()
+        return True, f"토너먼트 **{tournament['name']}**에 참가했습니다! (참가자 {count + 1}/{tournament['max_players']})"
+
+    async def start(self, tournament_id):
+        tournament = self.get(tournament_id)
+        if not tournament:
+            return False, "존재하지 않는 토너먼트입니다!"
+        if tournament["status"] != "registration":
+            return False, "이미 시작된 토너먼트입니다!"
+        count = self.conn.execute("SELECT COUNT(*) FROM tournament_players WHERE tournament_id = ?", (tournament_id,)).fetchone()[0]
+        if count < 2:
+            return False, "참가자가 2명 이상이어야 시작할 수 있습니다!"
+        # 레이팅 순으로 시드 재배정 (동점은 참가 순서)
+        ranked = self.conn.execute(
+            '''SELECT p.player_id FROM tournament_players p LEFT JOIN player_ratings r ON r.player_id = p.player_id
+               WHERE p.tournament_id = ? ORDER BY COALESCE(r.rating, ?) DESC, p.seed''',
+            (tournament_id, DEFAULT_RATING)
+        ).fetchall()
+        self.conn.executemany(
+            "UPDATE tournament_players SET seed = ? WHERE tournament_id = ? AND player_id = ?",
+            [(seed, tournament_id, player_id) for seed, (player_id,) in enumerate(ranked, start=1)]
+        )
+        self.conn.execute("UPDATE tournaments SET status = 'running' WHERE tournament_id = ?", (tournament_id,))
+        self.conn.commit()
+        self.finished[tournament_id] = asyncio.Event()
+        await self.start_round(tournament_id)
+        return True, f"토너먼트 **{tournament['name']}**이(가) 시작되었습니다! (참가자 {count}명)"
+
+    async def start_round(self, tournament_id):
+        """남은 플레이어로 다음 라운드 대진을 짜고 모든 경기를 동시에 시작"""
+        tournament = self.get(tournament_id)
+        limit = TOURNAMENT_FORMATS[tournament["format"]]
+        entrants = self.conn.execute(
+            "SELECT player_id, seed, losses FROM tournament_players WHERE tournament_id = ? AND losses < ?",
+            (tournament_id, limit)
+        ).fetchall()
+        if len(entrants) <= 1:
+            champion_id = entrants[0][0] if entrants else None
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE tournaments SET status = 'finished', champion_id = ? WHERE tournament_id = ?",
+                    (champion_id, tournament_id)
+                )
+            self.pending.pop(tournament_id, None)
+            self.finished.setdefault(tournament_id, asyncio.Event()).set()
+            if self.announcer:
+                await self.announcer(tournament, f"🏆 토너먼트 **{tournament['name']}** 우승: <@{champion_id}>!")
+            return
+
+        round_num = tournament["round"] + 1
+        pairs, byes = pair_players(entrants)
+        matches = [(uuid4().hex, player1_id, player2_id, bracket) for player1_id, player2_id, bracket in pairs]
+        rows = [(match_id, tournament_id, round_num, bracket, player1_id, player2_id, None, "active")
+                for match_id, player1_id, player2_id, bracket in matches]
+        rows += [(uuid4().hex, tournament_id, round_num, bracket, player_id, None, player_id, "bye")
+                 for player_id, bracket in byes]
+        # 라운드 전체 대진을 한 번의 커밋으로 기록
+        with self.conn:
+            self.conn.execute("UPDATE tournaments SET round = ? WHERE tournament_id = ?", (round_num, tournament_id))
+            self.conn.executemany(
+                '''INSERT INTO tournament_matches (match_id, tournament_id, round, bracket, player1_id, player2_id, winner_id, status)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                rows
+            )
+        tournament["round"] = round_num
+        self.pending[tournament_id] = {match[0] for match in matches}
+        if self.announcer:
+            await self.announcer(tournament, f"🔫 토너먼트 **{tournament['name']}** 라운드 {round_num} 시작! 경기 {len(matches)}개, 부전승 {len(byes)}명")
+        results = await asyncio.gather(
+            *(self.match_runner(self, tournament, match_id, player1_id, player2_id)
+              for match_id, player1_id, player2_id, bracket in matches),
+            return_exceptions=True
+        )
+        for (match_id, player1_id, player2_id, bracket), result in zip(matches, results):
+            if isinstance(result, Exception):
+                # 경기를 시작하지 못하면 상위 시드 부전승 처리
+                print(f"Failed to start tournament match {match_id}: {result}")
+                self.record_result(tournament_id, match_id, player1_id)
+
+    def on_game_end(self, tournament_id, match_id, game):
+        """경기 종료 훅: check_game_end가 정한 승자를 기록"""
+        winner_id = game.winner_id
+        if winner_id is None:
+            # 타임아웃 등으로 승자가 없으면 스코어가 높은 쪽, 동점이면 상위 시드가 진출
+            winner_id = game.player2.id if game.scores[game.player2.id] > game.scores[game.player1.id] else game.player1.id
+        self.record_result(tournament_id, match_id, winner_id)
+
+    def record_result(self, tournament_id, match_id, winner_id):
+        pending = self.pending.get(tournament_id)
+        if not pending or match_id not in pending:
+            return
+        pending.discard(match_id)
+        player1_id, player2_id = self.conn.execute(
+            "SELECT player1_id, player2_id FROM tournament_matches WHERE match_id = ?", (match_id,)
+        ).fetchone()
+        loser_id = player2_id if winner_id == player1_id else player1_id
+        self.conn.execute("UPDATE tournament_matches SET winner_id = ?, status = 'finished' WHERE match_id = ?", (winner_id, match_id))
+        self.conn.execute(
+            "UPDATE tournament_players SET losses = losses + 1 WHERE tournament_id = ? AND player_id = ?",
+            (tournament_id, loser_id)
+        )
+        if pending:
+            request_commit(self.conn)
+            return
+        # 라운드의 마지막 경기: 라운드 상금을 한 트랜잭션으로 정산 (경기 결과도 같은 커밋에 포함)
+        try:
+            if not settle_batch(("tournament", tournament_id)):
+                request_commit(self.conn)
+        except sqlite3.Error as e:
+            print(f"Tournament {tournament_id} round settlement failed, retrying: {e}")
+            request_commit(self.conn)
+        asyncio.get_running_loop().create_task(self.start_round(tournament_id))
+
+    async def wait_finished(self, tournament_id):
+        await self.finished.setdefault(tournament_id, asyncio.Event()).wait()
+
+    def get_status(self, tournament_id):
+        tournament = self.get(tournament_id)
+        if not tournament:
+            return None
+        limit = TOURNAMENT_FORMATS[tournament["format"]]
+        tournament["players"] = self.conn.execute(
+            "SELECT COUNT(*) FROM tournament_players WHERE tournament_id = ?", (tournament_id,)
+        ).fetchone()[0]
+        tournament["remaining"] = self.conn.execute(
+            "SELECT COUNT(*) FROM tournament_players WHERE tournament_id = ? AND losses < ?", (tournament_id, limit)
+        ).fetchone()[0]
+        tournament["matches"] = self.conn.execute(
+            '''SELECT player1_id, player2_id, status FROM tournament_matches
+               WHERE tournament_id = ? AND round = ? AND status != 'bye' ''',
+            (tournament_id, tournament["round"])
+        ).fetchall()
+        return tournament
+
+async def fetch_player(channel, player_id):
+    member = channel.guild.get_member(player_id) if getattr(channel, "guild", None) else None
+    return member or await client.fetch_user(player_id)
+
+async def run_tournament_match(manager, tournament, match_id, player1_id, player2_id):
+    """토너먼트 경기를 일반 게임과 같은 화면으로 채널에 게시"""
+    channel = client.get_channel(tournament["channel_id"]) or await client.fetch_channel(tournament["channel_id"])
+    player1 = await fetch_player(channel, player1_id)
+    player2 = await fetch_player(channel, player2_id)
+    game = BuckshotGame(player1, player2, guild_id=tournament["guild_id"])
+    game.status = "active"
+    game._save_to_db()
+    admission.admit(game)  # 이미 대진이 정해진 경기라 한도와 관계없이 셈
+    for player_id in game.seats:
+        matchmaking.leave(player_id)
+    game.tournament_match = (tournament["tournament_id"], match_id)
+    game.end_callbacks.append(
+        lambda finished_game: manager.on_game_end(tournament["tournament_id"], match_id, finished_game)
+    )
+    embed, view = build_game_view(game, channel.id)
+    publish_game_state(game, embed)
+    game.last_message = await channel.send(
+        content=f"🏟️ **{tournament['name']}** 라운드 {tournament['round']}: {player1.mention} vs {player2.mention}",
+        embed=embed,
+        view=view
+    )
+
+async def announce_tournament(tournament, message):
+    channel = client.get_channel(tournament["channel_id"])
+    if channel:
+        await channel.send(message)
+
+tournament_manager = None
+
+def get_tournament_manager():
+    global tournament_manager
+    if tournament_manager is None:
+        tournament_manager = TournamentManager(get_db(), run_tournament_match, announce_tournament)
+    return tournament_manager
+
+tournament_group = app_commands.Group(name="tournament", description="벅샷 룰렛 토너먼트")
+
+@tournament_group.command(name="create", description="새 토너먼트를 만듭니다.")
+@app_commands.describe(name="토너먼트 이름", format="single 또는 double (엘리미네이션 방식)", max_players="최대 참가 인원 (최대 256명)")
+async def tournament_create(interaction: discord.Interaction, name: str, format: str = "single", max_players: int = 64):
+    if format not in TOURNAMENT_FORMATS:
+        await interaction.response.send_message("유효하지 않은 방식입니다! single 또는 double을 선택하세요.", ephemeral=True)
+        return
+    if not 2 <= max_players <= MAX_TOURNAMENT_PLAYERS:
+        await interaction.response.send_message(f"참가 인원은 2명 이상 {MAX_TOURNAMENT_PLAYERS}명 이하여야 합니다!", ephemeral=True)
+        return
+    manager = get_tournament_manager()
+    tournament_id = manager.create(interaction.guild_id, interaction.channel_id, interaction.user.id, name, format, max_players)
+    embed = discord.Embed(
+        title=f"토너먼트 생성 🏟️ | {name}",
+        description=f"`/tournament join {tournament_id}` 으로 참가하세요!",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="방식", value="싱글 엘리미네이션" if format == "single" else "더블 엘리미네이션", inline=True)
+    embed.add_field(name="최대 인원", value=f"{max_players}명", inline=True)
+    embed.add_field(name="토너먼트 ID", value=tournament_id, inline=True)
+    await interaction.response.send_message(embed=embed)
+
+@tournament_group.command(name="join", description="토너먼트에 참가합니다.")
+@app_commands.describe(tournament_id="참가할 토너먼트 ID")
+async def tournament_join(interaction: discord.Interaction, tournament_id: str):
+    success, message = get_tournament_manager().join(tournament_id, interaction.user.id)
+    await interaction.response.send_message(message, ephemeral=not success)
+
+@tournament_group.command(name="start", description="토너먼트를 시작합니다. (개설자 또는 관리자)")
+@app_commands.describe(tournament_id="시작할 토너먼트 ID")
+async def tournament_start(interaction: discord.Interaction, tournament_id: str):
+    manager = get_tournament_manager()
+    tournament = manager.get(tournament_id)
+    if not tournament:
+        await interaction.response.send_message("존재하지 않는 토너먼트입니다!", ephemeral=True)
+        return
+    if interaction.user.id != tournament["creator_id"] and not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("토너먼트 개설자 또는 관리자만 시작할 수 있습니다!", ephemeral=True)
+        return
+    await interaction.response.defer()
+    success, message = await manager.start(tournament_id)
+    await interaction.followup.send(message, ephemeral=not success)
+
+@tournament_group.command(name="status", description="토너먼트 진행 상황을 확인합니다.")
+@app_commands.describe(tournament_id="확인할 토너먼트 ID")
+async def tournament_status(interaction: discord.Interaction, tournament_id: str):
+    status = get_tournament_manager().get_status(tournament_id)
+    if not status:
+        await interaction.response.send_message("존재하지 않는 토너먼트입니다!", ephemeral=True)
+        return
+    status_names = {"registration": "참가 모집 중", "running": "진행 중", "finished": "종료"}
+    embed = discord.Embed(
+        title=f"토너먼트 현황 🏟️ | {status['name']}",
+        description=f"상태: {status_names.get(status['status'], status['status'])} | 라운드 {status['round']}",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="참가자", value=f"{status['players']}명 (생존 {status['remaining']}명)", inline=True)
+    if status["champion_id"]:
+        embed.add_field(name="우승", value=f"<@{status['champion_id']}>", inline=True)
+    if status["matches"]:
+        lines = [
+            f"<@{player1_id}> vs <@{player2_id}> {'✅' if match_status == 'finished' else '⏳'}"
+            for player1_id, player2_id, match_status in status["matches"][:20]
+        ]
+        if len(status["matches"]) > 20:
+            lines.append(f"... 외 {len(status['matches']) - 20}경기")
+        embed.add_field(name=f"라운드 {status['round']} 경기", value="\n".join(lines), inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+tree.add_command(tournament_group)
+
+# 매칭 설정
+RATING_BUCKET_SIZE = 100
+MATCH_WINDOW_BASE = 50  # 대기 직후 허용하는 레이팅 차이
+MATCH_WINDOW_GROWTH = 25  # 대기 1초마다 늘어나는 허용 폭
+MATCH_WINDOW_MAX = 1000
+MATCH_INTERVAL = 1.0
+
+def get_match_window(waited):
+    return min(MATCH_WINDOW_BASE + MATCH_WINDOW_GROWTH * waited, MATCH_WINDOW_MAX)
+
+class RatingQueue:
+    """레이팅 구간(bucket)별 정렬 리스트로 관리하는 매칭 대기열
+
+    구간마다 (레이팅, 등록 시각, 플레이어 ID)를 정렬해 두고, 비어 있지 않은 구간 번호도
+    정렬해 둔다. 등록/취소는 이분 탐색으로, 매칭은 허용 범위에 걸친 구간만 살펴본다.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.bucket_keys = []
+        self.entries = {}  # player_id -> (rating, enqueued_at, channel_id, player), 등록 순서 유지
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, player, rating, enqueued_at, channel_id):
+        key = int(rating // RATING_BUCKET_SIZE)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = []
+            bisect.insort(self.bucket_keys, key)
+        bisect.insort(bucket, (rating, enqueued_at, player.id))
+        self.entries[player.id] = (rating, enqueued_at, channel_id, player)
+
+    def remove(self, player_id):
+        entry = self.entries.pop(player_id, None)
+        if entry is None:
+            return None
+        rating, enqueued_at = entry[0], entry[1]
+        key = int(rating // RATING_BUCKET_SIZE)
+        bucket = self.buckets[key]
+        del bucket[bisect.bisect_left(bucket, (rating, enqueued_at, player_id))]
+        if not bucket:
+            del self.buckets[key]
+            del self.bucket_keys[bisect.bisect_left(self.bucket_keys, key)]
+        return entry
+
+    def find_match(self, player_id, window):
+        """허용 범위 안에서 레이팅이 가장 가까운 상대를 찾음"""
+        rating = self.entries[player_id][0]
+        low, high = rating - window, rating + window
+        best = None
+        start = bisect.bisect_left(self.bucket_keys, int(low // RATING_BUCKET_SIZE))
+        end = bisect.bisect_right(self.bucket_keys, int(high // RATING_BUCKET_SIZE))
+        for key in self.bucket_keys[start:end]:
+            bucket = self.buckets[key]
+            for candidate_rating, _, candidate_id in bucket[bisect.bisect_left(bucket, (low,)):bisect.bisect_right(bucket, (high, float("inf")))]:
+                if candidate_id == player_id:
+                    continue
+                if best is None or abs(candidate_rating - rating) < abs(best[0] - rating):
+                    best = (candidate_rating, candidate_id)
+                    if candidate_rating >= rating:
+                        break
+        return best[1] if best else None
+
+class MatchmakingService:
+    """길드별 대기열을 관리하고 주기적으로 대기 시간이 긴 순서대로 상대를 찾아 짝지음"""
+    def __init__(self):
+        self.queues = {}  # guild_id -> RatingQueue
+        self.queued = {}  # player_id -> guild_id
+
+    def enqueue(self, guild_id, channel_id, player, rating, now):
+        if player.id in self.queued:
+            return False
+        self.queues.setdefault(guild_id, RatingQueue()).add(player, rating, now, channel_id)
+        self.queued[player.id] = guild_id
+        return True
+
+    def leave(self, player_id):
+        guild_id = self.queued.pop(player_id, None)
+        if guild_id is None:
+            return False
+        queue = self.queues[guild_id]
+        queue.remove(player_id)
+        if not queue:
+            del self.queues[guild_id]
+        return True
+
+    def queue_size(self, guild_id):
+        queue = self.queues.get(guild_id)
+        return len(queue) if queue else 0
+
+    def tick(self, now):
+        """매칭된 (채널, 플레이어1, 플레이어2, 플레이어1 대기 시간, 플레이어2 대기 시간) 목록을 반환"""
+        matches = []
+        for guild_id, queue in list(self.queues.items()):
+            for player_id in list(queue.entries):
+                if player_id not in queue.entries:
+                    continue
+                waited = now - queue.entries[player_id][1]
+                opponent_id = queue.find_match(player_id, get_match_window(waited))
+                if opponent_id is None:
+                    continue
+                rating, enqueued_at, channel_id, player = queue.remove(player_id)
+                opponent_entry = queue.remove(opponent_id)
+                del self.queued[player_id]
+                del self.queued[opponent_id]
+                matches.append((channel_id, player, opponent_entry[3], now - enqueued_at, now - opponent_entry[1]))
+            if not queue:
+                del self.queues[guild_id]
+        return matches
+
+matchmaking = MatchmakingService()
+matchmaking_task = None
+
+async def start_matched_game(channel_id, player1, player2):
+    """매칭된 두 플레이어의 게임을 만들고 채널에 게시"""
+    channel = client.get_channel(channel_id) or await client.fetch_channel(channel_id)
+    guild_id = channel.guild.id if getattr(channel, "guild", None) else None
+    # 대기하는 동안 다른 게임에 들어갔을 수 있으므로 유저별 진행 중 한도만 다시 확인 (전체/길드 한도와는 관계없이 시작)
+    busy = [player for player in (player1, player2)
+            if admission.check("active", guild_id, [player.id], reserved=True)]
+    if busy:
+        print(f"Dropped match {player1.id} vs {player2.id}: {[player.id for player in busy]} already in a game")
+        for player in (player1, player2):
+            if player not in busy:  # 상대만 게임 중이면 남은 플레이어는 다시 대기열로
+                matchmaking.enqueue(guild_id, channel_id, player, get_player_rating(player.id), time.monotonic())
+        return
+    game = BuckshotGame(player1, player2, guild_id=guild_id)
+    game.status = "active"
+    game._save_to_db()
+    admission.admit(game)  # 이미 매칭된 경기라 전체/길드 한도와 관계없이 셈
+    embed, view = build_game_view(game, channel_id)
+    publish_game_state(game, embed)
+    game.last_message = await channel.send(
+        content=(
+            f"🎯 매칭 완료! {player1.mention} ({get_player_rating(player1.id):.0f}) vs "
+            f"{player2.mention} ({get_player_rating(player2.id):.0f})"
+        ),
+        embed=embed,
+        view=view
+    )
+
+async def matchmaking_loop():
+    while matchmaking.queued:
+        await asyncio.sleep(MATCH_INTERVAL)
+        for channel_id, player1, player2, waited1, waited2 in matchmaking.tick(time.monotonic()):
+            print(f"Matched {player1.id} vs {player2.id} after {waited1:.1f}s / {waited2:.1f}s")
+            try:
+                await start_matched_game(channel_id, player1, player2)
+            except Exception as e:
+                print(f"Failed to start matched game: {e}")
+
+def ensure_matchmaking_loop():
+    global matchmaking_task
+    if matchmaking_task is None or matchmaking_task.done():
+        matchmaking_task = asyncio.get_running_loop().create_task(matchmaking_loop())
+
+# 하우스 AI 설정 (탐색과 프로세스 풀은 워커가 import할 수 있도록 buckshot_core에 있음)
+AI_SEARCH_ITEMS = frozenset(item.name for item in ITEM_CONFIG.items if item.ai_searchable)  # 주사기, 재머는 탐색에서 제외
+AI_MOVE_DELAY = 1.0  # 플레이어가 AI 행동을 읽을 수 있도록 두는 간격
+AI_QUEUE_SLACK = 2.0  # 풀이 밀렸을 때 시간 예산에 더해 기다리는 시간
+
+def encode_ai_state(game, ai_id):
+    """AI가 볼 수 있는 정보만으로 탐색 상태를 만듦 (탄 구성은 장전과 배출 때 공개됨)"""
+    order = (ai_id, game.player1.id if ai_id == game.player2.id else game.player2.id)
+    knowledge = game.knowledge[ai_id]
+    return AIState(
+        live=knowledge.live,
+        blank=knowledge.blank,
+        known=tuple(sorted(knowledge.known.items())),
+        hp=tuple(game.hp[player_id] for player_id in order),
+        items=tuple(tuple(sorted(item for item in game.items[player_id] if item in AI_SEARCH_ITEMS)) for player_id in order),
+        knife=tuple(game.knife_active[player_id] for player_id in order),
+        cuff=tuple(game.handcuff_active[player_id] for player_id in order),
+        max_hp=game.max_hp,
+        round3=game.round == 3,
+        turn=0 if game.current_turn == ai_id else 1,
+    )
+
+async def request_ai_action(game, ai_id, difficulty):
+    state = encode_ai_state(game, ai_id)
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(get_ai_pool(), choose_ai_action, state, difficulty),
+            AI_DIFFICULTIES[difficulty]["budget"] + AI_QUEUE_SLACK
+        )
+    except (asyncio.TimeoutError, BrokenProcessPool, OSError, RuntimeError, ValueError) as e:
+        # 풀을 만들거나 워커를 띄우지 못해도 AI 턴은 단순 규칙으로 진행
+        print(f"AI search failed for game {game.game_id}: {e!r}")  # 디버깅 로그
+        if isinstance(e, BrokenProcessPool):
+            discard_ai_pool()
+        return fallback_ai_action(state), 0
+
+def apply_ai_action(game, ai_id, action):
+    """AI 행동을 게임에 적용하고 화면에 표시할 (events, results, 탄환 표시 여부)를 반환 (render_game_embed 참고)"""
+    ai_player = game.player1 if ai_id == game.player1.id else game.player2
+    opponent = game.player2 if ai_id == game.player1.id else game.player1
+    kind, name = action
+    events = []
+    results = []
+    if kind == "item":
+        result = game.use_item(ai_id, name, opponent.id)
+        if name in game.items[ai_id]:
+            game.items[ai_id].remove(name)
+        game.save_items()
+        events.append(("아이템 사용", f"{ai_player.display_name}이(가) 돋보기를 사용했습니다." if name == "돋보기" else result))
+        return events, results, ITEMS[name].reveals_chamber
+    target = ai_player if name == "self" else opponent
+    outcome = game.resolve_shot(ai_id, target.id)
+    if outcome["reload_message"]:
+        events.append(("장전", outcome["reload_message"]))
+        return events, results, True
+    result = f"{ai_player.display_name}이(가) {'자신' if target is ai_player else target.display_name}을(를) 쐈습니다. "
+    if outcome["bullet"] == "live":
+        result += f"🔴 실탄! {target.display_name}이(가) {outcome['damage']} 피해를 입었습니다! "
+        if outcome["knife_used"]:
+            result += "(칼 효과: 대미지 2배) "
+        result += f"(체력: {outcome['old_hp']} → {game.hp[target.id]})"
+    else:
+        result += f"🔵 공포탄! {target.display_name}에게 피해 없음!" + (" (추가 턴)" if target is ai_player else "")
+    events.append(("결과", result))
+    if outcome["handcuff_used"] and target is opponent:
+        events.append(("수갑 효과", f"🔗 {ai_player.display_name}이(가) 수갑으로 턴을 유지했습니다!"))
+    if outcome["round_winner"]:
+        winner = game.player1 if outcome["round_winner"] == game.player1.id else game.player2
+        results.append(("라운드 종료", f"{winner.display_name}이(가) 라운드 {min(game.round, 3) if outcome['game_end'] else game.round - 1} 승리!"))
+    if outcome["game_end"]:
+        results.append(("게임 종료", outcome["game_end"]))
+    elif outcome["new_round"]:
+        return [("새 라운드", f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.")], [], True
+    return events, results, False
+
+async def ai_take_turn(game, channel_id):
+    """하우스 AI의 턴이 끝날 때까지 진행 (탐색은 프로세스 풀에서 실행)"""
+    channel = client.get_channel(channel_id) or await client.fetch_channel(channel_id)
+    ai_id = game.player2.id
+    try:
+        while game.status == "active" and game.current_turn == ai_id:
+            await asyncio.sleep(AI_MOVE_DELAY)
+            action, depth = await request_ai_action(game, ai_id, game.ai_difficulty)
+            print(f"AI move in game {game.game_id}: {action} (depth {depth})")  # 디버깅 로그
+            with game.action("ai_turn"):
+                events, results, show_chamber = apply_ai_action(game, ai_id, action)
+            embed = render_game_embed(game, RULESET, events, results, viewer_id=game.player1.id, show_chamber=show_chamber)
+            if game.last_message:
+                try:
+                    await game.last_message.delete()
+                except (discord.NotFound, AttributeError):
+                    pass
+            publish_game_state(game, embed)
+            game.last_message = await channel.send(embed=embed, view=game.view if game.status == "active" else None)
+    finally:
+        game.ai_task = None
+
+def schedule_ai_turn(game, channel_id):
+    """하우스 AI 게임에서 AI 차례가 되면 턴 진행 태스크를 시작"""
+    if (game.ai_difficulty and game.status == "active"
+            and game.current_turn == game.player2.id and not game.ai_task):
+        game.ai_task = asyncio.get_running_loop().create_task(ai_take_turn(game, channel_id))
+
+@tree.command(name="queue", description="실력이 비슷한 상대를 자동으로 찾는 매칭 대기열에 등록합니다.")
+async def queue(interaction: discord.Interaction):
+    if interaction.guild_id is None:
+        await interaction.response.send_message("서버 채널에서만 사용할 수 있습니다!", ephemeral=True)
+        return
+    with connect_db() as conn:
+        c = conn.execute("SELECT game_id FROM games WHERE ruleset = 'classic' AND (player1_id = ? OR player2_id = ?) AND status = 'active'",
+                         (interaction.user.id, interaction.user.id))
+        if c.fetchone():
+            await interaction.response.send_message("이미 진행 중인 게임이 있습니다!", ephemeral=True)
+            return
+    rating = get_player_rating(interaction.user.id)
+    if not matchmaking.enqueue(interaction.guild_id, interaction.channel_id, interaction.user, rating, time.monotonic()):
+        await interaction.response.send_message("이미 매칭 대기 중입니다! 취소하려면 /leave 를 사용하세요.", ephemeral=True)
+        return
+    ensure_matchmaking_loop()
+    await interaction.response.send_message(
+        f"매칭 대기열에 등록되었습니다! (레이팅 {rating:.0f}, 대기 인원 {matchmaking.queue_size(interaction.guild_id)}명)",
+        ephemeral=True
+    )
+
+@tree.command(name="leave", description="매칭 대기열에서 나갑니다.")
+async def leave(interaction: discord.Interaction):
+    if matchmaking.leave(interaction.user.id):
+        await interaction.response.send_message("매칭 대기열에서 나왔습니다.", ephemeral=True)
+    else:
+        await interaction.response.send_message("매칭 대기 중이 아닙니다!", ephemeral=True)
+
+@tree.command(name="spectate", description="진행 중인 게임을 이 채널에서 관전합니다.")
+@app_commands.describe(game_id="관전할 게임 ID (게임 화면 하단에 표시)")
+async def spectate(interaction: discord.Interaction, game_id: str):
+    game = live_games.get(game_id)
+    if not game or game.status != "active":
+        row = get_db().execute("SELECT guild_id FROM games WHERE game_id = ? AND ruleset = 'classic' AND status = 'active'", (game_id,)).fetchone()
+        if row and not owns_guild(row[0]):
+            message = f"다른 샤드({shard_for_guild(row[0], SHARD_COUNT)}번)에서 진행 중인 게임이라 이 서버에서는 관전할 수 없습니다!"
+        else:
+            message = "진행 중인 게임을 찾을 수 없습니다!"
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+    if interaction.user.id in (game.player1.id, game.player2.id):
+        await interaction.response.send_message("자신의 게임은 관전할 수 없습니다!", ephemeral=True)
+        return
+    if spectator_hub.count(game_id) >= MAX_SPECTATORS_PER_GAME:
+        await interaction.response.send_message("관전 채널 수가 최대에 도달했습니다!", ephemeral=True)
+        return
+    if not spectator_hub.subscribe(game, interaction.channel_id, SpectatorMessageSink(interaction.channel)):
+        await interaction.response.send_message("이 채널에서 이미 관전 중인 게임입니다!", ephemeral=True)
+        return
+    await interaction.response.send_message(f"👀 {game.player1.display_name} vs {game.player2.display_name} 관전을 시작합니다!")
+
+@tree.command(name="unspectate", description="이 채널의 게임 관전을 중단합니다.")
+@app_commands.describe(game_id="관전을 중단할 게임 ID")
+async def unspectate(interaction: discord.Interaction, game_id: str):
+    if spectator_hub.unsubscribe(game_id, interaction.channel_id):
+        await interaction.response.send_message("관전을 중단했습니다.")
+    else:
+        await interaction.response.send_message("이 채널에서 관전 중인 게임이 아닙니다!", ephemeral=True)
 
 @tree.command(name="items", description="벅샷 룰렛 게임의 아이템 설명을 확인합니다.")
 async def items(interaction: discord.Interaction):
@@ -808,25 +2347,40 @@ async def items(interaction: discord.Interaction):
         description="각 아이템의 효과를 확인하세요!",
         color=discord.Color.purple()
     )
-    item_descriptions = {
-        "맥주": "샷건에서 현재 탄환을 배출하고 실탄인지 공포탄인지 확인합니다. (-$495)",
-        "돋보기": "다음 탄환의 종류(실탄/공포탄)를 확인합니다.",
-        "담배": "체력을 1 회복합니다. 최대 체력은 4입니다. 3라운드에서 체력 2 이하 시 사용 불가. (-$220)",
-        "칼": "다음 샷의 대미지를 2배로 만듭니다.",
-        "수갑": "다음 상대 샷 후에도 턴을 유지합니다.",
-        "주사기": "상대의 아이템 하나를 선택해 훔쳐 즉시 사용합니다. (-$3000)",
-        "버너폰": "잔탄 3발 이상 시, 마지막 탄환의 종류를 확인합니다. 잔탄 2발 시 '안타깝게... 됐군...' 메시지 출력.",
-        "인버터": "다음 탄환의 상태를 반전시킵니다(실탄 ↔ 공포탄).",
-        "재머": "상대의 다음 아이템 사용을 무효화합니다.",
-        "상한 약": "(Double or Nothing 전용) 50% 확률로 체력 2 회복 또는 체력 1 감소. 최대 체력 초과 불가."
-    }
-    for item, description in item_descriptions.items():
-        embed.add_field(name=item, value=description, inline=False)
+    for item in ITEM_CONFIG.items:
+        description = item.description
+        if item.modes and len(item.modes) == 1:
+            description = f"({item.modes[0]} 전용) {description}"
+        if item.cost:
+            description += f" (-${item.cost})"
+        embed.add_field(name=item.name, value=description, inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="distribution", description="라운드별 탄환 구성 확률과 아이템 배분 규칙을 확인합니다.")
+async def distribution(interaction: discord.Interaction):
+    embed = discord.Embed(
+        title="벅샷 룰렛 확률표 🎲",
+        description="장전과 아이템 배분은 아래 확률표를 그대로 따릅니다.",
+        color=discord.Color.purple()
+    )
+    # 같은 확률표를 쓰는 라운드는 하나로 묶어서 표시
+    grouped = {}
+    for round_num, odds in RULESET.chamber_odds.items():
+        grouped.setdefault(tuple(sorted(odds.items())), []).append(round_num)
+    for odds, rounds in grouped.items():
+        lines = [f"🔴 {live}발 / 🔵 {blank}발: {float(p) * 100:.1f}%" for (live, blank), p in odds]
+        embed.add_field(name=f"라운드 {', '.join(map(str, rounds))} 장전", value="\n".join(lines), inline=True)
+    for mode, pool in ITEM_POOLS.items():
+        embed.add_field(
+            name=f"아이템 배분 ({mode})",
+            value=f"{len(pool)}종 중 이미 가진 아이템을 제외한 모든 조합이 같은 확률로 뽑힙니다.",
+            inline=False
+        )
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="money", description="현재 보유한 상금을 확인합니다.")
 async def money(interaction: discord.Interaction):
-    with sqlite3.connect("buckshot.db") as conn:
+    with connect_db() as conn:
         c = conn.cursor()
         c.execute("SELECT total_money, item_usage_history FROM player_money WHERE player_id = ?", (interaction.user.id,))
         result = c.fetchone()
@@ -845,31 +2399,1127 @@ async def money(interaction: discord.Interaction):
         embed.add_field(name="아이템 사용 내역", value="없음", inline=False)
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+@tree.command(name="rating", description="플레이어의 레이팅을 확인합니다.")
+@app_commands.describe(user="확인할 유저 (기본: 자신)")
+async def rating(interaction: discord.Interaction, user: discord.Member = None):
+    user = user or interaction.user
+    row = get_db().execute("SELECT rating, rd, games FROM player_ratings WHERE player_id = ?", (user.id,)).fetchone()
+    rating_value, rd, games = row if row else (DEFAULT_RATING, DEFAULT_RD, 0)
+    embed = discord.Embed(
+        title="레이팅 정보 📈",
+        description=f"{user.display_name}의 Glicko 레이팅",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="레이팅", value=f"{rating_value:.0f}", inline=True)
+    embed.add_field(name="RD (불확실성)", value=f"±{rd:.0f}", inline=True)
+    embed.add_field(name="경기 수", value=f"{games}", inline=True)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="recompute_ratings", description="전체 경기 기록으로 레이팅을 다시 계산합니다. (관리자 전용)")
+async def recompute_ratings_command(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("이 명령어는 관리자만 사용할 수 있습니다!", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    def recompute():
+        with connect_db() as conn:
+            return recompute_ratings(conn)
+
+    result = await asyncio.to_thread(recompute)
+    await interaction.followup.send(
+        f"레이팅 재계산 완료: 경기 {result['games']:,}개, 플레이어 {result['players']:,}명 ({result['seconds']:.2f}s)",
+        ephemeral=True
+    )
+
+@tree.command(name="audit_ledger", description="상금 원장과 잔액이 일치하는지 검증합니다. (관리자 전용)")
+async def audit_ledger_command(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("이 명령어는 관리자만 사용할 수 있습니다!", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    flush_pending_commits()  # 대기 중인 정산까지 반영한 뒤 검증
+
+    def audit():
+        with connect_db() as conn:
+            return audit_ledger(conn)
+
+    result = await asyncio.to_thread(audit)
+    lines = [f"거래 {result['transactions']:,}건, 원장 행 {result['entries']:,}개 ({result['seconds']:.2f}s)"]
+    if result["unbalanced"]:
+        lines.append(f"⚠️ 합이 0이 아닌 거래: {result['unbalanced']}건")
+    for account_id, balance, ledger_total in result["mismatched"][:10]:
+        lines.append(f"⚠️ 계정 {account_id}: 잔액 ${balance:,} / 원장 합계 ${ledger_total:,}")
+    if len(result["mismatched"]) > 10:
+        lines.append(f"... 외 {len(result['mismatched']) - 10}계정")
+    if not result["unbalanced"] and not result["mismatched"]:
+        lines.append("✅ 모든 거래의 합이 0이고 계정별 원장 합계가 잔액과 일치합니다.")
+    await interaction.followup.send("\n".join(lines), ephemeral=True)
+
+@tree.command(name="export_games", description="끝난 게임 기록을 분석용 파일로 내보냅니다. (관리자 전용)")
+@app_commands.describe(file_format="csv 또는 parquet", full="처음부터 전부 내보내기 (기본: 마지막 내보내기 이후만)")
+async def export_games(interaction: discord.Interaction, file_format: str = "csv", full: bool = False):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("이 명령어는 관리자만 사용할 수 있습니다!", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    ensure_db()
+    try:
+        result = await asyncio.to_thread(export_archive, buckshot_core.DB_PATH, file_format, not full)
+    except ValueError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    if not result["rows"]:
+        await interaction.followup.send(f"새로 내보낼 게임이 없습니다. (워터마크: {result['watermark']})", ephemeral=True)
+        return
+    await interaction.followup.send(
+        f"게임 {result['rows']:,}개를 파일 {len(result['files'])}개로 내보냈습니다 ({result['seconds']:.2f}s)\n"
+        f"경로: {os.path.abspath(EXPORT_DIR)} | 워터마크: {result['since']} → {result['watermark']}",
+        ephemeral=True
+    )
+
 @tree.command(name="init_db", description="벅샷 룰렛 데이터베이스를 초기화합니다. (관리자 전용)")
 async def init_db_command(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("이 명령어는 관리자만 사용할 수 있습니다!", ephemeral=True)
         return
-    success, message = init_db()
+    success, message = init_db(reset=True)
     await interaction.response.send_message(message, ephemeral=True)
 
+class SimulatedPlayer:
+    """벤치마크용 가상 플레이어"""
+    def __init__(self, player_id):
+        self.id = player_id
+        self.display_name = f"sim{player_id}"
+        self.mention = f"<@{player_id}>"
+        self.bot = False
+
+class SimulatedMessage:
+    """벤치마크용 가상 게임 메시지"""
+    def __init__(self, message_id):
+        self.id = message_id
+
+    async def delete(self):
+        pass
+
+    async def edit(self, **kwargs):
+        pass
+
+async def simulate_game(game, rng, on_action=None, delay=0):
+    """무작위로 쏘는 두 플레이어로 게임 한 판을 끝까지 진행 (행동마다 이벤트 루프에 양보)"""
+    while game.status != "finished":
+        shooter_id = game.current_turn
+        opponent_id = game.player2.id if shooter_id == game.player1.id else game.player1.id
+        target_id = shooter_id if rng.random() < 0.5 else opponent_id
+        bullet = game.resolve_shot(shooter_id, target_id)["bullet"]
+        if on_action:
+            on_action(game, bullet)
+        await asyncio.sleep(delay)
+
+async def simulate_tournament(conn, player_count, fmt):
+    rng = random.Random(player_count)
+    players = {player_id: SimulatedPlayer(player_id) for player_id in range(1, player_count + 1)}
+    stats = {"matches": 0, "live": 0, "peak": 0}
+    tasks = set()
+
+    async def run_match(manager, tournament, match_id, player1_id, player2_id):
+        game = BuckshotGame(players[player1_id], players[player2_id], seed=rng.randrange(2 ** 63), conn=conn)
+        game.status = "active"
+        game.tournament_match = (tournament["tournament_id"], match_id)
+        stats["matches"] += 1
+        stats["live"] += 1
+        stats["peak"] = max(stats["peak"], stats["live"])
+
+        def on_end(finished_game):
+            stats["live"] -= 1
+            manager.on_game_end(tournament["tournament_id"], match_id, finished_game)
+
+        game.end_callbacks.append(on_end)
+        task = asyncio.get_running_loop().create_task(simulate_game(game, random.Random(game.rng.seed)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    manager = TournamentManager(conn, run_match)
+    tournament_id = manager.create(0, 0, 0, "benchmark", fmt, player_count)
+    ledger_before = dict(ledger_stats)
+    for player_id in players:
+        manager.join(tournament_id, player_id)
+    started = time.perf_counter()
+    await manager.start(tournament_id)
+    await manager.wait_finished(tournament_id)
+    elapsed = time.perf_counter() - started
+    settle_all(conn)
+    tournament = manager.get(tournament_id)
+    audit = audit_ledger(conn)
+    return {
+        "참가자": f"{player_count}명 ({fmt})",
+        "라운드": tournament["round"],
+        "경기 수": stats["matches"],
+        "최대 동시 경기": stats["peak"],
+        "소요 시간": f"{elapsed:.2f}s",
+        "경기당 평균": f"{elapsed / max(stats['matches'], 1) * 1000:.1f}ms",
+        "상금 정산": (
+            f"거래 {ledger_stats['transactions'] - ledger_before['transactions']}건, "
+            f"커밋 {ledger_stats['settlements'] - ledger_before['settlements']}회"
+        ),
+        "원장 검증": "일치" if not audit["unbalanced"] and not audit["mismatched"] else f"불일치 {len(audit['mismatched'])}계정",
+    }
+
+def run_tournament_benchmark(player_count=MAX_TOURNAMENT_PLAYERS, fmt="double"):
+    """가상 플레이어로 브래킷 전체를 시뮬레이션 (임시 DB 사용)"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            return asyncio.run(simulate_tournament(conn, player_count, fmt))
+        finally:
+            settle_all(conn)  # 끝난 게임의 상금 중 아직 정산되지 않은 거래
+            conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_matchmaking_benchmark(player_count=5000, arrival_rate=100.0, guild_count=20):
+    """가상 도착 흐름(포아송)으로 매칭 대기열을 시뮬레이션해 매칭 대기 시간과 매칭당 CPU 시간을 측정"""
+    rng = random.Random(player_count)
+    service = MatchmakingService()
+    now = 0.0
+    arrivals = []
+    for player_id in range(1, player_count + 1):
+        now += rng.expovariate(arrival_rate)
+        arrivals.append((now, player_id, rng.gauss(DEFAULT_RATING, 300), rng.randrange(guild_count)))
+    waits = []
+    cpu = 0.0
+    clock = 0.0
+    idx = 0
+    while idx < len(arrivals) or service.queued:
+        clock += MATCH_INTERVAL
+        started = time.thread_time()
+        while idx < len(arrivals) and arrivals[idx][0] <= clock:
+            arrived_at, player_id, rating, guild_id = arrivals[idx]
+            service.enqueue(guild_id, guild_id, SimulatedPlayer(player_id), rating, arrived_at)
+            idx += 1
+        for channel_id, player1, player2, waited1, waited2 in service.tick(clock):
+            waits.extend((waited1, waited2))
+        cpu += time.thread_time() - started
+        if idx >= len(arrivals) and clock > arrivals[-1][0] + MATCH_WINDOW_MAX / MATCH_WINDOW_GROWTH + MATCH_INTERVAL:
+            break  # 최대 허용 폭에서도 상대가 없는 나머지는 미매칭으로 집계
+    waits.sort()
+    pairs = len(waits) // 2
+    return {
+        "도착": f"{player_count}명 ({arrival_rate:.0f}명/s, 길드 {guild_count}개)",
+        "매칭": f"{pairs}쌍 (미매칭 {len(service.queued)}명)",
+        "평균 대기": f"{sum(waits) / max(len(waits), 1):.1f}s",
+        "p50 대기": f"{waits[len(waits) // 2] if waits else 0:.1f}s",
+        "p95 대기": f"{waits[int(len(waits) * 0.95)] if waits else 0:.1f}s",
+        "매칭당 CPU": f"{cpu / max(pairs, 1) * 1e6:.1f}µs",
+    }
+
+def run_ratings_benchmark(game_count=1000000, player_count=10000, days=365):
+    """가상 경기 기록을 만들어 레이팅 일괄 재계산 처리량을 측정"""
+    rng = random.Random(game_count)
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        with sqlite3.connect(db_path) as conn:
+            strength = [rng.gauss(0, 1) for _ in range(player_count)]
+            rows = []
+            for idx in range(game_count):
+                player1, player2 = rng.sample(range(player_count), 2)
+                win_chance = 1 / (1 + math.exp(strength[player2] - strength[player1]))
+                winner = player1 if rng.random() < win_chance else player2
+                rows.append((None, idx * days * RATING_PERIOD / game_count, player1 + 1, player2 + 1, winner + 1))
+            conn.executemany(
+                "INSERT INTO match_history (game_id, played_at, player1_id, player2_id, winner_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            result = recompute_ratings(conn)
+        return {
+            "경기 기록": f"{result['games']:,}개",
+            "플레이어": f"{result['players']:,}명",
+            "재계산 시간": f"{result['seconds']:.2f}s",
+            "처리량": f"{result['games'] / result['seconds']:,.0f} 경기/s",
+            "계산 방식": "numpy" if optional_module("numpy") is not None else "순수 파이썬",
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def simulate_spectators(conn, game_count, spectators_per_game):
+    rng = random.Random(game_count)
+    hub = SpectatorHub()
+    publish_times = []
+    subscriptions = []
+    games = []
+    for idx in range(game_count):
+        game = BuckshotGame(SimulatedPlayer(idx * 2 + 1), SimulatedPlayer(idx * 2 + 2), seed=rng.randrange(2 ** 63), conn=conn)
+        game.status = "active"
+        games.append(game)
+        for key in range(spectators_per_game):
+            latency = 0.2 if key % 10 == 0 else rng.uniform(0.001, 0.02)  # 열 명 중 한 명은 느린 채널
+
+            async def sink(state, latency=latency):
+                await asyncio.sleep(latency)
+
+            subscriptions.append(hub.subscribe(game, key, sink, discord.Embed()))
+
+    def on_action(game, bullet):
+        embed = discord.Embed(title="벅샷 룰렛 🔫")
+        embed.add_field(name="결과", value=f"{bullet}", inline=False)
+        started = time.perf_counter()
+        hub.publish(game, embed)
+        publish_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate_game(game, random.Random(game.rng.seed), on_action, delay=0.01) for game in games))  # 플레이어 화면 갱신 간격 10ms
+    played = time.perf_counter() - started
+    await asyncio.gather(*(subscription.task for subscription in subscriptions))
+    drained = time.perf_counter() - started
+    publish_times.sort()
+    sent = sum(subscription.sent for subscription in subscriptions)
+    coalesced = sum(subscription.coalesced for subscription in subscriptions)
+    return {
+        "게임": f"{game_count}개 (관전자 {spectators_per_game}명씩)",
+        "발행": f"{len(publish_times):,}회",
+        "발행 p50": f"{publish_times[len(publish_times) // 2] * 1e6:.0f}µs",
+        "발행 최대": f"{publish_times[-1] * 1e6:.0f}µs",
+        "전송": f"{sent:,}회 (병합 {coalesced:,}회)",
+        "게임 진행 시간": f"{played:.2f}s",
+        "관전 전송 완료": f"{drained:.2f}s",
+    }
+
+def run_spectator_benchmark(game_count=20, spectators_per_game=50):
+    """게임마다 관전자 50명(일부는 느린 채널)을 붙여 발행 지연과 전송 병합을 측정"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            return asyncio.run(simulate_spectators(conn, game_count, spectators_per_game))
+        finally:
+            settle_all(conn)  # 끝난 게임의 상금 중 아직 정산되지 않은 거래
+            conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def simulate_ai_games(conn, game_count, difficulty):
+    rng = random.Random(game_count)
+    latencies, depths, lags = [], [], []
+    playing = True
+
+    async def watch_loop():  # 이벤트 루프가 막히면 sleep이 늦게 깨어남
+        while playing:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    async def play(idx):
+        game = BuckshotGame(SimulatedPlayer(idx * 2 + 1), SimulatedPlayer(idx * 2 + 2), seed=rng.randrange(2 ** 63), conn=conn)
+        game.status = "active"
+        game_rng = random.Random(game.rng.seed)
+        ai_id = game.player2.id
+        while game.status != "finished":
+            if game.current_turn == ai_id:
+                started = time.perf_counter()
+                action, depth = await request_ai_action(game, ai_id, difficulty)
+                latencies.append(time.perf_counter() - started)
+                depths.append(depth)
+                apply_ai_action(game, ai_id, action)
+            else:
+                target_id = game.player1.id if game_rng.random() < 0.5 else ai_id
+                game.resolve_shot(game.player1.id, target_id)
+                await asyncio.sleep(0)
+        return game.winner_id == ai_id
+
+    watcher = asyncio.get_running_loop().create_task(watch_loop())
+    started = time.perf_counter()
+    wins = await asyncio.gather(*(play(idx) for idx in range(game_count)))
+    elapsed = time.perf_counter() - started
+    playing = False
+    await watcher
+    latencies.sort()
+    return {
+        "게임": f"{game_count}개 동시 진행 (난이도 {difficulty}, 워커 {AI_WORKERS}개)",
+        "AI 수": f"{len(latencies):,}회",
+        "AI 승률": f"{sum(wins) / game_count:.0%} (무작위 상대)",
+        "수당 p50": f"{latencies[len(latencies) // 2] * 1000:.0f}ms",
+        "수당 p95": f"{latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms",
+        "평균 탐색 깊이": f"{sum(depths) / max(len(depths), 1):.1f}",
+        "루프 지연 최대": f"{max(lags) * 1000:.1f}ms",
+        "소요 시간": f"{elapsed:.2f}s",
+    }
+
+def run_ai_benchmark(game_count=50, difficulty="normal"):
+    """하우스 AI와 무작위 상대의 게임을 동시에 진행해 수당 지연과 이벤트 루프 지연을 측정"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            return asyncio.run(simulate_ai_games(conn, game_count, difficulty))
+        finally:
+            settle_all(conn)  # 끝난 게임의 상금 중 아직 정산되지 않은 거래
+            conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# /bench 대상 (관리자 전용, 별도 스레드에서 실행)
+def run_snapshot_benchmark(sizes=(10000, 100000), lookups=1000):
+    """게임 1만/10만 개를 스냅샷으로 저장하고 시작 시 열기, 첫 상호작용 복원, 전체 복원 시간을 측정"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            template = BuckshotGame(SimulatedPlayer(1), SimulatedPlayer(2), seed=0, conn=conn)
+            template.channel_id = 1
+            template_state = template.to_snapshot()
+            live_games.pop(template.game_id, None)
+            result = {}
+            for size in sizes:
+                games = []
+                for idx in range(size):
+                    state = dict(template_state, game_id=str(uuid4()), players=[[idx * 2 + 1, f"sim{idx * 2 + 1}"], [idx * 2 + 2, f"sim{idx * 2 + 2}"]])
+                    state["current_turn"] = idx * 2 + 1
+                    games.append(BuckshotGame.from_snapshot(state, conn=conn))
+                path = os.path.join(workdir, f"snapshot_{size}.bin")
+                started = time.perf_counter()
+                file_size = write_snapshot(path, snapshot_entries(games, time.time()), SNAPSHOT_VERSION)
+                save_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                snapshot = open_snapshot(path)
+                open_seconds = time.perf_counter() - started
+                rng = random.Random(size)
+                lookup_times = []
+                for game in rng.sample(games, min(lookups, size)):
+                    started = time.perf_counter()
+                    BuckshotGame.from_snapshot(snapshot.take(game.game_id), conn=conn)
+                    lookup_times.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                for game in games:
+                    state = snapshot.take(game.game_id)
+                    if state:
+                        BuckshotGame.from_snapshot(state, conn=conn)
+                restore_all_seconds = time.perf_counter() - started
+                snapshot.close()
+                lookup_times.sort()
+                result[f"{size:,}개 저장"] = f"{save_seconds:.2f}s ({file_size / 2 ** 20:.1f}MB)"
+                result[f"{size:,}개 열기"] = f"{open_seconds * 1000:.2f}ms"
+                result[f"{size:,}개 첫 복원 p50/p99"] = (
+                    f"{lookup_times[len(lookup_times) // 2] * 1e6:.0f}µs / {lookup_times[int(len(lookup_times) * 0.99)] * 1e6:.0f}µs"
+                )
+                result[f"{size:,}개 전체 복원"] = f"{restore_all_seconds:.2f}s"
+            return result
+        finally:
+            conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_memory_benchmark(game_count=10000):
+    """게임 1만 개를 띄운 채 게임당 메모리를 재고, 모두 끝낸 뒤 end_game 이후에도 남는 게임이 있는지 확인"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            template = BuckshotGame(SimulatedPlayer(1), SimulatedPlayer(2), seed=0, conn=conn)
+            template.channel_id = 1
+            template_state = template.to_snapshot()
+            template.end_game("timeout")
+            del template
+            states = []
+            for idx in range(game_count):
+                state = dict(template_state, game_id=str(uuid4()), players=[[idx * 2 + 1, f"sim{idx * 2 + 1}"], [idx * 2 + 2, f"sim{idx * 2 + 2}"]])
+                state["current_turn"] = idx * 2 + 1
+                states.append(state)
+            return asyncio.run(measure_game_memory(states, conn))
+        finally:
+            settle_all(conn)
+            conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def measure_game_memory(states, conn):
+    """실제 게임처럼 화면(view), 버튼 콜백 클로저, 게시한 메시지까지 붙인 게임의 메모리와 종료 후 해제를 측정
+
+    discord.ui.View는 실행 중인 이벤트 루프가 있어야 만들 수 있어 코루틴 안에서 잰다.
+    """
+    game_count = len(states)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for idx, state in enumerate(states):
+        game = BuckshotGame.from_snapshot(state, conn=conn)
+        live_games[game.game_id] = game
+        build_game_view(game, game.channel_id)
+        game.last_message = SimulatedMessage(idx + 1)
+    live_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    game_ids = [state["game_id"] for state in states]
+    states.clear()
+    del game
+
+    started = time.perf_counter()
+    for game_id in game_ids:
+        live_games[game_id].end_game("timeout")
+    end_seconds = time.perf_counter() - started
+    flush_pending_commits()
+    leaked = report_leaked_games(grace=0)
+    return {
+        "게임 수": f"{game_count:,}",
+        "게임당 메모리 (화면 포함)": f"{live_bytes / game_count:,.0f} bytes",
+        "전체": f"{live_bytes / 2 ** 20:.1f}MB",
+        "종료 처리": f"{end_seconds:.2f}s",
+        "end_game 이후 남은 게임": f"{len(leaked):,}",
+    }
+
+def run_admission_benchmark(invites=20000, guilds=40, users=5000):
+    """초대 폭주를 한도 카운터와 대기열에 흘려 보내 확인 한 번의 비용과 대기열 처리, 카운터 정합성을 확인"""
+    control = AdmissionControl()
+
+    async def raid():
+        admitted, refused, waiting = [], 0, []
+        started = time.perf_counter()
+        for idx in range(invites):
+            user_id, guild_id = 10 + idx % users, idx % guilds
+            blocked = control.check("pending", guild_id, [user_id])
+            if blocked is None:
+                game_id = f"raid-{idx}"
+                control._track(game_id, control.entry_for("pending", guild_id, [user_id]))
+                admitted.append((game_id, guild_id, user_id))
+            elif blocked == "user" or control.position(user_id) or len(control.queue) >= INVITE_QUEUE_SIZE:
+                refused += 1
+            else:
+                def create(game_id=f"raid-{idx}", guild_id=guild_id, user_id=user_id):
+                    control._track(game_id, control.entry_for("pending", guild_id, [user_id]))
+                    return game_id, guild_id, user_id
+                waiting.append(control.enqueue("pending", guild_id, (user_id,), create)[1])
+        check_seconds = time.perf_counter() - started
+        queued = len(control.queue)
+        # 초대를 절반은 수락, 절반은 거절하면서 대기열이 앞에서부터 빠지는지 확인
+        while admitted:
+            for number, (game_id, guild_id, user_id) in enumerate(admitted):
+                opponent_id = 10 ** 6 + number
+                if number % 2 or control.check("active", guild_id, [user_id, opponent_id], reserved=True):
+                    control._track(game_id, None)
+                else:
+                    control._track(game_id, control.entry_for("active", guild_id, [user_id, opponent_id]))
+            admitted = []
+            await asyncio.sleep(0)
+            admitted = [future.result() for future in waiting if future.done() and not future.cancelled()]
+            waiting = [future for future in waiting if not future.done()]
+            for game_id in [game_id for game_id, entry in control.tracked.items() if entry[0] == "active"]:
+                control._track(game_id, None)
+        return refused, queued, check_seconds
+
+    refused, queued, check_seconds = asyncio.run(raid())
+    recount = AdmissionControl()
+    for game_id, entry in control.tracked.items():
+        recount._track(game_id, entry)
+    return {
+        "초대 수": f"{invites:,}",
+        "한도 확인": f"{check_seconds / invites * 1e6:.2f}µs/건",
+        "대기열 최대": f"{queued:,}",
+        "거절 (유저 한도, 대기열 초과)": f"{refused:,}",
+        "남은 대기": f"{len(control.queue):,}",
+        "카운터 재계산": "일치" if recount.counts == control.counts else "불일치",
+    }
+
+def run_throttle_benchmark(interactions=200000, users=50000, spammers=5):
+    """연타하는 유저와 보통 유저의 상호작용을 섞어 흘려 보내 확인 비용, 통과율, 버킷 수 상한을 확인"""
+    user_buckets = TokenBucketLimiter(THROTTLE_USER_RATE, THROTTLE_USER_BURST)
+    game_buckets = TokenBucketLimiter(THROTTLE_GAME_RATE, THROTTLE_GAME_BURST)
+    rng = random.Random(0)
+    passed = {"spam": 0, "normal": 0}
+    sent = {"spam": 0, "normal": 0}
+    started = time.perf_counter()
+    for idx in range(interactions):
+        now = idx / 1000  # 초당 1000건
+        if idx % 10 == 0:  # 연타: 같은 게임을 초당 20번씩 누르는 유저들
+            kind, user_id, game_id = "spam", idx // 10 % spammers, f"spam-{idx // 10 % spammers}"
+        else:
+            user_id = spammers + rng.randrange(users)
+            kind, game_id = "normal", f"game-{user_id // 2}"
+        sent[kind] += 1
+        refused = take_tokens(user_id, game_id, now, user_buckets, game_buckets)
+        if refused is None:
+            passed[kind] += 1
+        elif kind == "spam":
+            refused[0].first_refusal(refused[1])
+    elapsed = time.perf_counter() - started
+    return {
+        "상호작용": f"{interactions:,}",
+        "확인 비용": f"{elapsed / interactions * 1e6:.2f}µs/건",
+        "연타 통과율": f"{passed['spam'] / sent['spam']:.1%}",
+        "일반 통과율": f"{passed['normal'] / sent['normal']:.1%}",
+        "버킷 수 (유저/게임)": f"{len(user_buckets.buckets):,} / {len(game_buckets.buckets):,} (상한 {THROTTLE_MAX_BUCKETS:,})",
+    }
+
+# 시작 시간 측정용 자식 프로세스: bot.py를 import하고 두 룰셋의 on_ready를 호출 (게이트웨이 연결과 명령어 동기화는 제외)
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import bot
+from buckshot_core import command_tree_digest
+loaded = time.perf_counter()
+
+async def ready():
+    for ruleset in bot.RULESETS.values():
+        await ruleset.on_ready()
+
+asyncio.run(ready())
+ready_at = time.perf_counter()
+digest_started = time.perf_counter()
+command_tree_digest(bot.tree)
+print(json.dumps({{
+    "import": loaded - started, "ready": ready_at - loaded, "digest": time.perf_counter() - digest_started,
+    "lazy": [name for name in ("numpy", "pyarrow") if name not in sys.modules],
+}}))
+"""
+
+def run_startup_benchmark(runs=5):
+    """bot.py를 새 프로세스로 띄워 import부터 on_ready까지의 시간을 잼 (첫 실행은 DB와 파일이 없는 상태)"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    probe = STARTUP_PROBE.format(root=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", probe], cwd=workdir, capture_output=True, text=True, check=True).stdout
+            sample = json.loads(output.splitlines()[-1])
+            sample["wall"] = time.perf_counter() - started
+            samples.append(sample)
+        cold = samples[0]
+        warm = sorted(samples[1:] or samples, key=lambda sample: sample["wall"])[len(samples[1:] or samples) // 2]
+        return {
+            "첫 시작 (DB 생성)": f"프로세스 {cold['wall'] * 1000:.0f}ms | import {cold['import'] * 1000:.0f}ms | on_ready {cold['ready'] * 1000:.0f}ms",
+            "재시작 중앙값": f"프로세스 {warm['wall'] * 1000:.0f}ms | import {warm['import'] * 1000:.0f}ms | on_ready {warm['ready'] * 1000:.0f}ms",
+            "명령 해시": f"{warm['digest'] * 1000:.2f}ms",
+            "시작 시 import하지 않은 선택 의존성": ", ".join(warm["lazy"]) or "없음",
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_maintenance_benchmark(abandoned=20000, active=200, orphaned=20000):
+    """중단된 게임과 게임 행 없이 남은 상태 행이 쌓인 DB를 정리 작업으로 치우고 지운 행, 돌려준 바이트, 최대 잠금 시간을 잼"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        game_ids = [(f"bench-{idx}", "interrupted" if idx < abandoned else "active") for idx in range(abandoned + active)]
+        conn.executemany(
+            "INSERT INTO games (game_id, player1_id, player2_id, round, scores, status, prize, double_or_nothing, seed, guild_id) VALUES (?, 1, 2, 1, '{}', ?, 0, 0, 0, 0)",
+            game_ids
+        )
+        state = (1, 1, '{"1": 3, "2": 3}', '["live", "blank", "live"]', "{}", "{}", "{}", "{}", "[]", '{"1": ["맥주"], "2": ["칼"]}')
+        conn.executemany(
+            "INSERT INTO game_states (game_id, turn, current_turn_id, hp, chamber, knife_active, handcuff_active, jammer_active, item_usage, rng_state, items) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(game_id, *state) for game_id, _ in game_ids] + [(f"orphan-{idx}", *state) for idx in range(orphaned)]
+        )
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before = os.path.getsize(db_path)
+        conn.close()
+        worker = DatabaseMaintenance(db_path, pause=0, sweeps=[sweep_classic_games])  # 배치 사이 대기는 빼고 정리 자체의 비용만 잼
+        started = time.perf_counter()
+        reports = []
+        while True:  # 한 주기에 MAINTENANCE_MAX_ROWS행까지만 지우므로 남은 것이 없을 때까지 반복
+            reports.append(asyncio.run(worker.run(idle=True)))
+            if not any(reports[-1]["removed"].values()) and len(reports) > 1:
+                break
+        elapsed = time.perf_counter() - started
+        conn = sqlite3.connect(db_path)
+        remaining = conn.execute("SELECT COUNT(*), COUNT(DISTINCT game_id) FROM game_states").fetchone()
+        conn.close()
+        return {
+            "지운 게임 / 상태 행": f"{worker.stats['games']:,} / {worker.stats['states']:,}",
+            "남은 상태 행 (게임 수)": f"{remaining[0]:,} ({remaining[1]:,})",
+            "돌려준 바이트 (DB + WAL)": f"{worker.stats['reclaimed_bytes']:,} (DB 파일 {size_before:,} → {os.path.getsize(db_path):,})",
+            "최대 잠금 시간": f"{worker.stats['max_lock_ms']:.2f}ms",
+            "주기 수": len(reports),
+            "소요 시간": f"{elapsed:.2f}s",
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def bench_shoot(game):
+    """상대 쏘기 버튼과 같은 순서: 샷, 턴 넘김"""
+    shooter_id = game.current_turn
+    target_id = game.player2.id if shooter_id == game.player1.id else game.player1.id
+    bullet, extra_turn, damage, reload_message, handcuff_used, knife_used, old_hp = game.shoot(shooter_id, target_id)
+    if bullet and not handcuff_used and game.hp[target_id] > 0:
+        game.switch_turn()
+
+def bench_use_item(game):
+    """아이템 선택 메뉴와 같은 순서: 맥주 사용, 사용한 아이템 제거"""
+    user_id = game.current_turn
+    opponent_id = game.player2.id if user_id == game.player1.id else game.player1.id
+    game.use_item(user_id, "맥주", opponent_id)
+    game.items[user_id].remove("맥주")
+    game.save_items()
+
+def bench_steal(game):
+    """주사기 처리 순서: 훔친 아이템을 손에 옮겨 사용한 뒤 주사기와 함께 제거"""
+    user_id = game.current_turn
+    opponent_id = game.player2.id if user_id == game.player1.id else game.player1.id
+    game.items[opponent_id].remove("칼")
+    game.items[user_id].append("칼")
+    game.use_item(user_id, "칼", opponent_id)
+    game.items[user_id].remove("칼")
+    game.items[user_id].remove("주사기")
+    game.save_items()
+
+def run_action_benchmark(repeats=200):
+    """샷, 아이템 사용, 주사기 훔치기를 action 없이 / action 안에서 처리할 때 행동 하나의 DB 쓰기와 커밋 횟수를 셈
+
+    io_stats는 프로세스 전체 카운터라 봇이 처리 중인 다른 게임의 I/O도 섞이므로 한가할 때 실행한다.
+    """
+    cases = (
+        ("샷", bench_shoot),
+        ("아이템 사용 (맥주)", bench_use_item),
+        ("주사기로 칼 훔치기", bench_steal),
+    )
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        result = {}
+        started = time.perf_counter()
+        try:
+            for name, run in cases:
+                counts = {}
+                for mode in ("action 없이", "action"):
+                    totals = dict.fromkeys(io_stats, 0)
+                    for idx in range(repeats):
+                        game = BuckshotGame(SimulatedPlayer(1), SimulatedPlayer(2), seed=idx, conn=conn)
+                        live_games.pop(game.game_id, None)
+                        game.status = "active"
+                        game.items = SeatPair(game.seats, ["맥주", "주사기"], ["칼"])
+                        game.current_turn = game.player1.id
+                        game.save_items()
+                        before = dict(io_stats)
+                        if mode == "action":
+                            with game.action():
+                                run(game)
+                        else:
+                            run(game)
+                        for key in totals:
+                            totals[key] += io_stats[key] - before[key]
+                    counts[mode] = {key: total / repeats for key, total in totals.items()}
+                legacy_counts, action_counts = counts["action 없이"], counts["action"]
+                result[f"{name}: action 없이 → action"] = (
+                    f"DB 쓰기 {legacy_counts['db_writes']:.1f} → {action_counts['db_writes']:.1f}, "
+                    f"커밋 {legacy_counts['db_commits']:.1f} → {action_counts['db_commits']:.1f}"
+                )
+        finally:
+            conn.close()
+        result["게임 수"] = f"경우마다 {repeats}개"
+        result["소요 시간"] = f"{time.perf_counter() - started:.2f}s"
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_export_benchmark(game_count=1000000, chunk_rows=EXPORT_CHUNK_ROWS):
+    """게임 기록 100만 행을 CSV 청크로 내보냄: 앞쪽 일부로 최대 메모리를 재고, 나머지는 증분 내보내기로 처리량을 잼"""
+    workdir = tempfile.mkdtemp(prefix="buckshot_bench_")
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        init_db(db_path)
+        rng = random.Random(game_count)
+        now = time.time()
+
+        def archive_rows(start, count):
+            for idx in range(start, start + count):
+                player1_id, player2_id = rng.randrange(10000), rng.randrange(10000, 20000)
+                score1 = rng.randint(0, 2)
+                yield (str(uuid4()), now + idx, rng.uniform(60, 900), "finished", "Normal", idx, player1_id, player2_id,
+                       player1_id if score1 == 2 else player2_id, 3, score1, 2 - score1 if score1 < 2 else rng.randint(0, 1),
+                       rng.randrange(60000, 70001), json.dumps({"맥주": rng.randint(0, 3)}, ensure_ascii=False),
+                       json.dumps({"담배": rng.randint(0, 2)}, ensure_ascii=False), "[[1,2,2],[2,3,3],[3,4,4]]")
+
+        def insert(start, count):
+            with sqlite3.connect(db_path) as conn:
+                conn.executemany(
+                    '''INSERT INTO game_archive (game_id, finished_at, duration, end_reason, mode, seed, player1_id, player2_id,
+                                                  winner_id, rounds, score1, score2, prize, items_used1, items_used2, chambers)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    archive_rows(start, count)
+                )
+
+        export_dir = os.path.join(workdir, "exports")
+        traced_count = min(chunk_rows * 3, game_count)
+        insert(0, traced_count)
+        tracemalloc.start()  # 추적 중에는 느려지므로 메모리만 봄
+        traced = export_archive(db_path, "csv", True, export_dir, chunk_rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        insert(traced_count, game_count - traced_count)
+        incremental = export_archive(db_path, "csv", True, export_dir, chunk_rows)
+        return {
+            "최대 메모리": f"{peak / 2 ** 20:.1f}MB ({traced['rows']:,}행, 청크 {chunk_rows:,}행)",
+            "증분 내보내기": f"{incremental['rows']:,}행 (워터마크 {incremental['since']:,} → {incremental['watermark']:,})",
+            "소요 시간": f"{incremental['seconds']:.2f}s",
+            "처리량": f"{incremental['rows'] / incremental['seconds']:,.0f} 행/s",
+            "파일 수": len(traced["files"]) + len(incremental["files"]),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+BENCHMARKS = {
+    "tournament": run_tournament_benchmark,
+    "matchmaking": run_matchmaking_benchmark,
+    "ratings": run_ratings_benchmark,
+    "spectator": run_spectator_benchmark,
+    "ai": run_ai_benchmark,
+    "snapshot": run_snapshot_benchmark,
+    "export": run_export_benchmark,
+    "memory": run_memory_benchmark,
+    "startup": run_startup_benchmark,
+    "admission": run_admission_benchmark,
+    "throttle": run_throttle_benchmark,
+    "maintenance": run_maintenance_benchmark,
+    "action": run_action_benchmark,
+}
+
+@tree.command(name="bench", description="성능 벤치마크를 실행합니다. (관리자 전용)")
+@app_commands.describe(target="벤치마크 대상")
+async def bench(interaction: discord.Interaction, target: str = "tournament"):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("이 명령어는 관리자만 사용할 수 있습니다!", ephemeral=True)
+        return
+    if target not in BENCHMARKS:
+        await interaction.response.send_message(f"알 수 없는 대상입니다! ({', '.join(BENCHMARKS)})", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    result = await asyncio.to_thread(BENCHMARKS[target])
+    embed = discord.Embed(title=f"벤치마크 결과 ⏱️ | {target}", color=discord.Color.gold())
+    for name, value in result.items():
+        embed.add_field(name=name, value=str(value), inline=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+# 종료 스냅샷 설정
+SNAPSHOT_PATH = shard_path("buckshot_snapshot", "bin")  # 샤드 그룹마다 따로 저장
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MAX_AGE = 300  # 게임 화면 타임아웃과 같음: 이보다 오래 손대지 않은 스냅샷 게임은 되살리지 않음(초)
+
+def encode_snapshot_key(game_id):
+    return UUID(game_id).bytes
+
+def open_snapshot(path=None):
+    return GameSnapshot.open(path or SNAPSHOT_PATH, SNAPSHOT_VERSION, encode_snapshot_key, SNAPSHOT_MAX_AGE)
+
+game_snapshot = None if in_worker_process() else open_snapshot()  # AI 풀 워커가 다시 import할 때는 열지 않음
+snapshot_expiry_scheduled = False
+leak_check_scheduled = False
+load_monitor_scheduled = False
+shutting_down = False
+
+def encode_snapshot_state(state):
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode()
+
+def snapshot_entries(games, now):
+    return [
+        (encode_snapshot_key(game.game_id), encode_snapshot_state(game.to_snapshot()), now)
+        for game in games
+        if game.status == "active" and game.channel_id is not None
+    ]
+
+def save_snapshot(path=None):
+    """진행 중인 게임과 아직 꺼내지 않은 이전 스냅샷 게임을 새 스냅샷 파일로 저장, 저장한 게임 수를 반환"""
+    global game_snapshot
+    entries = snapshot_entries(live_games.values(), time.time())
+    if game_snapshot:
+        entries.extend(game_snapshot.remaining())
+        game_snapshot.close()
+        game_snapshot = None
+    write_snapshot(path or SNAPSHOT_PATH, entries, SNAPSHOT_VERSION)
+    return len(entries)
+
+def flush_pending_commits():
+    """모아 둔 상금 정산과 COMMIT_INTERVAL로 모아 둔 커밋을 바로 수행"""
+    for conn, batch in list(pending_postings):
+        settle_ledger(conn, batch)
+    flush_commits()
+
+async def prepare_shutdown():
+    """모아 둔 쓰기를 내보내고 진행 중인 게임을 스냅샷으로 남김 (연결은 닫지 않음)"""
+    flush_pending_commits()
+    started = time.perf_counter()
+    count = save_snapshot()
+    print(f"Saved {count} live games to {SNAPSHOT_PATH} in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+async def graceful_shutdown():
+    """SIGTERM: 진행 중인 게임을 남긴 뒤 종료"""
+    global shutting_down
+    if shutting_down:
+        return
+    shutting_down = True
+    await prepare_shutdown()
+    await client.close()
+
+def schedule_snapshot_expiry():
+    """스냅샷 게임이 화면 타임아웃만큼 지나도록 손대지 않으면 스냅샷을 닫고 남은 게임을 중단 처리"""
+    global snapshot_expiry_scheduled
+    snapshot_expiry_scheduled = True
+
+    def expire():
+        global game_snapshot
+        if game_snapshot:
+            game_snapshot.close()
+            game_snapshot = None
+        released = release_orphaned_games()
+        if released:
+            print(f"Released {released} snapshot games that were not resumed")
+
+    asyncio.get_running_loop().call_later(max(game_snapshot.saved_at + SNAPSHOT_MAX_AGE - time.time(), 0), expire)
+
+def report_leaked_games(grace=LEAK_GRACE):
+    """end_game 이후 grace초가 지나도 해제되지 않은 게임과 그 게임을 붙잡고 있는 객체 종류를 돌려줌"""
+    gc.collect()
+    now = time.monotonic()
+    frame = sys._getframe()
+    leaked = []
+    for game_id in list(finished_games.keys()):
+        game = finished_games.get(game_id)
+        if game is None or now - game.ended_at < grace:
+            continue
+        holders = sorted({type(referrer).__name__ for referrer in gc.get_referrers(game) if referrer is not frame})
+        leaked.append((game_id, round(now - game.ended_at), holders))
+    return leaked
+
+def schedule_leak_check():
+    """LEAK_CHECK_INTERVAL마다 끝난 뒤에도 남아 있는 게임을 로그로 남김"""
+    global leak_check_scheduled
+    leak_check_scheduled = True
+    loop = asyncio.get_running_loop()
+
+    def check():
+        leaked = report_leaked_games()
+        if leaked:
+            print(f"{len(leaked)} finished games still alive: {leaked[:5]}")
+        loop.call_later(LEAK_CHECK_INTERVAL, check)
+
+    loop.call_later(LEAK_CHECK_INTERVAL, check)
+
+def schedule_load_monitor():
+    """LOAD_SAMPLE_INTERVAL마다 예약한 시각보다 늦게 깨어난 만큼을 이벤트 루프 지연으로 기록"""
+    global load_monitor_scheduled
+    load_monitor_scheduled = True
+    loop = asyncio.get_running_loop()
+
+    def sample(expected):
+        admission.sample_load(max(loop.time() - expected, 0.0))
+        loop.call_later(LOAD_SAMPLE_INTERVAL, sample, loop.time() + LOAD_SAMPLE_INTERVAL)
+
+    loop.call_later(LOAD_SAMPLE_INTERVAL, sample, loop.time() + LOAD_SAMPLE_INTERVAL)
+
+def restore_snapshot_game(game_id):
+    """스냅샷에서 게임을 꺼내 live_games에 올리고 화면과 토너먼트 진출 처리를 다시 붙임"""
+    state = game_snapshot.take(game_id) if game_snapshot else None
+    if state is None:
+        return None
+    game = BuckshotGame.from_snapshot(state)
+    if game.tournament_match:
+        tournament_id, match_id = game.tournament_match
+        manager = get_tournament_manager()
+        game.end_callbacks.append(lambda finished_game: manager.on_game_end(tournament_id, match_id, finished_game))
+    live_games[game.game_id] = game
+    build_game_view(game, game.channel_id)
+    return game
+
+@client.event
+async def on_interaction(interaction: discord.Interaction):
+    """재시작 전에 게시된 게임 버튼: 게임이 메모리에 없으면 스냅샷에서 되살려 같은 버튼 콜백으로 처리"""
+    custom_id = (interaction.data or {}).get("custom_id", "")
+    if not custom_id.startswith("bs:"):
+        return
+    _, game_id, action = custom_id.split(":", 2)
+    if game_id in live_games:
+        return  # 살아 있는 화면이 처리 (연타 제한은 화면의 interaction_check에서)
+    if not await throttle(interaction, game_id):
+        return
+    game = restore_snapshot_game(game_id)
+    if game is None:
+        await interaction.response.send_message("이미 끝났거나 이어갈 수 없는 게임입니다.", ephemeral=True)
+        return
+    game.last_message = interaction.message
+    for item in game.view.children:
+        if getattr(item, "custom_id", None) == custom_id:
+            await item.callback(interaction)
+            break
+    schedule_ai_turn(game, game.channel_id)
+
+# 기록 재생: BUCKSHOT_REPLAY=<기록 파일>로 단독 실행하면 기록된 세션을 실제 핸들러에 다시 흘려 넣음 (buckshot_core.run_replay)
+async def replay_session(session, speed, started, stats):
+    for line in session.events:
+        if speed:
+            delay = started + line["t"] / 1000 / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        try:
+            if line.get("start"):
+                interaction = ReplayInteraction(session, session.user(0))
+                interaction.extras["replay_seed"] = line["seed"]
+                await buckshot.callback(interaction, session.user(1), line["mode"])
+            else:
+                view, item = session.find_component(line["a"])
+                if item is None:  # 게임이 기록과 다르게 흘러 해당 화면이 없음
+                    stats["missing"] += 1
+                    continue
+                data = {"custom_id": getattr(item, "custom_id", None)}
+                if "v" in line:
+                    data["values"] = line["v"]
+                interaction = ReplayInteraction(session, session.user(line["u"]), data)
+                if await view.interaction_check(interaction):
+                    await item.callback(interaction)
+            stats["events"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"Replay error in session {line['s']} ({line.get('a', 'start')}): {e!r}")
+
+async def replay_recording(path, speed=REPLAY_SPEED):
+    """기록된 세션을 동시에 재생하고 결과를 반환 (하우스 AI 세션은 AI 탐색이 시간 예산에 따라 달라 재현되지 않으므로 건너뜀)"""
+    recorded = load_recording(path)
+    sessions = [ReplaySession(lines, component_action) for lines in recorded if not lines[0].get("ai")]
+    if not speed:  # 쉬지 않고 보내면 연타 제한에 걸리므로 끔
+        user_limiter.burst = game_limiter.burst = math.inf
+    stats = {"events": 0, "missing": 0, "errors": 0}
+    for stage_stat in stage_stats.values():
+        stage_stat.update(count=0, misses=0, max=0.0)
+    io_before = dict(io_stats)
+    started = time.monotonic()
+    await asyncio.gather(*(replay_session(session, speed, started, stats) for session in sessions))
+    elapsed = time.monotonic() - started
+    flush_pending_commits()
+    return {
+        "세션": f"{len(sessions):,}개 재생, 하우스 AI {len(recorded) - len(sessions):,}개 건너뜀",
+        "입력": f"{stats['events']:,}개 ({stats['events'] / max(elapsed, 1e-9):,.0f}/s), 화면 없음 {stats['missing']:,}, 오류 {stats['errors']:,}",
+        "단계별 최대 (예산 초과)": ", ".join(
+            f"{stage} {stage_stat['max'] * 1000:.1f}ms ({stage_stat['misses']})" for stage, stage_stat in stage_stats.items()
+        ),
+        "I/O": ", ".join(f"{key} {io_stats[key] - io_before[key]:,}" for key in io_stats),
+        "소요 시간": f"{elapsed:.2f}s",
+    }
+
+def release_orphaned_games(conn=None):
+    """이 프로세스가 맡은 길드에서 진행 중으로 남아 있지만 메모리에도 스냅샷에도 없는 게임을 중단 처리
+
+    비정상 종료된 프로세스의 게임은 마지막 상태를 되살릴 수 없으므로, 플레이어가 새 게임을 시작할 수 있게 풀어준다.
+    """
+    conn = conn or get_db()
+    rows = conn.execute("SELECT game_id, guild_id FROM games WHERE ruleset = 'classic' AND status IN ('pending', 'active')").fetchall()
+    orphaned = [
+        game_id for game_id, guild_id in rows
+        if owns_guild(guild_id) and game_id not in live_games and not (game_snapshot and game_snapshot.contains(game_id))
+    ]
+    if orphaned:
+        with write_transaction(conn):
+            conn.executemany(
+                "UPDATE games SET status = 'interrupted' WHERE game_id = ? AND status IN ('pending', 'active')",
+                [(game_id,) for game_id in orphaned]
+            )
+        for game_id in orphaned:
+            admission.forget(game_id)
+    return len(orphaned)
+
+# DB 정리 단계: 중단된 게임의 행과 진행 중인 게임이 없는 game_states 행을
+# 조금씩 지움 (빈 페이지와 WAL은 buckshot_core.DatabaseMaintenance가 돌려줌)
+MAINTENANCE_IDLE_GAMES = 10  # 진행 중인 게임이 이 수 이하이고 과부하가 아니면 한가한 때로 보고 체크포인트와 ANALYZE
+LIVE_STATUSES = ("pending", "active")
+LIVE_CLASSIC_GAMES = "SELECT game_id FROM games WHERE ruleset = 'classic' AND status IN (?, ?)"
+
+def find_orphans(conn, limit=MAINTENANCE_MAX_ROWS):
+    """지울 게임 ID와 상태 행의 게임 ID를 한 읽기 스냅샷에서 찾아 반환
+
+    진행 중(pending, active)이 아닌 클래식 게임 행과, 진행 중인 클래식 게임이 없는 game_states 행
+    (게임마다 한 행이므로 게임 ID로 지움). 읽기는 쓰기 잠금 없이 한 읽기 트랜잭션(WAL 스냅샷)에서 한다.
+    """
+    conn.execute("BEGIN")
+    try:
+        games = [game_id for (game_id,) in conn.execute(
+            "SELECT game_id FROM games WHERE ruleset = 'classic' AND (status IS NULL OR status NOT IN (?, ?)) LIMIT ?",
+            (*LIVE_STATUSES, limit)
+        )]
+        states = [game_id for (game_id,) in conn.execute(
+            f"SELECT game_id FROM game_states WHERE game_id NOT IN ({LIVE_CLASSIC_GAMES}) LIMIT ?", (*LIVE_STATUSES, limit)
+        )]
+    finally:
+        conn.execute("ROLLBACK")
+    return games, states
+
+async def sweep_classic_games(maintenance, conn):
+    """끝난 클래식 게임과 고아 game_states 행을 MAINTENANCE_BATCH행씩 지우고 지운 행 수를 반환"""
+    removed = {"games": 0, "states": 0}
+    games, states = await asyncio.to_thread(find_orphans, conn)
+    steps = (
+        ("games", "DELETE FROM games WHERE game_id = ? AND ruleset = 'classic' AND (status IS NULL OR status NOT IN ('pending', 'active'))",
+         [(game_id,) for game_id in games]),
+        # 찾은 뒤에 게임이 시작됐을 수 있으므로 지울 때 다시 확인
+        ("states", f"DELETE FROM game_states WHERE game_id = ? AND game_id NOT IN ({LIVE_CLASSIC_GAMES})",
+         [(game_id, *LIVE_STATUSES) for game_id in states]),
+    )
+    for name, sql, rows in steps:
+        for start in range(0, len(rows), MAINTENANCE_BATCH):
+            changed = await asyncio.to_thread(maintenance.write_step, conn, sql, rows=rows[start:start + MAINTENANCE_BATCH])
+            if changed is None:
+                break
+            removed[name] += changed
+            await asyncio.sleep(maintenance.pause)
+    return removed
+
+def classic_idle():
+    return len(live_games) <= MAINTENANCE_IDLE_GAMES and admission.overloaded() is None
+
+maintenance.sweeps.append(sweep_classic_games)
+maintenance.idle_checks.append(classic_idle)
+
 @client.event
 async def on_ready():
     global synced
-    print(f'Logged in as {client.user}')
+    print(f'Logged in as {client.user} (shards {SHARD_IDS or "all"} of {client.shard_count})')
+    if not HOSTED:  # bot.py에 올라가면 두 룰셋의 종료 처리를 bot.py가 한 번에 설치
+        install_shutdown_handler(graceful_shutdown)
+    if game_snapshot and not snapshot_expiry_scheduled:
+        schedule_snapshot_expiry()
+    if LEAK_CHECK and not leak_check_scheduled:
+        schedule_leak_check()
+    if not load_monitor_scheduled:
+        schedule_load_monitor()
+    schedule_maintenance()
+    released = release_orphaned_games()
+    if released:
+        print(f"Released {released} games left by a previous process")
+    admission.rebuild(get_db())  # 스냅샷에 남은 게임도 이어질 수 있으므로 자리를 잡아 둠
+    if not synced and not owns_guild(None):
+        synced = True  # 명령어 동기화는 0번 샤드를 맡은 프로세스만 수행
     if not synced:
         try:
-            synced_commands = await tree.sync()
-            print(f"Global slash commands synced! Synced {len(synced_commands)} commands: {[cmd.name for cmd in synced_commands]}")
+            count = await sync_command_tree(tree)
+            print("Slash commands unchanged, sync skipped" if count is None else f"Global slash commands synced! Synced {count} commands")
             synced = True
         except Exception as e:
-            print(f"Failed to sync commands: {e}")
-            await asyncio.sleep(5)
-            try:
-                synced_commands = await tree.sync()
-                print(f"Retry successful! Synced {len(synced_commands)} commands: {[cmd.name for cmd in synced_commands]}")
-                synced = True
-            except Exception as retry_e:
-                print(f"Retry failed: {retry_e}")
-                
-client.run('')
+            print(f"Failed to sync commands: {e}")  # 다음 on_ready(재연결)에서 다시 시도
+
+# 단독 실행할 때만 (bot.py에 올라가거나 AI 풀 워커가 __mp_main__으로 다시 import할 때는 실행하지 않음)
+if __name__ == "__main__":
+    if REPLAY_PATH:
+        run_replay(replay_recording, REPLAY_PATH)
+    elif SHARD_PROCESSES > 1 and SHARD_IDS is None:
+        asyncio.run(run_shard_supervisor(SHARD_COUNT or SHARD_PROCESSES, SHARD_PROCESSES, os.path.abspath(__file__)))
+    else:
+        client.run('')
@@ -1,52 +1,734 @@
 import discord
 from discord import app_commands
-import random
 import asyncio
 import sqlite3
 import json
 from datetime import datetime
 import logging
+from fractions import Fraction
+import os
+import time
+import math
+import struct
+from urllib.parse import urlparse
+from uuid import uuid4
+import buckshot_core
+from buckshot_core import (
+    SHARD_COUNT, SHARD_IDS, SHARD_PROCESSES, owns_guild, shard_path,
+    io_stats, get_db, request_commit, flush_commits, register_migration, GameRNG, StoredPlayer, Ruleset, render_game_embed,
+    in_worker_process, ItemHooks, ItemConfig, Beer, MagnifyingGlass, Cigarette, Knife, SkipTurn, Adrenaline, BurnerPhone, Inverter, Medicine,
+    stage_stats, record_stage, timed_stage, acknowledge, user_limiter, game_limiter, throttle, AdmissionControl,
+    record_path, InteractionRecorder, REPLAY_PATH, REPLAY_SPEED, ReplaySession, ReplayInteraction, load_recording, run_replay,
+    write_snapshot, GameSnapshot, install_shutdown_handler,
+    MAINTENANCE_BATCH, MAINTENANCE_MAX_ROWS, maintenance, schedule_maintenance,
+    run_shard_supervisor, sync_command_tree,
+)
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # 봇 설정
-intents = discord.Intents.default()
-intents.message_content = True
-client = discord.Client(intents=intents)
-tree = app_commands.CommandTree(client)
-
-# 글로벌 게임 상태 저장
-games = {}
-
-# SQLite 데이터베이스 초기화
-def init_db():
-    conn = sqlite3.connect('buckshot_games.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS games (
-        channel_id INTEGER PRIMARY KEY,
-        player1_id INTEGER,
-        player2_id INTEGER,
-        hp TEXT,
-        chamber TEXT,
-        items TEXT,
-        current_turn INTEGER,
-        knife_active TEXT,
-        handcuff_active TEXT,
-        round INTEGER,
-        scores TEXT,
-        last_message_id INTEGER,
-        show_chamber INTEGER
-    )''')
-    conn.commit()
-    conn.close()
-
-init_db()
+# bot.py가 두 룰셋을 한 프로세스에 올릴 때는 공용 클라이언트와 명령 모음(tree)을 미리 넣어 둠
+HOSTED = "client" in globals()
+if not HOSTED:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = discord.AutoShardedClient(intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+    tree = app_commands.CommandTree(client)
+
+# 게임은 공용 DB(buckshot_core.DB_PATH)의 games 테이블에 ruleset='channel'로 저장
+# game_id는 저장소 키(duel:<게임 ID>, ffa:<게임 ID>)이고 게임 상태는 저장소와 같은 JSON(to_state)을 state 컬럼에 둠
+# 한 채널에서 여러 게임을 동시에 진행하고, 채널별 목록과 이전 버전 버튼(메시지 ID)으로도 찾음
+LEGACY_DB_PATH = "buckshot_games.db"  # 룰셋마다 DB 파일을 따로 쓰던 이전 버전의 파일 (처음 DB를 쓸 때 공용 DB로 옮김)
+CHANNEL_GAME_INSERT = '''INSERT OR REPLACE INTO games (
+    game_id, ruleset, player1_id, player2_id, round, scores, status, seed, channel_id, last_message_id, state, updated_at
+) VALUES (?, 'channel', ?, ?, ?, ?, 'active', ?, ?, ?, ?, ?)'''
+
+def new_game_id():
+    """게임 ID (custom_id와 스냅샷 색인에 그대로 넣을 수 있는 63비트 정수)"""
+    return uuid4().int >> 65
+
+def needs_reload(chamber):
+    """남은 탄 중 실탄이나 공포탄이 2발 이상이면 재장전 (1:1 게임과 개인전 공통 규칙)"""
+    return chamber.count("live") >= 2 or chamber.count("blank") >= 2
+
+class ChannelItemHooks(ItemHooks):
+    """1:1 게임과 개인전 공통 아이템 훅: 맥주와 인버터로 탄창이 바뀌면 재장전 규칙을 적용"""
+    def reload_if_needed(self):
+        return f" 재장전: {self.load_chamber()}" if needs_reload(self.chamber) else ""
+
+# 채널 룰셋 아이템 구성 (아이템 클래스는 buckshot_core의 공용 레지스트리)
+# 1:1 게임과 개인전이 같은 아이템 객체를 공유하고, 이 순서가 곧 아이템 ID (조합 추첨 테이블의 순서)
+ITEM_CONFIG = ItemConfig((
+    Beer(),
+    MagnifyingGlass(),
+    Cigarette(max_hp=6),
+    Knife(),
+    SkipTurn(name="수갑", description="상대의 다음 턴을 건너뜁니다 (중첩 가능)."),
+    BurnerPhone(random_position=True),
+    Medicine(heal_chance=0.4, max_hp=6),
+    Inverter(swaps=True),
+    Adrenaline(),
+    SkipTurn(name="잼머", description="상대의 다음 턴을 건너뜁니다 (수갑과 동일)."),
+))
+ITEMS = ITEM_CONFIG.by_name  # 이름 -> 아이템 디스패치 테이블
+ALL_ITEMS = list(ITEM_CONFIG.ids)
+
+def build_chamber_odds(round_num):
+    """라운드별로 가능한 (실탄, 공포탄) 구성과 정확한 확률을 계산"""
+    total_bullets = min(2 + round_num * 2, 8)
+    max_live = total_bullets // 2 + 1
+    return {(live, total_bullets - live): Fraction(1, max_live) for live in range(1, max_live + 1)}
+
+# 3라운드부터는 탄수가 8발로 고정되므로 같은 표를 사용
+RULESET = Ruleset("channel", build_chamber_odds, ITEM_CONFIG, thumbnail="https://i.imgur.com/9kXz6rT.png", show_updated_at=True)
+
+# 게임 상태 저장소 (여러 봇 프로세스가 같은 게임을 처리할 수 있도록 프로세스 밖에 둘 수 있음)
+STORE_CONFLICT_MESSAGE = "다른 요청이 먼저 처리되었습니다. 화면을 확인하고 다시 시도해주세요."
+
+class StoreError(Exception):
+    pass
+
+class GameStore:
+    """게임 상태 저장소 인터페이스
+
+    값은 JSON으로 직렬화되는 상태 dict이고 키마다 버전 번호가 붙는다 (없는 키는 버전 0).
+    compare_and_set은 현재 버전이 expected_version일 때만 값을 바꾸고 버전을 1 올린다.
+    state가 None이면 같은 조건으로 키를 지운다. 처리하는 프로세스는 읽은 버전으로 CAS를 하고,
+    실패하면 그 사이 다른 프로세스가 게임을 진행한 것이므로 결과를 버린다.
+    """
+    async def get(self, key):
+        """(버전, 상태) 반환. 키가 없으면 (0, None)"""
+        raise NotImplementedError
+
+    async def compare_and_set(self, key, expected_version, state):
+        raise NotImplementedError
+
+    async def delete(self, key):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryGameStore(GameStore):
+    """프로세스 내부 저장소 (봇 프로세스가 하나일 때 기본값)"""
+    def __init__(self):
+        self.entries = {}  # key -> (버전, 직렬화된 상태)
+
+    async def get(self, key):
+        version, data = self.entries.get(key, (0, None))
+        return version, json.loads(data) if data is not None else None
+
+    async def compare_and_set(self, key, expected_version, state):
+        if self.entries.get(key, (0, None))[0] != expected_version:
+            return False
+        if state is None:
+            self.entries.pop(key, None)
+        else:
+            self.entries[key] = (expected_version + 1, json.dumps(state))
+        return True
+
+    async def delete(self, key):
+        self.entries.pop(key, None)
+
+def encode_resp(*args):
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+async def read_resp(reader):
+    """RESP 응답 하나를 읽음 (오류 응답은 StoreError로 변환하지 않고 그대로 반환)"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("저장소 연결이 끊어졌습니다.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return StoreError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_resp(reader) for _ in range(count)]
+    raise StoreError(f"알 수 없는 RESP 응답: {line!r}")
+
+class RedisGameStore(GameStore):
+    """Redis 프로토콜(RESP) 저장소
+
+    값은 "버전:JSON" 문자열 하나로 저장한다. CAS는 WATCH/MULTI/EXEC 낙관적 트랜잭션으로 하며,
+    WATCH는 연결 단위라서 명령마다 풀에서 연결 하나를 빌려 쓴다.
+    """
+    def __init__(self, host="127.0.0.1", port=6379, prefix="buckshot:", pool_size=8):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.idle = []
+        self.opened = 0
+        self.available = None
+
+    async def _acquire(self):
+        if self.available is None:
+            self.available = asyncio.Semaphore(self.pool_size)
+        await self.available.acquire()
+        if self.idle:
+            return self.idle.pop()
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self.opened -= 1
+            conn[1].close()
+        else:
+            self.idle.append(conn)
+        self.available.release()
+
+    async def _call(self, conn, *args):
+        reader, writer = conn
+        writer.write(encode_resp(*args))
+        await writer.drain()
+        reply = await read_resp(reader)
+        if isinstance(reply, StoreError):
+            raise reply
+        return reply
+
+    async def _run(self, operation):
+        conn = await self._acquire()
+        try:
+            result = await operation(conn)
+        except BaseException:
+            self._release(conn, broken=True)  # 트랜잭션 중간 상태일 수 있는 연결은 재사용하지 않음
+            raise
+        self._release(conn)
+        return result
+
+    @staticmethod
+    def _decode(raw):
+        if raw is None:
+            return 0, None
+        version, data = raw.split(b":", 1)
+        return int(version), json.loads(data)
+
+    async def get(self, key):
+        return self._decode(await self._run(lambda conn: self._call(conn, "GET", self.prefix + key)))
+
+    async def compare_and_set(self, key, expected_version, state):
+        key = self.prefix + key
+
+        async def operation(conn):
+            await self._call(conn, "WATCH", key)
+            version, _ = self._decode(await self._call(conn, "GET", key))
+            if version != expected_version:
+                await self._call(conn, "UNWATCH")
+                return False
+            await self._call(conn, "MULTI")
+            if state is None:
+                await self._call(conn, "DEL", key)
+            else:
+                await self._call(conn, "SET", key, f"{expected_version + 1}:{json.dumps(state)}")
+            return await self._call(conn, "EXEC") is not None  # 감시 중인 키가 바뀌었으면 nil
+
+        return await self._run(operation)
+
+    async def delete(self, key):
+        await self._run(lambda conn: self._call(conn, "DEL", self.prefix + key))
+
+    async def close(self):
+        for reader, writer in self.idle:
+            writer.close()
+            await writer.wait_closed()
+        self.idle.clear()
+
+RESP_NULL_ARRAY = b"*-1\r\n"  # 중단된 EXEC 응답
+
+class StandInRedisServer:
+    """RedisGameStore 확인용 최소 Redis 호환 서버
+
+    GET, SET, DEL, WATCH, UNWATCH, MULTI, EXEC, DISCARD, PING만 지원한다. 키마다 수정 횟수를 두고
+    EXEC 시 WATCH 이후 바뀐 키가 있으면 트랜잭션을 버리고 nil을 돌려준다.
+    """
+    def __init__(self):
+        self.data = {}
+        self.revisions = {}  # key -> 수정 횟수
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host="127.0.0.1", port=6379):
+        port = await self.start(host, port)
+        logging.info(f"Redis 대체 서버 실행: {host}:{port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def execute(self, command, args):
+        if command == "PING":
+            return "PONG"
+        if command == "GET":
+            return self.data.get(args[0])
+        if command == "SET":
+            self.data[args[0]] = args[1]
+            self.revisions[args[0]] = self.revisions.get(args[0], 0) + 1
+            return "OK"
+        if command == "DEL":
+            removed = 0
+            for key in args:
+                if self.data.pop(key, None) is not None:
+                    removed += 1
+                    self.revisions[key] = self.revisions.get(key, 0) + 1
+            return removed
+        return StoreError(f"ERR unknown command '{command}'")
+
+    @staticmethod
+    def encode_reply(reply):
+        if reply is RESP_NULL_ARRAY:
+            return reply
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, StoreError):
+            return f"-{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, str):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return f"*{len(reply)}\r\n".encode() + b"".join(StandInRedisServer.encode_reply(item) for item in reply)
+
+    async def handle(self, reader, writer):
+        watched = {}  # key -> WATCH 시점의 수정 횟수
+        queued = None
+        try:
+            while True:
+                request = await read_resp(reader)
+                command, args = request[0].decode().upper(), request[1:]
+                if command == "WATCH":
+                    for key in args:
+                        watched[key] = self.revisions.get(key, 0)
+                    reply = "OK"
+                elif command == "UNWATCH":
+                    watched.clear()
+                    reply = "OK"
+                elif command == "MULTI":
+                    queued = []
+                    reply = "OK"
+                elif command == "DISCARD":
+                    queued = None
+                    watched.clear()
+                    reply = "OK"
+                elif command == "EXEC":
+                    if queued is None:
+                        reply = StoreError("ERR EXEC without MULTI")
+                    elif any(self.revisions.get(key, 0) != revision for key, revision in watched.items()):
+                        reply = RESP_NULL_ARRAY
+                    else:
+                        reply = [self.execute(queued_command, queued_args) for queued_command, queued_args in queued]
+                    queued = None
+                    watched.clear()
+                elif queued is not None:
+                    queued.append((command, args))
+                    reply = "QUEUED"
+                else:
+                    reply = self.execute(command, args)
+                writer.write(self.encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def create_game_store():
+    """BUCKSHOT_STORE_URL=redis://host:port 이면 네트워크 저장소, 없으면 프로세스 내부 저장소"""
+    url = os.environ.get("BUCKSHOT_STORE_URL")
+    if not url:
+        return MemoryGameStore()
+    parsed = urlparse(url)
+    if parsed.scheme != "redis":
+        raise ValueError(f"지원하지 않는 저장소 주소입니다: {url}")
+    return RedisGameStore(parsed.hostname or "127.0.0.1", parsed.port or 6379)
+
+game_store = create_game_store()
+
+# 종료 스냅샷 설정 (프로세스 내부 저장소를 쓸 때만: Redis 저장소는 재시작해도 상태가 남음)
+SNAPSHOT_PATH = shard_path("buckshot_games_snapshot", "bin")  # 샤드 그룹마다 따로 저장
+SNAPSHOT_VERSION = 2  # 2: 채널 ID 대신 게임 ID 키 (이전 스냅샷은 무시하고 SQLite에서 복원)
+
+def encode_snapshot_key(key):
+    """저장소 키(duel:<게임 ID>)를 16바이트 스냅샷 색인 키로 바꿈"""
+    kind, game_id = key.split(":")
+    return struct.pack(">8sq", kind.encode(), int(game_id))
+
+def open_snapshot(path=None):
+    """스냅샷을 열어 둠 (SQLite에서 올릴 때처럼 플레이어를 fetch_user로 다시 조회하지 않음)"""
+    return GameSnapshot.open(path or SNAPSHOT_PATH, SNAPSHOT_VERSION, encode_snapshot_key)
+
+# bot.py로 실행하면 하우스 AI 풀의 워커가 이 파일도 다시 import하므로 그때는 열지 않음
+game_snapshot = open_snapshot() if isinstance(game_store, MemoryGameStore) and not in_worker_process() else None
+shutting_down = False
+
+def save_snapshot(path=None):
+    """프로세스 내부 저장소의 게임과 아직 꺼내지 않은 이전 스냅샷 게임을 새 스냅샷으로 저장, 저장한 게임 수를 반환"""
+    global game_snapshot
+    now = time.time()
+    entries = [(encode_snapshot_key(key), data.encode(), now) for key, (version, data) in game_store.entries.items()]
+    if game_snapshot:
+        entries.extend(game_snapshot.remaining())
+        game_snapshot.close()
+        game_snapshot = None
+    write_snapshot(path or SNAPSHOT_PATH, entries, SNAPSHOT_VERSION)
+    return len(entries)
+
+async def prepare_shutdown():
+    """진행 중인 게임을 스냅샷으로 남기고, 모아 둔 SQLite 커밋을 내보낸 뒤 저장소 연결을 닫음"""
+    if isinstance(game_store, MemoryGameStore):
+        started = time.perf_counter()
+        count = save_snapshot()
+        logging.info(f"진행 중인 게임 {count}개를 {SNAPSHOT_PATH}에 저장 ({(time.perf_counter() - started) * 1000:.1f}ms)")
+    flush_commits()
+    await game_store.close()
+
+async def graceful_shutdown():
+    """SIGTERM: 진행 중인 게임을 남긴 뒤 종료"""
+    global shutting_down
+    if shutting_down:
+        return
+    shutting_down = True
+    await prepare_shutdown()
+    await client.close()
+
+async def delete_game_message(channel, message_id):
+    if not message_id:
+        return
+    try:
+        await channel.get_partial_message(message_id).delete()
+    except (discord.NotFound, discord.Forbidden):
+        pass
+
+async def send_game_message(interaction, embed, view, private_result=None):
+    """acknowledge 해 둔 상호작용에 게임 화면을 보내고 메시지 ID를 반환 (private_result는 사용자에게만 먼저 보여줌)"""
+    if private_result:
+        await interaction.followup.send(private_result, ephemeral=True)
+    message = await interaction.followup.send(embed=embed, view=view, wait=True)
+    return message.id
+
+def duel_key(game_id):
+    return f"duel:{game_id}"
+
+def ffa_key(game_id):
+    return f"ffa:{game_id}"
+
+def channel_game_row(key, state, player_ids, seed, updated_at):
+    """games 테이블의 행 (player_ids: 1:1 게임은 두 플레이어 ID, 개인전은 (None, None))"""
+    return (
+        key, *player_ids, state["round"], json.dumps(state["scores"]), seed, state["channel_id"],
+        state["last_message_id"], json.dumps(state), updated_at
+    )
+
+def save_channel_game(key, game, player_ids, last_message_id=None, clear=False):
+    """게임 상태를 games 테이블에 씀 (clear=True면 지움, 커밋은 모아서 함)"""
+    conn = get_db()
+    if clear:
+        conn.execute("DELETE FROM games WHERE game_id = ? AND ruleset = 'channel'", (key,))
+    else:
+        state = game.to_state()
+        state["last_message_id"] = last_message_id
+        conn.execute(CHANNEL_GAME_INSERT, channel_game_row(key, state, player_ids, game.rng.seed, time.time()))
+    io_stats["db_writes"] += 1
+    request_commit(conn)
+
+async def load_saved_state(key):
+    """games 테이블에 남은 게임 상태를 읽음
+
+    이름이 없는 플레이어(이전 DB에서 옮긴 게임)는 fetch_user로 채우고, 유저를 찾을 수 없으면 게임을 지우고 None을 반환한다.
+    """
+    conn = get_db()
+    row = conn.execute("SELECT state FROM games WHERE game_id = ? AND ruleset = 'channel'", (key,)).fetchone()
+    if not row:
+        return None
+    state = json.loads(row[0])
+    for player in state["players"]:
+        if player[1] is not None:
+            continue
+        try:
+            user = await client.fetch_user(player[0])
+        except discord.NotFound:
+            user = None
+        if user is None:
+            logging.warning(f"유저를 찾을 수 없음: {key}, player_id={player[0]}")
+            conn.execute("DELETE FROM games WHERE game_id = ? AND ruleset = 'channel'", (key,))
+            request_commit(conn)
+            return None
+        player[1] = user.display_name
+    return state
+
+def legacy_duel_state(row, game_id):
+    """이전 DB의 games 행(플레이어별 값이 ID 키 JSON)을 to_state 형식으로 바꿈"""
+    order = (row["player1_id"], row["player2_id"])
+
+    def by_seat(column, default):
+        values = json.loads(row[column]) if row.get(column) else {}
+        return [values.get(str(player_id), default) for player_id in order]
+
+    return {
+        "game_id": game_id,
+        "channel_id": row["channel_id"],
+        "players": [[player_id, None] for player_id in order],
+        "hp": by_seat("hp", 0),
+        "chamber": json.loads(row["chamber"] or "[]"),
+        "items": [items[:4] for items in by_seat("items", [])],
+        "current_turn": row["current_turn"],
+        "knife_active": by_seat("knife_active", False),
+        "handcuff_active": by_seat("handcuff_active", 0),
+        "round": row["round"],
+        "scores": by_seat("scores", 0),
+        "show_chamber": bool(row["show_chamber"]),
+        "last_message_id": row["last_message_id"],
+        "rng_state": row.get("rng_state") or GameRNG(row.get("seed")).get_state(),
+    }
+
+def legacy_ffa_state(row, game_id):
+    """이전 DB의 ffa_games 행(좌석 순서의 JSON 배열)을 to_state 형식으로 바꿈"""
+    state = {field: json.loads(row[field]) for field in ("hp", "alive", "items", "knife_active", "skip_turns", "scores", "chamber")}
+    state.update(
+        game_id=game_id,
+        channel_id=row["channel_id"],
+        players=[[player_id, None] for player_id in json.loads(row["player_ids"])],
+        turn=row["turn"],
+        round=row["round"],
+        show_chamber=bool(row["show_chamber"]),
+        last_message_id=row["last_message_id"],
+        rng_state=row.get("rng_state") or GameRNG(row.get("seed")).get_state(),
+    )
+    return state
+
+def read_legacy_games(path):
+    """이전 DB 파일의 1:1 게임과 개인전을 games 테이블 행으로 읽음 (채널 ID가 키이던 테이블의 게임은 새 게임 ID를 받음)"""
+    legacy = sqlite3.connect(path)
+    legacy.row_factory = sqlite3.Row
+    try:
+        tables = {name for (name,) in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        rows = []
+        now = time.time()
+        for table, key_func, to_state in (("games", duel_key, legacy_duel_state), ("ffa_games", ffa_key, legacy_ffa_state)):
+            if table not in tables:
+                continue
+            for row in map(dict, legacy.execute(f"SELECT * FROM {table}")):
+                game_id = row.get("game_id") or new_game_id()
+                state = to_state(row, game_id)
+                player_ids = (row["player1_id"], row["player2_id"]) if table == "games" else (None, None)
+                seed = GameRNG.from_state(state["rng_state"]).seed
+                rows.append(channel_game_row(key_func(game_id), state, player_ids, seed, row.get("updated_at") or now))
+        return rows
+    finally:
+        legacy.close()
+
+def migrate_legacy_games(path=None):
+    """이전 버전의 buckshot_games.db에 남은 게임을 공용 DB로 옮기고 파일 이름을 .migrated로 바꿈, 옮긴 게임 수를 반환"""
+    path = path or LEGACY_DB_PATH
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(buckshot_core.DB_PATH)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # 같은 파일을 쓰는 다른 샤드 프로세스가 동시에 옮기지 않도록
+        if not os.path.exists(path):  # 기다리는 동안 다른 프로세스가 옮김
+            conn.rollback()
+            return 0
+        rows = read_legacy_games(path)
+        conn.executemany(CHANNEL_GAME_INSERT, rows)
+        os.replace(path, f"{path}.migrated")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    logging.info(f"{path}: 게임 {len(rows)}개를 {buckshot_core.DB_PATH}로 옮김")
+    return len(rows)
+
+register_migration(migrate_legacy_games)
+
+class GameIndex:
+    """이 프로세스가 다룬 게임의 메시지 ID -> 저장소 키, 채널 ID -> 저장소 키 색인
+
+    버튼 custom_id에는 게임 ID가 들어 있어 보통은 색인 없이 바로 키를 만든다. 게임 ID가 없는 이전 버전 버튼은
+    메시지 ID로 찾고, 여기 없으면 SQLite의 last_message_id 색인으로 찾는다.
+    """
+    def __init__(self):
+        self.by_message = {}
+        self.by_channel = {}
+
+    def add(self, key, channel_id, message_id=None):
+        self.by_channel.setdefault(channel_id, set()).add(key)
+        if message_id:
+            self.by_message[message_id] = key
+
+    def move(self, key, old_message_id, new_message_id):
+        """게임 화면을 새 메시지로 다시 보냈을 때"""
+        if old_message_id:
+            self.by_message.pop(old_message_id, None)
+        if new_message_id:
+            self.by_message[new_message_id] = key
+
+    def remove(self, key, channel_id, message_id=None):
+        keys = self.by_channel.get(channel_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_channel[channel_id]
+        if message_id:
+            self.by_message.pop(message_id, None)
+
+    def channel_keys(self, channel_id):
+        return set(self.by_channel.get(channel_id, ()))
+
+    def clear_channel(self, channel_id):
+        keys = self.by_channel.pop(channel_id, set())
+        for message_id in [message_id for message_id, key in self.by_message.items() if key in keys]:
+            del self.by_message[message_id]
+
+game_index = GameIndex()
+
+# 동시 게임 수 제한 (buckshot_core.AdmissionControl): 1:1 초대와 개인전 모집은 초대 대기(pending), 시작하면 진행 중(active)으로
+# 저장소 키 단위로 셈. 클래식 룰셋과 달리 한도에 걸리면 대기열 없이 바로 거절한다.
+admission = AdmissionControl()
+ADMISSION_FULL_MESSAGE = "지금은 동시에 진행할 수 있는 게임 수가 가득 찼습니다. 잠시 후 다시 시도해 주세요!"
+
+# 게임 버튼 custom_id: '<동작>:<게임 ID>' (이전 버전 화면의 버튼은 '<동작>'뿐)
+GAME_ACTIONS = {
+    "shoot_self": "duel",
+    "shoot_opponent": "duel",
+    "use_item": "duel",
+    "ffa_shoot_self": "ffa",
+    "ffa_shoot_target": "ffa",
+    "ffa_use_item": "ffa",
+}
+
+def parse_custom_id(custom_id):
+    """custom_id를 (동작, 게임 ID)로 나눔 (게임 ID가 없으면 None)"""
+    action, _, game_id = custom_id.partition(":")
+    return action, int(game_id) if game_id.isdigit() else None
+
+def find_message_game(kind, message_id):
+    """게임 ID가 없는 이전 버전 버튼: 버튼이 달린 메시지 ID로 게임 ID를 찾음"""
+    key = game_index.by_message.get(message_id)
+    if key is None:
+        row = get_db().execute(
+            "SELECT game_id FROM games WHERE last_message_id = ? AND ruleset = 'channel'", (message_id,)
+        ).fetchone()
+        key = row[0] if row else None
+    if key is not None and key.startswith(f"{kind}:"):
+        return int(key.split(":")[1])
+    return None
+
+# 상호작용 기록 파일: <BUCKSHOT_RECORD>-channel[-샤드 번호].jsonl (buckshot_core.InteractionRecorder)
+LOBBY_ACTIONS = ("accept", "reject", "join", "start")  # 초대와 개인전 모집 버튼 (custom_id '<동작>:<게임 ID>', on_interaction은 무시)
+
+def component_action(custom_id, is_select=False):
+    """컴포넌트의 동작 이름 (게임/모집 버튼은 custom_id의 동작, 아이템 선택 메뉴는 'select')"""
+    action, _ = parse_custom_id(custom_id or "")
+    if action in GAME_ACTIONS or action in LOBBY_ACTIONS:
+        return action
+    return "select" if is_select else None
+
+recorder = InteractionRecorder(record_path("channel"), "channel", component_action)
+
+async def load_live_game(game_cls, key):
+    """저장소에서 (게임, 버전)을 읽음. 저장소에 없으면 스냅샷이나 SQLite에 남은 게임을 올려둠"""
+    version, state = await game_store.get(key)
+    if state is not None:
+        game = game_cls.from_state(state)
+        game_index.add(key, game.channel_id, game.last_message_id)
+        return game, version
+    state = game_snapshot.take(key) if game_snapshot else None
+    if state is None:
+        state = await load_saved_state(key)
+    if state is None:
+        return None, 0
+    game = game_cls.from_state(state)
+    game_index.add(key, game.channel_id, game.last_message_id)
+    if await game_store.compare_and_set(key, 0, game.to_state()):
+        return game, 1
+    version, state = await game_store.get(key)  # 다른 프로세스가 먼저 올림
+    return (game_cls.from_state(state), version) if state is not None else (None, 0)
+
+async def commit_game_update(interaction, key, game, version, embed, view, finished, private_result=None):
+    """읽은 버전으로 CAS에 성공했을 때만 화면을 보냄 (실패하면 다른 프로세스가 먼저 진행한 것이므로 결과를 버림)
+
+    persist(CAS) → render → persist(SQLite와 메시지 ID 기록) 순서. 상호작용은 미리 acknowledge 되어 있어야 한다.
+    """
+    handler = interaction.extras["handler"]
+    record_stage("compute", handler, time.perf_counter() - interaction.extras["compute_started"])
+    with timed_stage("persist", handler):
+        stored = await game_store.compare_and_set(key, version, None if finished else game.to_state())
+    if not stored:
+        await interaction.followup.send(STORE_CONFLICT_MESSAGE, ephemeral=True)
+        return False
+    with timed_stage("render", handler):
+        old_message_id = game.last_message_id
+        await delete_game_message(interaction.channel, old_message_id)
+        try:
+            game.last_message_id = await send_game_message(interaction, embed, view, private_result)
+        except Exception as e:
+            logging.error(f"메시지 전송 실패: {e}")
+            game.last_message_id = None
+    with timed_stage("persist", handler):
+        if finished:
+            game.save_game(clear=True)
+            game_index.remove(key, game.channel_id, old_message_id)
+            admission.forget(key)
+        else:
+            game.save_game(last_message_id=game.last_message_id)
+            game_index.add(key, game.channel_id)
+            game_index.move(key, old_message_id, game.last_message_id)
+            await game_store.compare_and_set(key, version + 1, game.to_state())  # 메시지 ID 기록 (그 사이 진행됐으면 생략)
+    return True
+
+def build_duel_view(game_id):
+    view = discord.ui.View(timeout=300)
+    view.add_item(discord.ui.Button(
+        label="자신 쏘기",
+        style=discord.ButtonStyle.red,
+        emoji="🔫",
+        custom_id=f"shoot_self:{game_id}"
+    ))
+    view.add_item(discord.ui.Button(
+        label="상대 쏘기",
+        style=discord.ButtonStyle.green,
+        emoji="🎯",
+        custom_id=f"shoot_opponent:{game_id}"
+    ))
+    view.add_item(discord.ui.Button(
+        label="아이템 사용",
+        style=discord.ButtonStyle.blurple,
+        emoji="🧪",
+        custom_id=f"use_item:{game_id}"
+    ))
+    return view
 
 class ItemSelectView(discord.ui.View):
+    """아이템 선택 메뉴 (선택 시점에 저장소에서 게임을 다시 읽어 적용)"""
     def __init__(self, game, items, opponent_id, interaction):
         super().__init__(timeout=60)
-        self.game = game
+        self.game_id = game.game_id
+        self.players = (game.player1.id, game.player2.id)
         self.opponent_id = opponent_id
         self.interaction = interaction
         select = discord.ui.Select(
@@ -58,13 +740,28 @@ class ItemSelectView(discord.ui.View):
         select.callback = self.item_select_callback
         self.add_item(select)
 
+    async def interaction_check(self, interaction: discord.Interaction):
+        recorder.record(self.game_id, interaction)
+        return await throttle(interaction, self.game_id, self.players)
+
+    async def load_turn(self, interaction):
+        game, version = await load_live_game(BuckshotGame, duel_key(self.game_id))
+        if not game or game.current_turn != interaction.user.id:
+            await interaction.followup.send("당신의 턴이 아닙니다!", ephemeral=True)
+            return None, 0
+        return game, version
+
     async def item_select_callback(self, interaction: discord.Interaction):
         if interaction.user.id != self.interaction.user.id:
             await interaction.response.send_message("당신은 이 선택을 할 수 없습니다!", ephemeral=True)
             return
         item = interaction.data["values"][0]
-        if item == "주사기" and self.game.items[self.opponent_id]:
-            opponent_items = self.game.items[self.opponent_id]
+        await acknowledge(interaction, "item_select")
+        game, version = await self.load_turn(interaction)
+        if not game:
+            return
+        if item == "주사기" and game.items[self.opponent_id]:
+            opponent_items = game.items[self.opponent_id]
             steal_select = discord.ui.Select(
                 placeholder="훔칠 아이템을 선택하세요",
                 options=[
@@ -76,159 +773,86 @@ class ItemSelectView(discord.ui.View):
                 if steal_interaction.user.id != interaction.user.id:
                     await steal_interaction.response.send_message("당신은 이 선택을 할 수 없습니다!", ephemeral=True)
                     return
+                await acknowledge(steal_interaction, "steal_select")
+                game, version = await self.load_turn(steal_interaction)
+                if not game:
+                    return
                 stolen_value = steal_interaction.data["values"][0]
                 stolen_item = stolen_value.split("_")[0]
-                self.game.items[self.opponent_id].remove(stolen_item)
-                result, continue_turn = self.game.use_item(interaction.user.id, stolen_item, self.opponent_id)
+                if stolen_item not in game.items[self.opponent_id]:
+                    await steal_interaction.followup.send("상대가 더 이상 가지고 있지 않은 아이템입니다!", ephemeral=True)
+                    return
+                game.items[self.opponent_id].remove(stolen_item)
+                result, continue_turn = game.use_item(interaction.user.id, stolen_item, self.opponent_id)
                 await self.update_game_message(
                     steal_interaction,
+                    game,
+                    version,
                     f"💉 주사기: {stolen_item}을(를) 훔쳐 사용! {result}",
                     stolen_item in ["맥주", "인버터"],
                     continue_turn
                 )
             steal_select.callback = steal_select_callback
             steal_view = discord.ui.View()
+            steal_view.interaction_check = self.interaction_check
             steal_view.add_item(steal_select)
-            await interaction.response.send_message("훔칠 아이템을 선택하세요:", view=steal_view, ephemeral=True)
+            await interaction.followup.send("훔칠 아이템을 선택하세요:", view=steal_view, ephemeral=True)
         else:
-            result, continue_turn = self.game.use_item(interaction.user.id, item, self.opponent_id)
+            result, continue_turn = game.use_item(interaction.user.id, item, self.opponent_id)
             if item == "돋보기":
-                await interaction.response.send_message(result, ephemeral=True)
                 await self.update_game_message(
                     interaction,
+                    game,
+                    version,
                     f"{interaction.user.display_name}이(가) 돋보기를 사용했습니다.",
                     False,
-                    continue_turn
+                    continue_turn,
+                    private_result=result
                 )
             else:
                 await self.update_game_message(
                     interaction,
+                    game,
+                    version,
                     result,
                     item in ["맥주", "인버터"],
                     continue_turn
                 )
 
-    async def update_game_message(self, interaction, result_message, force_show_chamber, continue_turn):
-        game = self.game
+    async def update_game_message(self, interaction, game, version, result_message, force_show_chamber, continue_turn, private_result=None):
         opponent = game.player2 if interaction.user.id == game.player1.id else game.player1
-        current_player = game.get_player(game.current_turn)
-        embed = discord.Embed(
-            title=f"벅샷 룰렛 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴",
-            description=f"{game.player1.mention} vs {game.player2.mention}",
-            color=discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
-        )
-        embed.set_thumbnail(url="https://i.imgur.com/9kXz6rT.png")
-        embed.add_field(name="아이템 사용", value=result_message, inline=False)
-        embed.add_field(name=f"{game.player1.display_name} 체력", value=f"❤️ {game.hp[game.player1.id]}", inline=True)
-        embed.add_field(name=f"{game.player2.display_name} 체력", value=f"❤️ {game.hp[game.player2.id]}", inline=True)
-        if game.show_chamber or force_show_chamber:
-            embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-        embed.add_field(
-            name=f"{game.player1.display_name} 아이템",
-            value=", ".join(game.items[game.player1.id]) or "없음",
-            inline=False
-        )
-        embed.add_field(
-            name=f"{game.player2.display_name} 아이템",
-            value=", ".join(game.items[game.player2.id]) or "없음",
-            inline=False
-        )
-        embed.add_field(
-            name="스코어",
-            value=(
-                f"{game.player1.display_name}: {game.scores[game.player1.id]} | "
-                f"{game.player2.display_name}: {game.scores[game.player2.id]}"
-            ),
-            inline=True
-        )
-        embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        events = [("아이템 사용", result_message)]
+        results = []
+        show_chamber = game.show_chamber or force_show_chamber
         game.show_chamber = False  # 턴 종료 후 탄환 정보 숨김
+        view = build_duel_view(game.game_id)
+        finished = False
 
         if not continue_turn:  # 약으로 패배 시
             game.scores[opponent.id] += 1
             game_end = game.check_game_end()
             if game_end:
-                embed.add_field(name="게임 종료", value=game_end, inline=False)
+                results.append(("게임 종료", game_end))
                 view = discord.ui.View()
-                game.save_game(self.interaction.channel_id, clear=True)
-                if self.interaction.channel_id in games:
-                    del games[self.interaction.channel_id]
+                finished = True
             else:
                 game.start_new_round()
-                current_player = game.get_player(game.current_turn)
-                embed = discord.Embed(
-                    title=f"벅샷 룰렛 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴",
-                    description=f"{game.player1.mention} vs {game.player2.mention}",
-                    color=discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
-                )
-                embed.set_thumbnail(url="https://i.imgur.com/9kXz6rT.png")
-                embed.add_field(
-                    name="새 라운드",
-                    value=f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.",
-                    inline=False
-                )
-                embed.add_field(name=f"{game.player1.display_name} 체력", value=f"❤️ {game.hp[game.player1.id]}", inline=True)
-                embed.add_field(name=f"{game.player2.display_name} 체력", value=f"❤️ {game.hp[game.player2.id]}", inline=True)
-                if game.show_chamber:
-                    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                embed.add_field(
-                    name=f"{game.player1.display_name} 아이템",
-                    value=", ".join(game.items[game.player1.id]) or "없음",
-                    inline=False
-                )
-                embed.add_field(
-                    name=f"{game.player2.display_name} 아이템",
-                    value=", ".join(game.items[game.player2.id]) or "없음",
-                    inline=False
-                )
-                embed.add_field(
-                    name="스코어",
-                    value=(
-                        f"{game.player1.display_name}: {game.scores[game.player1.id]} | "
-                        f"{game.player2.display_name}: {game.scores[game.player2.id]}"
-                    ),
-                    inline=True
-                )
-                embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                view = discord.ui.View(timeout=300)
-                view.add_item(discord.ui.Button(
-                    label="자신 쏘기",
-                    style=discord.ButtonStyle.red,
-                    emoji="🔫",
-                    custom_id="shoot_self"
-                ))
-                view.add_item(discord.ui.Button(
-                    label="상대 쏘기",
-                    style=discord.ButtonStyle.green,
-                    emoji="🎯",
-                    custom_id="shoot_opponent"
-                ))
-                view.add_item(discord.ui.Button(
-                    label="아이템 사용",
-                    style=discord.ButtonStyle.blurple,
-                    emoji="🧪",
-                    custom_id="use_item"
-                ))
-
-        if game.last_message:
-            try:
-                await game.last_message.delete()
-            except discord.NotFound:
-                pass
-        try:
-            game.last_message = await interaction.response.send_message(embed=embed, view=view)
-            game.save_game(self.interaction.channel_id, last_message_id=game.last_message.id if game.last_message else None)
-        except Exception as e:
-            logging.error(f"메시지 전송 실패: {e}")
-            await interaction.response.send_message("메시지 전송에 실패했습니다. 다시 시도해주세요.", ephemeral=True)
+                events = [("새 라운드", f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.")]
+                show_chamber = game.show_chamber
 
-class BuckshotGame:
-    def __init__(self, player1, player2, channel_id=None):
+        embed = render_game_embed(game, RULESET, events, results, show_chamber=show_chamber)
+        await commit_game_update(
+            interaction, duel_key(game.game_id), game, version, embed, view, finished, private_result
+        )
+
+class BuckshotGame(ChannelItemHooks):
+    def __init__(self, player1, player2, channel_id=None, seed=None, game_id=None):
         if player1 is None or player2 is None:
             raise ValueError("플레이어 객체가 유효하지 않습니다.")
         self.player1 = player1
         self.player2 = player2
-        initial_hp = random.randint(2, 4)
+        self.rng = GameRNG(seed)
+        initial_hp = self.rng.stream("hp").randint(2, 4)
         self.hp = {player1.id: initial_hp, player2.id: initial_hp}
         self.chamber = []
         self.items = {player1.id: [], player2.id: []}
@@ -237,95 +861,67 @@ class BuckshotGame:
         self.handcuff_active = {player1.id: 0, player2.id: 0}
         self.round = 1
         self.scores = {player1.id: 0, player2.id: 0}
-        self.last_message = None
+        self.last_message_id = None
+        self.game_id = game_id or new_game_id()
         self.channel_id = channel_id
         self.show_chamber = True  # 초기 장전 시 탄환 정보 표시
-        self.all_items = [
-            "맥주", "돋보기", "담배", "칼", "수갑",
-            "버너폰", "약", "인버터", "주사기", "잼머"
-        ]
+        self.all_items = ALL_ITEMS
         self.load_chamber()
         self.assign_items(initial=True)
         logging.info(f"게임 시작: {player1.display_name} HP={initial_hp}, {player2.display_name} HP={initial_hp}")
 
-    def save_game(self, channel_id, last_message_id=None, clear=False):
-        conn = sqlite3.connect('buckshot_games.db')
-        c = conn.cursor()
-        if clear:
-            c.execute("DELETE FROM games WHERE channel_id = ?", (channel_id,))
-        else:
-            c.execute('''INSERT OR REPLACE INTO games (
-                channel_id, player1_id, player2_id, hp, chamber, items, current_turn,
-                knife_active, handcuff_active, round, scores, last_message_id, show_chamber
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
-                channel_id, self.player1.id, self.player2.id,
-                json.dumps(self.hp), json.dumps(self.chamber), json.dumps(self.items),
-                self.current_turn, json.dumps(self.knife_active), json.dumps(self.handcuff_active),
-                self.round, json.dumps(self.scores), last_message_id, int(self.show_chamber)
-            ))
-        conn.commit()
-        conn.close()
+    def save_game(self, last_message_id=None, clear=False):
+        save_channel_game(duel_key(self.game_id), self, (self.player1.id, self.player2.id), last_message_id, clear)
 
-    @staticmethod
-    async def load_game(channel_id, client):
-        conn = sqlite3.connect('buckshot_games.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM games WHERE channel_id = ?", (channel_id,))
-        row = c.fetchone()
-        if not row:
-            conn.close()
-            return None
-        try:
-            player1 = await client.fetch_user(row[1])
-            player2 = await client.fetch_user(row[2])
-            if player1 is None or player2 is None:
-                logging.warning(f"유저 조회 실패: player1_id={row[1]}, player2_id={row[2]}")
-                c.execute("DELETE FROM games WHERE channel_id = ?", (channel_id,))
-                conn.commit()
-                conn.close()
-                return None
-        except discord.errors.NotFound:
-            logging.warning(f"유저를 찾을 수 없음: player1_id={row[1]}, player2_id={row[2]}")
-            c.execute("DELETE FROM games WHERE channel_id = ?", (channel_id,))
-            conn.commit()
-            conn.close()
-            return None
-        game = BuckshotGame(player1, player2, channel_id)
-        game.hp = json.loads(row[3])
-        game.chamber = json.loads(row[4])
-        items = json.loads(row[5])
-        game.items = {
-            player1.id: items.get(str(player1.id), [])[:4],
-            player2.id: items.get(str(player2.id), [])[:4]
+    def to_state(self):
+        """저장소에 넣을 상태 (플레이어별 값은 player1, player2 순서의 리스트)"""
+        order = (self.player1.id, self.player2.id)
+        return {
+            "game_id": self.game_id,
+            "channel_id": self.channel_id,
+            "players": [[player.id, player.display_name] for player in (self.player1, self.player2)],
+            "hp": [self.hp[player_id] for player_id in order],
+            "chamber": self.chamber,
+            "items": [self.items[player_id] for player_id in order],
+            "current_turn": self.current_turn,
+            "knife_active": [self.knife_active[player_id] for player_id in order],
+            "handcuff_active": [self.handcuff_active[player_id] for player_id in order],
+            "round": self.round,
+            "scores": [self.scores[player_id] for player_id in order],
+            "show_chamber": self.show_chamber,
+            "last_message_id": self.last_message_id,
+            "rng_state": self.rng.get_state(),
         }
-        game.current_turn = row[6]
-        game.knife_active = json.loads(row[7])
-        game.handcuff_active = json.loads(row[8])
-        game.round = row[9]
-        game.scores = json.loads(row[10])
-        game.show_chamber = bool(row[12])
-        logging.info(
-            f"게임 로드: {player1.display_name} 아이템={len(game.items[player1.id])}, "
-            f"{player2.display_name} 아이템={len(game.items[player2.id])}, show_chamber={game.show_chamber}"
-        )
-        conn.close()
+
+    @classmethod
+    def from_state(cls, state):
+        game = cls.__new__(cls)
+        game.player1, game.player2 = (StoredPlayer(player_id, name) for player_id, name in state["players"])
+        order = (game.player1.id, game.player2.id)
+        game.game_id = state["game_id"]
+        game.channel_id = state["channel_id"]
+        game.hp = dict(zip(order, state["hp"]))
+        game.chamber = state["chamber"]
+        game.items = dict(zip(order, state["items"]))
+        game.current_turn = state["current_turn"]
+        game.knife_active = dict(zip(order, state["knife_active"]))
+        game.handcuff_active = dict(zip(order, state["handcuff_active"]))
+        game.round = state["round"]
+        game.scores = dict(zip(order, state["scores"]))
+        game.show_chamber = state["show_chamber"]
+        game.last_message_id = state["last_message_id"]
+        game.rng = GameRNG.from_state(state["rng_state"])
+        game.all_items = ALL_ITEMS
         return game
 
     def load_chamber(self):
-        total_bullets = min(2 + self.round * 2, 8)
-        live = random.randint(1, total_bullets // 2 + 1)
-        blank = total_bullets - live
-        self.chamber = ["live"] * live + ["blank"] * blank
-        random.shuffle(self.chamber)
+        self.chamber, live, blank = RULESET.draw_chamber(self.rng.stream("chamber"), self.round)
         self.assign_items(initial=False)
         self.show_chamber = True  # 재장전 시 탄환 정보 표시
-        logging.info(
-            f"탄환 장전: 라운드 {self.round}, 실탄 {self.chamber.count('live')}발, "
-            f"공포탄 {self.chamber.count('blank')}발"
-        )
+        logging.info(f"탄환 장전: 라운드 {self.round}, 실탄 {live}발, 공포탄 {blank}발")
         return (
             f"샷건이 새로운 탄환으로 장전되었습니다! "
-            f"🔴 실탄: {self.chamber.count('live')}발 | 🔵 공포탄: {self.chamber.count('blank')}발"
+            f"🔴 실탄: {live}발 | 🔵 공포탄: {blank}발"
         )
 
     def get_chamber_info(self):
@@ -333,10 +929,26 @@ class BuckshotGame:
         blank_count = self.chamber.count("blank")
         return f"🔴 실탄: {live_count}발 | 🔵 공포탄: {blank_count}발"
 
+    def get_hp_bar(self, player_id, viewer_id=None):
+        return f"❤️ {self.hp[player_id]}"
+
+    def pregenerate_chambers(self, n):
+        """현재 라운드 규칙으로 앞으로 장전될 탄창 n개를 미리 생성 (시뮬레이션용)"""
+        return self.rng.pregenerate("chamber", lambda rng: RULESET.draw_chamber(rng, self.round)[0], n)
+
+    def pregenerate_items(self, n, item_count=2):
+        """앞으로 n번의 아이템 배분 결과를 미리 생성 (시뮬레이션용)"""
+        return self.rng.pregenerate(
+            "items",
+            lambda rng: [ITEM_CONFIG.draw(rng, item_count) for _ in range(2)],
+            n
+        )
+
     def assign_items(self, initial=False):
-        item_count = random.choice([2, 4]) if initial else 2
+        rng = self.rng.stream("items")
+        item_count = rng.choice([2, 4]) if initial else 2
         for player_id in [self.player1.id, self.player2.id]:
-            self.items[player_id] = random.sample(self.all_items, item_count)
+            self.items[player_id] = ITEM_CONFIG.draw(rng, item_count)
             self.items[player_id] = self.items[player_id][:4]
             logging.info(
                 f"플레이어 {self.get_player(player_id).display_name} 아이템: "
@@ -345,7 +957,7 @@ class BuckshotGame:
 
     def start_new_round(self):
         self.round += 1
-        initial_hp = random.randint(2, 4)
+        initial_hp = self.rng.stream("hp").randint(2, 4)
         self.hp = {self.player1.id: initial_hp, self.player2.id: initial_hp}
         self.chamber = []
         self.knife_active = {self.player1.id: False, self.player2.id: False}
@@ -403,92 +1015,13 @@ class BuckshotGame:
         if item not in self.items[user_id]:
             return "아이템을 가지고 있지 않습니다!", False
         self.items[user_id].remove(item)
-        if item == "맥주":
-            if self.chamber:
-                bullet = self.chamber.pop(0)
-                live_count = self.chamber.count("live")
-                blank_count = self.chamber.count("blank")
-                reload_message = None
-                if live_count >= 2 or blank_count >= 2:
-                    reload_message = self.load_chamber()
-                    return (
-                        f"🍺 맥주: {'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}을 배출했습니다! "
-                        f"재장전: {reload_message}"
-                    ), True
-                return (
-                    f"🍺 맥주: {'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}을 배출했습니다!"
-                ), True
-            return "🔄 탄환이 없습니다!", True
-        elif item == "돋보기":
-            if self.chamber:
-                return (
-                    f"🔍 돋보기: 다음 탄환은 {'🔴 실탄' if self.chamber[0] == 'live' else '🔵 공포탄'}입니다!"
-                ), True
-            return "🔄 탄환이 없습니다!", True
-        elif item == "담배":
-            if self.hp[user_id] < 6:
-                old_hp = self.hp[user_id]
-                self.hp[user_id] += 1
-                return (
-                    f"🚬 담배: 체력 1 회복! HP: {old_hp} → {self.hp[user_id]}"
-                ), True
-            return "🚬 담배: 이미 최대 체력입니다!", True
-        elif item == "칼":
-            self.knife_active[user_id] = True
-            return "🪚 칼: 다음 샷 데미지 2배!", True
-        elif item == "수갑" or item == "잼머":
-            self.handcuff_active[opponent_id] += 1
-            return (
-                f"⛓ {'수갑' if item == '수갑' else '잼머'}: 상대의 다음 턴을 건너뜁니다!"
-            ), True
-        elif item == "주사기":
-            if opponent_id and self.items[opponent_id]:
-                return (
-                    "💉 주사기: 상대의 아이템을 선택해 훔쳐 즉시 사용합니다."
-                ), True
-            return "💉 주사기: 상대에게 훔칠 아이템이 없습니다!", True
-        elif item == "버너폰":
-            if self.chamber:
-                idx = random.randint(0, len(self.chamber) - 1)
-                bullet = self.chamber[idx]
-                return (
-                    f"📱 버너폰: {idx + 1}번째 탄환은 {'🔴 실탄' if bullet == 'live' else '🔵 공포탄'}입니다!"
-                ), True
-            return "🔄 탄환이 없습니다!", True
-        elif item == "약":
-            if random.random() < 0.4:
-                old_hp = self.hp[user_id]
-                self.hp[user_id] = min(self.hp[user_id] + 2, 6)
-                return (
-                    f"💊 약: 2HP 회복! HP: {old_hp} → {self.hp[user_id]}"
-                ), True
-            else:
-                old_hp = self.hp[user_id]
-                self.hp[user_id] -= 1
-                if self.hp[user_id] <= 0:
-                    return (
-                        f"💊 약: 1HP 손실! "
-                        f"{self.get_player(user_id).display_name} 패배!"
-                    ), False
-                return (
-                    f"💊 약: 1HP 손실! HP: {old_hp} → {self.hp[user_id]}"
-                ), True
-        elif item == "인버터":
-            if self.chamber and len(self.chamber) > 1:
-                self.chamber[0], self.chamber[1] = self.chamber[1], self.chamber[0]
-                live_count = self.chamber.count("live")
-                blank_count = self.chamber.count("blank")
-                if live_count >= 2 or blank_count >= 2:
-                    reload_message = self.load_chamber()
-                    return (
-                        f"🔄 인버터: 현재 탄환과 다음 탄환의 위치가 바뀌었습니다! "
-                        f"재장전: {reload_message}"
-                    ), True
-                return (
-                    f"🔄 인버터: 현재 탄환과 다음 탄환의 위치가 바뀌었습니다!"
-                ), True
-            return "🔄 인버터: 사용할 수 없습니다!", True
-        return "아이템 사용 실패!", True
+        if item not in ITEMS:
+            return "아이템 사용 실패!", True
+        return ITEMS[item].apply(self, user_id, opponent_id)
+
+    # 아이템 효과가 쓰는 게임별 훅 (개인전은 좌석 번호 기준으로 같은 이름을 구현)
+    def skip_next_turn(self, player_id):
+        self.handcuff_active[player_id] += 1
 
     def get_player(self, player_id):
         return self.player1 if player_id == self.player1.id else self.player2
@@ -507,90 +1040,415 @@ class BuckshotGame:
         if self.scores[self.player1.id] >= 2:
             return (
                 f"{self.player1.display_name} 최종 승리! 🏆 "
-                f"({self.scores[self.player1.id]}:{self.scores[self.player2.id]})"
+                f"({self.scores[self.player1.id]}:{self.scores[self.player2.id]}) | 시드: {self.rng.seed}"
             )
         elif self.scores[self.player2.id] >= 2:
             return (
                 f"{self.player2.display_name} 최종 승리! 🏆 "
-                f"({self.scores[self.player1.id]}:{self.scores[self.player2.id]})"
+                f"({self.scores[self.player1.id]}:{self.scores[self.player2.id]}) | 시드: {self.rng.seed}"
             )
         return None
 
-@tree.command(name="buckshot", description="다른 유저와 벅샷 룰렛 대결을 시작합니다!")
-@app_commands.describe(opponent="대결할 상대를 선택하세요")
-async def buckshot(interaction: discord.Interaction, opponent: discord.Member):
-    if opponent == interaction.user:
-        await interaction.response.send_message("자신과 대결할 수 없습니다!", ephemeral=True)
-        return
-    if opponent.bot:
-        await interaction.response.send_message("봇과 대결할 수 없습니다!", ephemeral=True)
-        return
-    try:
-        game = await BuckshotGame.load_game(interaction.channel_id, client)
-        if game:
-            await interaction.response.send_message("이 채널에서 이미 게임이 진행 중입니다!", ephemeral=True)
-            return
-    except Exception as e:
-        logging.error(f"게임 로드 실패: {e}")
-        conn = sqlite3.connect('buckshot_games.db')
-        c = conn.cursor()
-        c.execute("DELETE FROM games WHERE channel_id = ?", (interaction.channel_id,))
-        conn.commit()
-        conn.close()
+# 개인전 설정
+FFA_MIN_PLAYERS = 3
+FFA_MAX_PLAYERS = 6
+FFA_WIN_SCORE = 2
+FFA_TARGET_ITEMS = tuple(item.name for item in ITEM_CONFIG.items if item.needs_target)  # 개인전에서 대상을 골라야 하는 아이템
+
+class FreeForAllGame(ChannelItemHooks):
+    """3~6인 개인전
+
+    플레이어별 상태는 좌석 번호로 인덱싱되는 리스트(hp, items, knife_active, skip_turns, alive, scores)에 둔다.
+    디스코드 ID로 찾는 곳은 seats 하나뿐이고, 턴은 좌석 순서로 돌며 탈락한 좌석과 턴 건너뛰기가 걸린 좌석을 지나친다.
+    """
+    def __init__(self, players, channel_id=None, seed=None, game_id=None):
+        if not FFA_MIN_PLAYERS <= len(players) <= FFA_MAX_PLAYERS:
+            raise ValueError(f"개인전은 {FFA_MIN_PLAYERS}~{FFA_MAX_PLAYERS}명이 필요합니다.")
+        self.players = list(players)
+        self.seats = {player.id: seat for seat, player in enumerate(self.players)}
+        self.rng = GameRNG(seed)
+        self.round = 1
+        self.scores = [0] * len(self.players)
+        self.last_message_id = None
+        self.game_id = game_id or new_game_id()
+        self.channel_id = channel_id
+        self.init_round()
+        logging.info(f"개인전 시작: {', '.join(player.display_name for player in self.players)} HP={self.hp[0]}")
+
+    def init_round(self):
+        seat_count = len(self.players)
+        initial_hp = self.rng.stream("hp").randint(2, 4)
+        self.hp = [initial_hp] * seat_count
+        self.alive = [True] * seat_count
+        self.knife_active = [False] * seat_count
+        self.skip_turns = [0] * seat_count
+        self.items = [[] for _ in range(seat_count)]
+        self.turn = (self.round - 1) % seat_count  # 라운드마다 첫 턴 좌석을 한 칸씩 돌림
+        self.load_chamber()
+        self.assign_items(initial=True)
+
+    def save_game(self, last_message_id=None, clear=False):
+        save_channel_game(ffa_key(self.game_id), self, (None, None), last_message_id, clear)
+
+    def to_state(self):
+        """저장소에 넣을 상태 (좌석 배열을 그대로 저장)"""
+        return {
+            "game_id": self.game_id,
+            "channel_id": self.channel_id,
+            "players": [[player.id, player.display_name] for player in self.players],
+            "hp": self.hp,
+            "alive": self.alive,
+            "items": self.items,
+            "knife_active": self.knife_active,
+            "skip_turns": self.skip_turns,
+            "scores": self.scores,
+            "chamber": self.chamber,
+            "turn": self.turn,
+            "round": self.round,
+            "show_chamber": self.show_chamber,
+            "last_message_id": self.last_message_id,
+            "rng_state": self.rng.get_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        game = cls.__new__(cls)
+        game.players = [StoredPlayer(player_id, name) for player_id, name in state["players"]]
+        game.seats = {player.id: seat for seat, player in enumerate(game.players)}
+        for field in ("game_id", "channel_id", "hp", "alive", "items", "knife_active", "skip_turns", "scores",
+                      "chamber", "turn", "round", "show_chamber", "last_message_id"):
+            setattr(game, field, state[field])
+        game.rng = GameRNG.from_state(state["rng_state"])
+        return game
+
+    def load_chamber(self):
+        self.chamber, live, blank = RULESET.draw_chamber(self.rng.stream("chamber"), self.round)
+        self.assign_items(initial=False)
+        self.show_chamber = True
+        logging.info(f"개인전 탄환 장전: 라운드 {self.round}, 실탄 {live}발, 공포탄 {blank}발")
+        return f"샷건이 새로운 탄환으로 장전되었습니다! 🔴 실탄: {live}발 | 🔵 공포탄: {blank}발"
+
+    def get_chamber_info(self):
+        return f"🔴 실탄: {self.chamber.count('live')}발 | 🔵 공포탄: {self.chamber.count('blank')}발"
+
+    def assign_items(self, initial=False):
+        rng = self.rng.stream("items")
+        item_count = rng.choice([2, 4]) if initial else 2
+        for seat in range(len(self.players)):
+            if self.alive[seat]:
+                self.items[seat] = ITEM_CONFIG.draw(rng, item_count)[:4]
+
+    def alive_seats(self):
+        return [seat for seat in range(len(self.players)) if self.alive[seat]]
+
+    def advance_turn(self):
+        """다음 살아 있는 좌석으로 턴을 넘김 (턴 건너뛰기가 걸린 좌석은 한 번씩 지나침)"""
+        seat = self.turn
+        while True:
+            seat = (seat + 1) % len(self.players)
+            if not self.alive[seat]:
+                continue
+            if self.skip_turns[seat] > 0:
+                self.skip_turns[seat] -= 1
+                logging.info(f"개인전 턴 스킵: {self.players[seat].display_name}")
+                continue
+            break
+        self.turn = seat
+        self.show_chamber = False
+
+    def eliminate(self, seat):
+        self.alive[seat] = False
+        self.items[seat] = []
+        self.skip_turns[seat] = 0
+        logging.info(f"개인전 탈락: {self.players[seat].display_name}")
+
+    def shoot(self, shooter, target):
+        """(탄, 추가 턴 여부, 데미지, 재장전 메시지, 이전 체력)을 반환"""
+        if not self.chamber:
+            return None, False, 0, self.load_chamber(), self.hp[target]
+        bullet = self.chamber.pop(0)
+        damage = 2 if self.knife_active[shooter] else 1
+        self.knife_active[shooter] = False
+        old_hp = self.hp[target]
+        extra_turn = False
+        if bullet == "live":
+            self.hp[target] = max(self.hp[target] - damage, 0)
+            if self.hp[target] == 0:
+                self.eliminate(target)
+        elif target == shooter:
+            extra_turn = True
+        reload_message = self.load_chamber() if needs_reload(self.chamber) else None
+        return bullet, extra_turn, damage, reload_message, old_hp
+
+    def take_shot(self, shooter, target):
+        """샷과 그에 따른 턴 진행을 처리하고 화면에 표시할 (필드 이름, 내용) 목록을 반환"""
+        bullet, extra_turn, damage, reload_message, old_hp = self.shoot(shooter, target)
+        events = []
+        shooter_name = self.players[shooter].display_name
+        target_name = "자신" if target == shooter else self.players[target].display_name
+        if bullet is None:
+            return [("장전", reload_message)]
+        if bullet == "live":
+            result_text = f"💥 실탄 🔴! {shooter_name}이(가) {target_name}에게 {damage} 데미지! HP: {old_hp} → {self.hp[target]}"
+            if not self.alive[target]:
+                result_text += f"\n💀 {self.players[target].display_name} 탈락!"
+        else:
+            result_text = f"🔵 공포탄! {shooter_name}이(가) {target_name}에게 쐈으나 피해 없음." + (" (추가 턴)" if extra_turn else "")
+        events.append(("발사 결과", result_text))
+        if reload_message:
+            events.append(("장전", reload_message))
+        if not extra_turn:
+            events.extend(self.end_turn())
+        return events
+
+    def use_item(self, seat, item, target=None):
+        """(결과 메시지, 사용자 생존 여부)를 반환. 수갑, 잼머, 주사기는 target 좌석이 필요"""
+        if item not in self.items[seat]:
+            return "아이템을 가지고 있지 않습니다!", True
+        if item in FFA_TARGET_ITEMS and (target is None or target == seat or not self.alive[target]):
+            return "대상을 선택해야 합니다!", True
+        self.items[seat].remove(item)
+        if item not in ITEMS:
+            return "아이템 사용 실패!", True
+        return ITEMS[item].apply(self, seat, target)
+
+    target_word = "대상"
+
+    def player_name(self, seat):
+        return self.players[seat].display_name
+
+    target_name = player_name
+
+    def skip_next_turn(self, seat):
+        self.skip_turns[seat] += 1
+
+    def knock_out(self, seat):
+        self.eliminate(seat)
+        return "탈락"
+
+    def steal_item(self, seat, target, stolen_item):
+        """주사기: 대상의 아이템을 훔쳐 같은 대상에게 즉시 사용"""
+        if "주사기" not in self.items[seat] or stolen_item not in self.items[target]:
+            return "아이템을 가지고 있지 않습니다!", True
+        self.items[seat].remove("주사기")
+        self.items[target].remove(stolen_item)
+        self.items[seat].append(stolen_item)
+        result, alive = self.use_item(seat, stolen_item, target)
+        return f"💉 주사기: {self.players[target].display_name}의 {stolen_item}을(를) 훔쳐 사용! {result}", alive
+
+    def end_turn(self):
+        """턴 종료 처리: 한 명만 남으면 라운드를 끝내고, 아니면 다음 좌석으로 턴을 넘김"""
+        alive_seats = self.alive_seats()
+        if len(alive_seats) > 1:
+            self.advance_turn()
+            return []
+        winner = alive_seats[0]
+        self.scores[winner] += 1
+        events = [("라운드 종료", f"{self.players[winner].display_name}이(가) 라운드 {self.round} 생존!")]
+        game_end = self.check_game_end()
+        if game_end:
+            events.append(("게임 종료", game_end))
+        else:
+            self.round += 1
+            self.init_round()
+            events.append(("새 라운드", f"라운드 {self.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다."))
+        return events
+
+    def check_game_end(self):
+        leader = max(range(len(self.players)), key=lambda seat: self.scores[seat])
+        if self.scores[leader] >= FFA_WIN_SCORE:
+            standings = " / ".join(f"{player.display_name} {score}" for player, score in zip(self.players, self.scores))
+            return f"{self.players[leader].display_name} 최종 승리! 🏆 ({standings}) | 시드: {self.rng.seed}"
+        return None
 
-    game = BuckshotGame(interaction.user, opponent, interaction.channel_id)
-    games[interaction.channel_id] = game
-    current_player = game.get_player(game.current_turn)
+def build_ffa_embed(game, events=()):
+    """개인전 화면 (플레이어 수에 비례해 한 줄씩 그림)"""
+    current_player = game.players[game.turn]
     embed = discord.Embed(
-        title=f"벅샷 룰렛 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴",
-        description=f"{interaction.user.mention} vs {opponent.mention}",
-        color=discord.Color.red() if game.current_turn == interaction.user.id else discord.Color.blue()
+        title=f"벅샷 룰렛 개인전 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴",
+        description=" vs ".join(player.mention for player in game.players),
+        color=discord.Color.orange()
     )
     embed.set_thumbnail(url="https://i.imgur.com/9kXz6rT.png")
-    embed.add_field(name=f"{interaction.user.display_name} 체력", value=f"❤️ {game.hp[interaction.user.id]}", inline=True)
-    embed.add_field(name=f"{opponent.display_name} 체력", value=f"❤️ {game.hp[opponent.id]}", inline=True)
+    for name, value in events:
+        embed.add_field(name=name, value=value, inline=False)
+    lines = []
+    for seat, player in enumerate(game.players):
+        if not game.alive[seat]:
+            marker = "💀"
+        elif seat == game.turn:
+            marker = "▶️"
+        else:
+            marker = "⛓" if game.skip_turns[seat] else "▫️"
+        lines.append(
+            f"{marker} **{player.display_name}** ❤️ {game.hp[seat]} | 🏆 {game.scores[seat]} | "
+            f"🧪 {', '.join(game.items[seat]) or '없음'}"
+        )
+    embed.add_field(name="플레이어", value="\n".join(lines), inline=False)
     if game.show_chamber:
         embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-    embed.add_field(
-        name=f"{interaction.user.display_name} 아이템",
-        value=", ".join(game.items[interaction.user.id]) or "없음",
-        inline=False
-    )
-    embed.add_field(
-        name=f"{opponent.display_name} 아이템",
-        value=", ".join(game.items[opponent.id]) or "없음",
-        inline=False
-    )
-    embed.add_field(
-        name="스코어",
-        value=(
-            f"{interaction.user.display_name}: {game.scores[interaction.user.id]} | "
-            f"{opponent.display_name}: {game.scores[opponent.id]}"
-        ),
-        inline=True
-    )
     embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    game.show_chamber = False  # 초기 표시 후 숨김
+    return embed
 
+def build_ffa_view(game):
     view = discord.ui.View(timeout=300)
     view.add_item(discord.ui.Button(
         label="자신 쏘기",
         style=discord.ButtonStyle.red,
         emoji="🔫",
-        custom_id="shoot_self"
+        custom_id=f"ffa_shoot_self:{game.game_id}"
     ))
-    view.add_item(discord.ui.Button(
-        label="상대 쏘기",
-        style=discord.ButtonStyle.green,
-        emoji="🎯",
-        custom_id="shoot_opponent"
+    view.add_item(discord.ui.Select(
+        placeholder="🎯 쏠 상대를 선택하세요",
+        custom_id=f"ffa_shoot_target:{game.game_id}",
+        options=[
+            discord.SelectOption(label=game.players[seat].display_name, value=str(seat))
+            for seat in game.alive_seats() if seat != game.turn
+        ]
     ))
     view.add_item(discord.ui.Button(
         label="아이템 사용",
         style=discord.ButtonStyle.blurple,
         emoji="🧪",
-        custom_id="use_item"
+        custom_id=f"ffa_use_item:{game.game_id}"
     ))
+    return view
+
+async def send_ffa_update(interaction, game, version, events, private_result=None):
+    """개인전 화면을 저장소에 반영하고 새로 보냄 (게임이 끝났으면 저장된 상태를 지움)
+
+    private_result가 있으면 사용자에게만 먼저 보여주고 화면은 후속 메시지로 보낸다 (돋보기).
+    """
+    finished = any(name == "게임 종료" for name, value in events)
+    embed = build_ffa_embed(game, events)
+    game.show_chamber = False  # 표시 후 숨김
+    view = discord.ui.View() if finished else build_ffa_view(game)
+    await commit_game_update(interaction, ffa_key(game.game_id), game, version, embed, view, finished, private_result)
+
+class FFAItemSelectView(discord.ui.View):
+    """개인전 아이템 선택 (수갑, 잼머, 주사기는 대상 좌석을 이어서 선택)
+
+    메뉴는 열 때의 상태로 만들고, 적용할 때 저장소에서 게임을 다시 읽는다.
+    """
+    def __init__(self, game, seat):
+        super().__init__(timeout=60)
+        self.game = game
+        self.seat = seat
+        select = discord.ui.Select(
+            placeholder="사용할 아이템을 선택하세요",
+            options=[discord.SelectOption(label=item, value=item) for item in dict.fromkeys(game.items[seat])]
+        )
+        select.callback = self.item_select_callback
+        self.add_item(select)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        recorder.record(self.game.game_id, interaction)
+        return await throttle(interaction, self.game.game_id, self.game.seats)
+
+    async def load_turn(self, interaction):
+        game_id = self.game.game_id
+        game, version = await load_live_game(FreeForAllGame, ffa_key(game_id))
+        if not game or interaction.user.id != game.players[self.seat].id or game.turn != self.seat:
+            await interaction.followup.send("당신의 턴이 아닙니다!", ephemeral=True)
+            return None, 0
+        return game, version
+
+    async def item_select_callback(self, interaction: discord.Interaction):
+        item = interaction.data["values"][0]
+        await acknowledge(interaction, "ffa_item_select")
+        if item not in FFA_TARGET_ITEMS:
+            await self.apply(interaction, item)
+            return
+        targets = [
+            seat for seat in self.game.alive_seats()
+            if seat != self.seat and (item != "주사기" or self.game.items[seat])
+        ]
+        if not targets:
+            await interaction.followup.send("대상으로 고를 수 있는 플레이어가 없습니다!", ephemeral=True)
+            return
+        target_select = discord.ui.Select(
+            placeholder="대상을 선택하세요",
+            options=[discord.SelectOption(label=self.game.players[seat].display_name, value=str(seat)) for seat in targets]
+        )
+
+        async def target_select_callback(target_interaction: discord.Interaction):
+            target = int(target_interaction.data["values"][0])
+            await acknowledge(target_interaction, "ffa_target_select")
+            if item != "주사기":
+                await self.apply(target_interaction, item, target)
+                return
+            steal_select = discord.ui.Select(
+                placeholder="훔칠 아이템을 선택하세요",
+                options=[discord.SelectOption(label=stolen, value=stolen) for stolen in dict.fromkeys(self.game.items[target])]
+            )
+
+            async def steal_select_callback(steal_interaction: discord.Interaction):
+                await acknowledge(steal_interaction, "ffa_steal_select")
+                game, version = await self.load_turn(steal_interaction)
+                if not game:
+                    return
+                result, alive = game.steal_item(self.seat, target, steal_interaction.data["values"][0])
+                await send_ffa_update(steal_interaction, game, version, self.after_item(game, result, alive))
+
+            steal_select.callback = steal_select_callback
+            steal_view = discord.ui.View()
+            steal_view.interaction_check = self.interaction_check
+            steal_view.add_item(steal_select)
+            await target_interaction.followup.send("훔칠 아이템을 선택하세요:", view=steal_view, ephemeral=True)
+
+        target_select.callback = target_select_callback
+        target_view = discord.ui.View()
+        target_view.interaction_check = self.interaction_check
+        target_view.add_item(target_select)
+        await interaction.followup.send("대상을 선택하세요:", view=target_view, ephemeral=True)
+
+    @staticmethod
+    def after_item(game, result, alive):
+        events = [("아이템 사용", result)]
+        if not alive:  # 약으로 탈락하면 턴을 넘김
+            events.extend(game.end_turn())
+        return events
+
+    async def apply(self, interaction, item, target=None):
+        game, version = await self.load_turn(interaction)
+        if not game:
+            return
+        result, alive = game.use_item(self.seat, item, target)
+        if item == "돋보기":
+            await send_ffa_update(
+                interaction, game, version,
+                [("아이템 사용", f"{interaction.user.display_name}이(가) 돋보기를 사용했습니다.")],
+                private_result=result
+            )
+            return
+        await send_ffa_update(interaction, game, version, self.after_item(game, result, alive))
+
+@tree.command(name="buckshot", description="다른 유저와 벅샷 룰렛 대결을 시작합니다!")
+@app_commands.describe(opponent="대결할 상대를 선택하세요")
+async def buckshot(interaction: discord.Interaction, opponent: discord.Member):
+    if opponent == interaction.user:
+        await interaction.response.send_message("자신과 대결할 수 없습니다!", ephemeral=True)
+        return
+    if opponent.bot:
+        await interaction.response.send_message("봇과 대결할 수 없습니다!", ephemeral=True)
+        return
+    guild_id = interaction.guild_id
+    blocked = admission.check("pending", guild_id, [interaction.user.id])
+    if blocked:
+        await interaction.response.send_message(
+            "이미 진행 중인 게임이 있거나 응답을 기다리는 초대가 너무 많습니다!" if blocked == "user" else ADMISSION_FULL_MESSAGE, ephemeral=True
+        )
+        return
+    game = BuckshotGame(interaction.user, opponent, interaction.channel_id, seed=interaction.extras.get("replay_seed"))  # 기록 재생 중에는 기록된 시드
+    recorder.start(game.game_id, game.rng.seed, [interaction.user.id, opponent.id], kind="duel")
+    key = duel_key(game.game_id)
+    await game_store.compare_and_set(key, 0, game.to_state())  # 새 게임 ID라 항상 비어 있음
+    game_index.add(key, interaction.channel_id)
+    admission.track(key, "pending", guild_id, [interaction.user.id])
+    version = 1
+    embed = render_game_embed(game, RULESET, show_chamber=game.show_chamber)
+    game.show_chamber = False  # 초기 표시 후 숨김
+    view = build_duel_view(game.game_id)
 
     invite_embed = discord.Embed(
         title="벅샷 룰렛 초대 🔫",
@@ -599,101 +1457,215 @@ async def buckshot(interaction: discord.Interaction, opponent: discord.Member):
     )
     invite_embed.set_image(url="https://i.imgur.com/3QfY7aP.png")
     invite_view = discord.ui.View()
-    accept_button = discord.ui.Button(label="수락", style=discord.ButtonStyle.green, emoji="✅")
+
+    async def on_invite_timeout():
+        # 수락하지 않은 초대만 지움 (수락했으면 버전이 올라가고 거절했으면 키가 없어 CAS가 실패함)
+        if not await game_store.compare_and_set(key, version, None):
+            return
+        game_index.remove(key, interaction.channel_id)
+        admission.forget(key)
+        game.save_game(clear=True)
+        try:
+            await interaction.edit_original_response(content="초대가 만료되었습니다.", embed=None, view=None)
+        except (discord.NotFound, discord.Forbidden):
+            pass
+
+    invite_view.on_timeout = on_invite_timeout
+
+    async def invite_interaction_check(button_interaction: discord.Interaction):
+        recorder.record(game.game_id, button_interaction)
+        return True
+
+    invite_view.interaction_check = invite_interaction_check
+    accept_button = discord.ui.Button(label="수락", style=discord.ButtonStyle.green, emoji="✅", custom_id=f"accept:{game.game_id}")
     async def accept_callback(button_interaction: discord.Interaction):
         if button_interaction.user.id != opponent.id:
             await button_interaction.response.send_message("당신은 초대를 수락할 수 없습니다!", ephemeral=True)
             return
-        if game.last_message:
-            try:
-                await game.last_message.delete()
-            except discord.NotFound:
-                pass
-        try:
-            game.last_message = await button_interaction.response.send_message(embed=embed, view=view)
-            game.save_game(interaction.channel_id, last_message_id=game.last_message.id if game.last_message else None)
+        if admission.check("active", guild_id, [interaction.user.id, opponent.id], reserved=True):
+            await button_interaction.response.send_message("진행 중인 게임이 있는 플레이어가 있어 아직 시작할 수 없습니다!", ephemeral=True)
+            return
+        await acknowledge(button_interaction, "accept")
+        if await commit_game_update(button_interaction, key, game, version, embed, view, False):
+            admission.track(key, "active", guild_id, [interaction.user.id, opponent.id])
             invite_view.clear_items()
-        except Exception as e:
-            logging.error(f"초대 수락 메시지 전송 실패: {e}")
-            await button_interaction.response.send_message("메시지 전송에 실패했습니다. 다시 시도해주세요.", ephemeral=True)
 
     accept_button.callback = accept_callback
     invite_view.add_item(accept_button)
 
-    reject_button = discord.ui.Button(label="거절", style=discord.ButtonStyle.red, emoji="❌")
+    reject_button = discord.ui.Button(label="거절", style=discord.ButtonStyle.red, emoji="❌", custom_id=f"reject:{game.game_id}")
     async def reject_callback(button_interaction: discord.Interaction):
         if button_interaction.user.id != opponent.id:
             await button_interaction.response.send_message("당신은 초대를 거절할 수 없습니다!", ephemeral=True)
             return
-        if game.last_message:
-            try:
-                await game.last_message.delete()
-            except discord.NotFound:
-                pass
         await button_interaction.response.send_message(
             f"{opponent.display_name}이(가) 초대를 거절했습니다!",
             ephemeral=False
         )
         invite_view.clear_items()
-        game.save_game(interaction.channel_id, clear=True)
-        if interaction.channel_id in games:
-            del games[interaction.channel_id]
+        game.save_game(clear=True)
+        await game_store.delete(key)
+        game_index.remove(key, interaction.channel_id)
+        admission.forget(key)
 
     reject_button.callback = reject_callback
     invite_view.add_item(reject_button)
 
     await interaction.response.send_message(embed=invite_embed, view=invite_view)
 
+# 개인전 모집 (게임 ID -> (채널 ID, 참가자 목록), 첫 번째가 방장). 모집은 명령을 받은 프로세스에서만 진행
+ffa_lobbies = {}
+
+@tree.command(name="ffa", description=f"{FFA_MIN_PLAYERS}~{FFA_MAX_PLAYERS}인 벅샷 룰렛 개인전을 모집합니다!")
+async def ffa(interaction: discord.Interaction):
+    channel_id = interaction.channel_id
+    guild_id = interaction.guild_id
+    blocked = admission.check("pending", guild_id, [interaction.user.id])
+    if blocked:
+        await interaction.response.send_message(
+            "이미 진행 중인 게임이 있거나 모집 중인 게임이 너무 많습니다!" if blocked == "user" else ADMISSION_FULL_MESSAGE, ephemeral=True
+        )
+        return
+    game_id = new_game_id()
+    seed = GameRNG(interaction.extras.get("replay_seed")).seed  # 시드는 모집할 때 정해 기록에 남김 (재생 중에는 기록된 시드)
+    players = [interaction.user]
+    ffa_lobbies[game_id] = (channel_id, players)
+    admission.track(ffa_key(game_id), "pending", guild_id, [interaction.user.id])
+    recorder.start(game_id, seed, [interaction.user.id], kind="ffa")
+
+    def lobby_embed():
+        embed = discord.Embed(
+            title="벅샷 룰렛 개인전 모집 🔫",
+            description=f"{interaction.user.mention}이(가) 개인전을 모집합니다! ({len(players)}/{FFA_MAX_PLAYERS}명)",
+            color=discord.Color.orange()
+        )
+        embed.add_field(name="참가자", value="\n".join(f"{seat + 1}. {player.mention}" for seat, player in enumerate(players)), inline=False)
+        embed.set_footer(text=f"{FFA_MIN_PLAYERS}명 이상 모이면 방장이 시작할 수 있습니다.")
+        return embed
+
+    lobby_view = discord.ui.View(timeout=300)
+
+    async def on_timeout():
+        if ffa_lobbies.pop(game_id, None) is not None:
+            admission.forget(ffa_key(game_id))
+
+    lobby_view.on_timeout = on_timeout
+
+    async def lobby_interaction_check(button_interaction: discord.Interaction):
+        recorder.record(game_id, button_interaction)
+        return True
+
+    lobby_view.interaction_check = lobby_interaction_check
+
+    join_button = discord.ui.Button(label="참가", style=discord.ButtonStyle.green, emoji="✋", custom_id=f"join:{game_id}")
+    async def join_callback(button_interaction: discord.Interaction):
+        if any(player.id == button_interaction.user.id for player in players):
+            await button_interaction.response.send_message("이미 참가했습니다!", ephemeral=True)
+            return
+        if button_interaction.user.bot or len(players) >= FFA_MAX_PLAYERS:
+            await button_interaction.response.send_message("참가할 수 없습니다!", ephemeral=True)
+            return
+        if admission.check("active", guild_id, [button_interaction.user.id], reserved=True):
+            await button_interaction.response.send_message("이미 진행 중인 게임이 있습니다!", ephemeral=True)
+            return
+        players.append(button_interaction.user)
+        await button_interaction.response.edit_message(embed=lobby_embed(), view=lobby_view)
+
+    join_button.callback = join_callback
+    lobby_view.add_item(join_button)
+
+    start_button = discord.ui.Button(label="시작", style=discord.ButtonStyle.red, emoji="🔫", custom_id=f"start:{game_id}")
+    async def start_callback(button_interaction: discord.Interaction):
+        if button_interaction.user.id != interaction.user.id:
+            await button_interaction.response.send_message("방장만 시작할 수 있습니다!", ephemeral=True)
+            return
+        if len(players) < FFA_MIN_PLAYERS:
+            await button_interaction.response.send_message(f"{FFA_MIN_PLAYERS}명 이상 필요합니다!", ephemeral=True)
+            return
+        if game_id in ffa_lobbies and admission.check("active", guild_id, [player.id for player in players], reserved=True):
+            await button_interaction.response.send_message("진행 중인 게임이 있는 플레이어가 있어 아직 시작할 수 없습니다!", ephemeral=True)
+            return
+        await acknowledge(button_interaction, "ffa_start")
+        if ffa_lobbies.pop(game_id, None) is None:  # 시작 버튼을 두 번 누름
+            return
+        lobby_view.stop()
+        game = FreeForAllGame(players, channel_id, seed=seed, game_id=game_id)
+        await game_store.compare_and_set(ffa_key(game_id), 0, game.to_state())
+        game_index.add(ffa_key(game_id), channel_id)
+        admission.track(ffa_key(game_id), "active", guild_id, [player.id for player in players])
+        await send_ffa_update(button_interaction, game, 1, [])
+
+    start_button.callback = start_callback
+    lobby_view.add_item(start_button)
+
+    await interaction.response.send_message(embed=lobby_embed(), view=lobby_view)
+
+async def handle_ffa_interaction(interaction, action, game_id):
+    await acknowledge(interaction, action)
+    game, version = await load_live_game(FreeForAllGame, ffa_key(game_id))
+    if not game:
+        return
+    seat = game.seats.get(interaction.user.id)
+    if seat != game.turn:
+        await interaction.followup.send("당신의 턴이 아닙니다!", ephemeral=True)
+        return
+    if action == "ffa_use_item":
+        if not game.items[seat]:
+            await interaction.followup.send("사용 가능한 아이템이 없습니다!", ephemeral=True)
+            return
+        await interaction.followup.send("아이템을 선택하세요:", view=FFAItemSelectView(game, seat), ephemeral=True)
+        return
+    if action == "ffa_shoot_self":
+        target = seat
+    else:
+        target = int(interaction.data["values"][0])
+        if target == seat or not game.alive[target]:
+            await interaction.followup.send("쏠 수 없는 대상입니다!", ephemeral=True)
+            return
+    await send_ffa_update(interaction, game, version, game.take_shot(seat, target))
+
 @client.event
 async def on_interaction(interaction: discord.Interaction):
     if not interaction.data or 'custom_id' not in interaction.data:
         return
-    custom_id = interaction.data['custom_id']
-    game = games.get(interaction.channel_id)
-    if not game:
-        game = await BuckshotGame.load_game(interaction.channel_id, client)
-        if game:
-            games[interaction.channel_id] = game
-        else:
+    action, game_id = parse_custom_id(interaction.data['custom_id'])
+    kind = GAME_ACTIONS.get(action)
+    if kind is None:
+        return
+    recorder.record(game_id, interaction)
+    message_id = interaction.message.id if interaction.message else None
+    if not await throttle(interaction, game_id or message_id):  # 저장소에서 게임을 읽기 전에 연타를 거름
+        return
+    if game_id is None:  # 이전 버전 화면의 버튼
+        game_id = find_message_game(kind, message_id) if message_id else None
+        if game_id is None:
+            await interaction.response.send_message("이미 끝났거나 찾을 수 없는 게임입니다.", ephemeral=True)
             return
+    if kind == "ffa":
+        await handle_ffa_interaction(interaction, action, game_id)
+        return
+    await acknowledge(interaction, action)
+    key = duel_key(game_id)
+    game, version = await load_live_game(BuckshotGame, key)
+    if not game:
+        return
     if interaction.user.id != game.current_turn:
-        await interaction.response.send_message("당신의 턴이 아닙니다!", ephemeral=True)
+        await interaction.followup.send("당신의 턴이 아닙니다!", ephemeral=True)
         return
     opponent = game.player2 if interaction.user.id == game.player1.id else game.player1
-    target_id = opponent.id if custom_id == "shoot_opponent" else interaction.user.id
-    embed = discord.Embed(
-        title=f"벅샷 룰렛 🔫 | 라운드 {game.round} | {game.get_player(game.current_turn).display_name}의 턴",
-        description=f"{game.player1.mention} vs {game.player2.mention}",
-        color=discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
-    )
-    embed.set_thumbnail(url="https://i.imgur.com/9kXz6rT.png")
-    view = discord.ui.View(timeout=300)
-    view.add_item(discord.ui.Button(
-        label="자신 쏘기",
-        style=discord.ButtonStyle.red,
-        emoji="🔫",
-        custom_id="shoot_self"
-    ))
-    view.add_item(discord.ui.Button(
-        label="상대 쏘기",
-        style=discord.ButtonStyle.green,
-        emoji="🎯",
-        custom_id="shoot_opponent"
-    ))
-    view.add_item(discord.ui.Button(
-        label="아이템 사용",
-        style=discord.ButtonStyle.blurple,
-        emoji="🧪",
-        custom_id="use_item"
-    ))
+    target_id = opponent.id if action == "shoot_opponent" else interaction.user.id
+    view = build_duel_view(game.game_id)
+    finished = False
 
-    if custom_id in ["shoot_self", "shoot_opponent"]:
+    if action in ["shoot_self", "shoot_opponent"]:
         bullet, extra_turn, damage, reload_message, handcuff_used = game.shoot(
             interaction.user.id, target_id
         )
         show_chamber = bool(reload_message)
+        events = []
+        results = []
         if reload_message:
-            embed.add_field(name="장전", value=reload_message, inline=False)
+            events.append(("장전", reload_message))
         else:
             target_name = game.get_player(target_id).display_name
             if bullet == "live":
@@ -707,118 +1679,38 @@ async def on_interaction(interaction: discord.Interaction):
                     f"🔵 공포탄! {interaction.user.display_name}이(가) {target_name}에게 "
                     f"쐈으나 피해 없음."
                 )
-            embed.add_field(name="발사 결과", value=result_text, inline=False)
+            events.append(("발사 결과", result_text))
             if handcuff_used:
-                embed.add_field(
-                    name="수갑 효과",
-                    value=f"{interaction.user.display_name}이(가) 수갑으로 턴을 유지했습니다!",
-                    inline=False
-                )
-        embed.add_field(name=f"{game.player1.display_name} 체력", value=f"❤️ {game.hp[game.player1.id]}", inline=True)
-        embed.add_field(name=f"{game.player2.display_name} 체력", value=f"❤️ {game.hp[game.player2.id]}", inline=True)
-        if show_chamber:
-            embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-        embed.add_field(
-            name=f"{game.player1.display_name} 아이템",
-            value=", ".join(game.items[game.player1.id]) or "없음",
-            inline=False
-        )
-        embed.add_field(
-            name=f"{game.player2.display_name} 아이템",
-            value=", ".join(game.items[game.player2.id]) or "없음",
-            inline=False
-        )
-        embed.add_field(
-            name="스코어",
-            value=(
-                f"{game.player1.display_name}: {game.scores[game.player1.id]} | "
-                f"{game.player2.display_name}: {game.scores[game.player2.id]}"
-            ),
-            inline=True
-        )
-        embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                events.append(("수갑 효과", f"{interaction.user.display_name}이(가) 수갑으로 턴을 유지했습니다!"))
         game.show_chamber = False  # 발사 후 탄환 정보 숨김
 
         if game.hp[target_id] <= 0:
-            winner_id = interaction.user.id if custom_id == "shoot_opponent" else opponent.id
+            winner_id = interaction.user.id if action == "shoot_opponent" else opponent.id
             game.scores[winner_id] += 1
-            embed.add_field(
-                name="라운드 종료",
-                value=f"{game.get_player(winner_id).display_name}이(가) 라운드 {game.round} 승리!",
-                inline=False
-            )
+            results.append(("라운드 종료", f"{game.get_player(winner_id).display_name}이(가) 라운드 {game.round} 승리!"))
             game_end = game.check_game_end()
             if game_end:
-                embed.add_field(name="게임 종료", value=game_end, inline=False)
+                results.append(("게임 종료", game_end))
                 view.clear_items()
-                game.save_game(interaction.channel_id, clear=True)
-                if interaction.channel_id in games:
-                    del games[interaction.channel_id]
+                finished = True
             else:
                 game.start_new_round()
-                current_player = game.get_player(game.current_turn)
-                embed = discord.Embed(
-                    title=f"벅샷 룰렛 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴",
-                    description=f"{game.player1.mention} vs {game.player2.mention}",
-                    color=discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
-                )
-                embed.set_thumbnail(url="https://i.imgur.com/9kXz6rT.png")
-                embed.add_field(
-                    name="새 라운드",
-                    value=f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.",
-                    inline=False
-                )
-                embed.add_field(name=f"{game.player1.display_name} 체력", value=f"❤️ {game.hp[game.player1.id]}", inline=True)
-                embed.add_field(name=f"{game.player2.display_name} 체력", value=f"❤️ {game.hp[game.player2.id]}", inline=True)
-                if game.show_chamber:
-                    embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
-                embed.add_field(
-                    name=f"{game.player1.display_name} 아이템",
-                    value=", ".join(game.items[game.player1.id]) or "없음",
-                    inline=False
-                )
-                embed.add_field(
-                    name=f"{game.player2.display_name} 아이템",
-                    value=", ".join(game.items[game.player2.id]) or "없음",
-                    inline=False
-                )
-                embed.add_field(
-                    name="스코어",
-                    value=(
-                        f"{game.player1.display_name}: {game.scores[game.player1.id]} | "
-                        f"{game.player2.display_name}: {game.scores[game.player2.id]}"
-                    ),
-                    inline=True
-                )
-                embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                events = [("새 라운드", f"라운드 {game.round} 시작! 체력, 아이템, 탄환이 초기화되었습니다.")]
+                results = []
+                show_chamber = game.show_chamber
                 game.show_chamber = False
-        else:
-            if not extra_turn and not handcuff_used:
-                game.switch_turn()
-            current_player = game.get_player(game.current_turn)
-            embed.title = (
-                f"벅샷 룰렛 🔫 | 라운드 {game.round} | {current_player.display_name}의 턴"
-            )
-            embed.color = discord.Color.red() if game.current_turn == game.player1.id else discord.Color.blue()
+        elif not extra_turn and not handcuff_used:
+            game.switch_turn()
 
-        if game.last_message:
-            try:
-                await game.last_message.delete()
-            except discord.NotFound:
-                pass
-        try:
-            game.last_message = await interaction.response.send_message(embed=embed, view=view)
-            game.save_game(interaction.channel_id, last_message_id=game.last_message.id if game.last_message else None)
-        except Exception as e:
-            logging.error(f"인터랙션 메시지 전송 실패: {e}")
-            await interaction.response.send_message("메시지 전송에 실패했습니다. 다시 시도해주세요.", ephemeral=True)
+        embed = render_game_embed(game, RULESET, events, results, show_chamber=show_chamber)
+        await commit_game_update(interaction, key, game, version, embed, view, finished)
 
-    elif custom_id == "use_item":
+    elif action == "use_item":
         items = game.items[interaction.user.id]
         if not items:
-            await interaction.response.send_message("사용 가능한 아이템이 없습니다!", ephemeral=True)
+            await interaction.followup.send("사용 가능한 아이템이 없습니다!", ephemeral=True)
             return
-        await interaction.response.send_message(
+        await interaction.followup.send(
             "아이템을 선택하세요:", view=ItemSelectView(game, items, opponent.id, interaction), ephemeral=True
         )
 
@@ -830,37 +1722,254 @@ async def items(interaction: discord.Interaction):
         color=discord.Color.purple()
     )
     embed.set_thumbnail(url="https://i.imgur.com/5mV8Z2j.png")
-    item_descriptions = {
-        "맥주": "샷건에서 현재 탄환을 배출하고 실탄인지 공포탄인지 확인합니다.",
-        "돋보기": "다음 탄환의 종류(실탄/공포탄)를 확인합니다.",
-        "담배": "체력을 1 회복합니다. 최대 체력은 6입니다.",
-        "칼": "다음 샷의 데미지를 2배로 만듭니다.",
-        "수갑": "상대의 다음 턴을 건너뜁니다 (중첩 가능).",
-        "주사기": "상대의 아이템 하나를 선택해 훔쳐 즉시 사용합니다.",
-        "버너폰": "샷건에 남은 무작위 탄환의 종류를 확인합니다.",
-        "약": "40% 확률로 체력 2 회복, 60% 확률로 체력 1 손실.",
-        "인버터": "현재 탄환과 다음 탄환의 위치를 교환합니다.",
-        "잼머": "상대의 다음 턴을 건너뜁니다 (수갑과 동일)."
-    }
-    for item, description in item_descriptions.items():
-        embed.add_field(name=item, value=description, inline=False)
+    for item in ITEM_CONFIG.items:
+        description = item.description
+        if item.needs_target:
+            description += " 개인전에서는 대상을 선택합니다."
+        embed.add_field(name=item.name, value=description, inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="distribution", description="라운드별 탄환 구성 확률과 아이템 배분 규칙을 확인합니다.")
+async def distribution(interaction: discord.Interaction):
+    embed = discord.Embed(
+        title="벅샷 룰렛 확률표 🎲",
+        description="장전과 아이템 배분은 아래 확률표를 그대로 따릅니다.",
+        color=discord.Color.purple()
+    )
+    for round_num, odds in RULESET.chamber_odds.items():
+        lines = [f"🔴 {live}발 / 🔵 {blank}발: {float(p) * 100:.1f}%" for (live, blank), p in sorted(odds.items())]
+        embed.add_field(
+            name=f"라운드 {round_num}{' 이상' if round_num == 3 else ''} 장전",
+            value="\n".join(lines),
+            inline=True
+        )
+    embed.add_field(
+        name="아이템 배분",
+        value=(
+            f"{len(ALL_ITEMS)}종 중 모든 조합이 같은 확률로 뽑힙니다. "
+            f"라운드 시작 시 2개 또는 4개(각 50%), 재장전 시 2개를 새로 받습니다."
+        ),
+        inline=False
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+GAME_LIST_LIMIT = 20  # /games에 보여줄 최대 게임 수
+
+def game_jump_link(guild_id, channel_id, message_id):
+    return f" | [화면으로 이동](https://discord.com/channels/{guild_id or '@me'}/{channel_id}/{message_id})" if message_id else ""
+
+@tree.command(name="games", description="이 채널에서 진행 중인 게임 목록을 확인합니다.")
+async def games(interaction: discord.Interaction):
+    channel_id = interaction.channel_id
+    rows = get_db().execute(
+        "SELECT game_id, last_message_id, state FROM games WHERE ruleset = 'channel' AND channel_id = ? ORDER BY game_id",
+        (channel_id,)
+    ).fetchall()
+    lines = []
+    listed = set()
+    for key, message_id, state in rows:  # duel:이 ffa:보다 앞에 정렬됨
+        state = json.loads(state)
+        player_ids = [player_id for player_id, _ in state["players"]]
+        scores = state["scores"]
+        if key.startswith("duel:"):
+            lines.append(
+                f"🔫 <@{player_ids[0]}> vs <@{player_ids[1]}> | 라운드 {state['round']} | {scores[0]}:{scores[1]}"
+                f"{game_jump_link(interaction.guild_id, channel_id, message_id)}"
+            )
+        else:
+            lines.append(
+                f"👥 {', '.join(f'<@{player_id}>' for player_id in player_ids)} | 라운드 {state['round']} | "
+                f"최고 {max(scores)}승{game_jump_link(interaction.guild_id, channel_id, message_id)}"
+            )
+        listed.add(key)
+    for key in game_index.channel_keys(channel_id) - listed:  # 아직 SQLite에 없는 게임 (수락 대기 중인 초대)
+        version, state = await game_store.get(key)
+        if state is not None and key.startswith("duel:"):
+            (player1_id, _), (player2_id, _) = state["players"]
+            lines.append(f"✉️ <@{player1_id}> vs <@{player2_id}> | 수락 대기")
+    for lobby_channel_id, players in ffa_lobbies.values():
+        if lobby_channel_id == channel_id:
+            lines.append(f"✋ {players[0].mention}의 개인전 모집 | {len(players)}/{FFA_MAX_PLAYERS}명")
+    if not lines:
+        await interaction.response.send_message("이 채널에서 진행 중인 게임이 없습니다.", ephemeral=True)
+        return
+    embed = discord.Embed(
+        title="진행 중인 게임 🔫",
+        description="\n".join(lines[:GAME_LIST_LIMIT]),
+        color=discord.Color.dark_grey()
+    )
+    if len(lines) > GAME_LIST_LIMIT:
+        embed.set_footer(text=f"외 {len(lines) - GAME_LIST_LIMIT}개")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="reset_game", description="현재 채널의 게임 데이터를 초기화합니다.")
 async def reset_game(interaction: discord.Interaction):
-    conn = sqlite3.connect('buckshot_games.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM games WHERE channel_id = ?", (interaction.channel_id,))
-    conn.commit()
-    conn.close()
-    if interaction.channel_id in games:
-        del games[interaction.channel_id]
+    channel_id = interaction.channel_id
+    conn = get_db()
+    keys = {key for (key,) in conn.execute("SELECT game_id FROM games WHERE ruleset = 'channel' AND channel_id = ?", (channel_id,))}
+    conn.execute("DELETE FROM games WHERE ruleset = 'channel' AND channel_id = ?", (channel_id,))
+    request_commit(conn)
+    keys |= game_index.channel_keys(channel_id)
+    for key in keys:
+        await game_store.delete(key)
+        admission.forget(key)
+        if game_snapshot:
+            game_snapshot.discard(key)
+    game_index.clear_channel(channel_id)
+    for game_id in [game_id for game_id, (lobby_channel_id, _) in ffa_lobbies.items() if lobby_channel_id == channel_id]:
+        del ffa_lobbies[game_id]
+        admission.forget(ffa_key(game_id))
     await interaction.response.send_message("게임 데이터가 초기화되었습니다!", ephemeral=True)
 
+async def restore_active_games():
+    """이 프로세스가 맡은 길드의 진행 중인 게임을 SQLite에서 저장소로 다시 올림 (샤드 프로세스 재시작 시)
+
+    봇 캐시에는 맡은 샤드의 길드 채널만 있으므로 get_channel로 찾히는 채널의 게임만 올린다.
+    """
+    rows = get_db().execute("SELECT game_id, channel_id FROM games WHERE ruleset = 'channel'").fetchall()
+    restored = 0
+    for key, channel_id in rows:
+        channel = client.get_channel(channel_id)
+        if channel is None or not owns_guild(getattr(getattr(channel, "guild", None), "id", None)):
+            continue
+        game_cls = BuckshotGame if key.startswith("duel:") else FreeForAllGame
+        try:
+            game, version = await load_live_game(game_cls, key)
+        except Exception as e:
+            logging.error(f"게임 복원 실패: 채널 {channel_id}, 게임 {key}: {e}")
+            continue
+        if game:
+            # 초대 화면은 재시작으로 사라지므로 올린 게임은 모두 진행 중으로 셈
+            player_ids = [game.player1.id, game.player2.id] if isinstance(game, BuckshotGame) else [player.id for player in game.players]
+            admission.track(key, "active", getattr(getattr(channel, "guild", None), "id", None), player_ids)
+            restored += 1
+    return restored
+
+# DB 정리 단계: 채널 룰셋의 게임은 끝나기 전에 버려져도 행이 남으므로, 오래 아무도 누르지 않은 게임을 조금씩 지움
+# (빈 페이지와 WAL은 buckshot_core.DatabaseMaintenance가 돌려줌)
+GAME_ABANDON_AFTER = 3 * 86400.0  # 마지막 저장 후 이만큼 지난 게임은 버려진 것으로 보고 지움
+
+def abandoned_step(maintenance, conn, cutoff):
+    """cutoff 전에 마지막으로 저장된 게임을 지우고 (저장소 키, 채널 ID, 메시지 ID) 목록을 반환 (None: 잠금 실패)"""
+    with maintenance.write_lock(conn) as locked:
+        if locked is None:
+            return None
+        rows = conn.execute(
+            "SELECT game_id, channel_id, last_message_id FROM games WHERE ruleset = 'channel' AND updated_at < ? LIMIT ?",
+            (cutoff, MAINTENANCE_BATCH)
+        ).fetchall()
+        conn.executemany("DELETE FROM games WHERE game_id = ?", [(row[0],) for row in rows])
+        return rows
+
+async def forget_game(key, channel_id, message_id):
+    """지운 게임을 저장소, 스냅샷, 색인에서도 뺌 (그 사이에 진행됐으면 저장소 CAS가 실패하고 게임이 이어짐)"""
+    version, state = await game_store.get(key)
+    if state is not None and state.get("last_message_id") == message_id:
+        if await game_store.compare_and_set(key, version, None):
+            admission.forget(key)
+    elif state is None:
+        admission.forget(key)
+    if game_snapshot:
+        game_snapshot.discard(key)
+    game_index.remove(key, channel_id, message_id)
+
+async def sweep_channel_games(maintenance, conn):
+    """버려진 채널 룰셋 게임을 MAINTENANCE_BATCH행씩 지우고 지운 수를 반환"""
+    removed = 0
+    cutoff = time.time() - GAME_ABANDON_AFTER
+    while removed < MAINTENANCE_MAX_ROWS:
+        rows = await asyncio.to_thread(abandoned_step, maintenance, conn, cutoff)
+        if not rows:
+            break
+        try:
+            for key, channel_id, message_id in rows:
+                await forget_game(key, channel_id, message_id)
+        except StoreError as e:
+            logging.error(f"DB 정리 중 저장소 오류: {e}")
+        removed += len(rows)
+        await asyncio.sleep(maintenance.pause)
+    return {"channel_games": removed}
+
+maintenance.sweeps.append(sweep_channel_games)
+
+# 기록 재생: 기록된 세션을 이 룰셋의 핸들러에 흘려 넣음 (디스코드 입출력은 buckshot_core의 Replay* 객체가 대신 받음)
+async def replay_session(session, speed, started, stats):
+    for line in session.events:
+        if speed:
+            delay = started + line["t"] / 1000 / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        try:
+            if line.get("start"):
+                interaction = ReplayInteraction(session, session.user(0))
+                interaction.extras["replay_seed"] = line["seed"]
+                if line["start"] == "ffa":
+                    await ffa.callback(interaction)
+                else:
+                    await buckshot.callback(interaction, session.user(1))
+            else:
+                view, item = session.find_component(line["a"])
+                if item is None:  # 게임이 기록과 다르게 흘러 해당 화면이 없음
+                    stats["missing"] += 1
+                    continue
+                data = {"custom_id": getattr(item, "custom_id", None)}
+                if "v" in line:
+                    data["values"] = line["v"]
+                interaction = ReplayInteraction(session, session.user(line["u"]), data)
+                if line["a"] in GAME_ACTIONS:  # 게임 버튼은 화면 콜백 없이 on_interaction이 처리
+                    await on_interaction(interaction)
+                elif await view.interaction_check(interaction):
+                    await item.callback(interaction)
+            stats["events"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            logging.error(f"재생 오류 (세션 {line['s']}, {line.get('a', 'start')}): {e!r}")
+
+async def replay_recording(path, speed=REPLAY_SPEED):
+    """기록된 세션을 동시에 재생하고 결과를 반환"""
+    sessions = [ReplaySession(lines, component_action) for lines in load_recording(path)]
+    if not speed:  # 쉬지 않고 보내면 연타 제한에 걸리므로 끔
+        user_limiter.burst = game_limiter.burst = math.inf
+    stats = {"events": 0, "missing": 0, "errors": 0}
+    for stage_stat in stage_stats.values():
+        stage_stat.update(count=0, misses=0, max=0.0)
+    started = time.monotonic()
+    await asyncio.gather(*(replay_session(session, speed, started, stats) for session in sessions))
+    elapsed = time.monotonic() - started
+    return {
+        "세션": f"{len(sessions):,}개",
+        "입력": f"{stats['events']:,}개 ({stats['events'] / max(elapsed, 1e-9):,.0f}/s), 화면 없음 {stats['missing']:,}, 오류 {stats['errors']:,}",
+        "단계별 최대 (예산 초과)": ", ".join(
+            f"{stage} {stage_stat['max'] * 1000:.1f}ms ({stage_stat['misses']})" for stage, stage_stat in stage_stats.items()
+        ),
+        "소요 시간": f"{elapsed:.2f}s",
+    }
+
 @client.event
 async def on_ready():
-    print(f'Logged in as {client.user}')
-    await tree.sync()
-    print("Slash commands synced!")
+    print(f'Logged in as {client.user} (shards {SHARD_IDS or "all"} of {client.shard_count})')
+    if not HOSTED:  # bot.py에 올라가면 두 룰셋의 종료 처리를 bot.py가 한 번에 설치
+        install_shutdown_handler(graceful_shutdown)
+    schedule_maintenance()
+    if game_snapshot is None:  # 스냅샷이 있으면 게임은 첫 상호작용 때 스냅샷에서 올림
+        restored = await restore_active_games()
+        if restored:
+            logging.info(f"진행 중인 게임 {restored}개 복원")
+    if owns_guild(None) and not HOSTED:  # 명령어 동기화는 0번 샤드를 맡은 프로세스만 수행 (bot.py에 올라가면 bot.py가 수행)
+        try:
+            count = await sync_command_tree(tree)
+            logging.info("슬래시 명령 변경 없음, 동기화 생략" if count is None else f"슬래시 명령 {count}개 동기화")
+        except Exception as e:
+            logging.error(f"슬래시 명령 동기화 실패: {e}")
 
-client.run('')
+# 단독 실행할 때만 (bot.py에 올라가거나 AI 풀 워커가 __mp_main__으로 다시 import할 때는 실행하지 않음)
+if __name__ == "__main__":
+    if REPLAY_PATH:
+        run_replay(replay_recording, REPLAY_PATH)
+    elif os.environ.get("BUCKSHOT_STANDIN_PORT"):
+        # 테스트용: Redis 대신 스탠드인 서버만 띄움 (BUCKSHOT_STORE_URL=redis://127.0.0.1:<포트> 로 봇 여러 개를 붙임)
+        asyncio.run(StandInRedisServer().serve_forever(port=int(os.environ["BUCKSHOT_STANDIN_PORT"])))
+    elif SHARD_PROCESSES > 1 and SHARD_IDS is None:
+        asyncio.run(run_shard_supervisor(SHARD_COUNT or SHARD_PROCESSES, SHARD_PROCESSES, os.path.abspath(__file__)))
+    else:
+        client.run('')
@@ -0,0 +1,155 @@
+"""벅샷 룰렛 통합 봇
+
+11.py(클래식 룰셋: 3라운드, 상금, Double or Nothing)와 22.py(채널 룰셋: 무작위 체력, 3판 2선승, 개인전)를
+한 프로세스, 한 게이트웨이 연결로 실행한다. 룰셋은 /buckshot의 ruleset 옵션으로 게임마다 고른다.
+
+두 룰셋 파일은 공용 클라이언트 위에 모듈로 올라가고, 슬래시 명령 등록과 동기화, 컴포넌트 상호작용 라우팅,
+종료 처리, 샤드 감독은 여기서 한 번만 한다 (DB, 샤드 설정 등 두 룰셋이 함께 쓰는 부분은 buckshot_core).
+각 파일은 지금처럼 단독으로도 실행할 수 있다.
+"""
+import discord
+from discord import app_commands
+import asyncio
+import importlib.util
+import os
+import sys
+from buckshot_core import (
+    SHARD_COUNT, SHARD_IDS, SHARD_PROCESSES, owns_guild, install_shutdown_handler, run_shard_supervisor, sync_command_tree,
+)
+
+intents = discord.Intents.default()
+intents.message_content = True
+client = discord.AutoShardedClient(intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+tree = app_commands.CommandTree(client)
+
+class RulesetCommands:
+    """룰셋 파일의 @tree.command / tree.add_command를 받아 두는 모음
+
+    실제 명령 트리에는 bot.py가 이름이 겹치는 명령(SHARED_COMMANDS)을 합친 뒤 등록한다.
+    """
+    def __init__(self):
+        self.commands = {}
+
+    def command(self, **kwargs):
+        def decorator(func):
+            command = app_commands.command(**kwargs)(func)
+            self.commands[command.name] = command
+            return command
+        return decorator
+
+    def add_command(self, command):
+        self.commands[command.name] = command
+
+def load_ruleset(module_name, filename):
+    """룰셋 파일을 공용 클라이언트와 명령 모음을 넣은 채로 모듈로 올림"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    module.client = client
+    module.tree = RulesetCommands()
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+RULESETS = {
+    "classic": load_ruleset("buckshot_classic", "11.py"),
+    "channel": load_ruleset("buckshot_channel", "22.py"),
+}
+RULESET_CHOICES = [
+    app_commands.Choice(name="클래식: 3라운드, 상금, Double or Nothing, 하우스 AI", value="classic"),
+    app_commands.Choice(name="채널: 무작위 체력, 3판 2선승", value="channel"),
+]
+SHARED_COMMANDS = ("buckshot", "items", "distribution")  # 두 룰셋에 모두 있어 ruleset 옵션으로 합친 명령
+
+# 컴포넌트 custom_id 접두사 -> 처리할 룰셋 (클래식: bs:<게임 ID>:<동작>, 채널: <동작>:<게임 ID>와 ffa_*)
+INTERACTION_ROUTES = {
+    "bs": RULESETS["classic"],
+    "shoot_self": RULESETS["channel"],
+    "shoot_opponent": RULESETS["channel"],
+    "use_item": RULESETS["channel"],
+    "ffa": RULESETS["channel"],
+}
+
+def route_interaction(custom_id):
+    """custom_id의 첫 구간(':' 또는 'ffa_' 앞)으로 룰셋을 찾음"""
+    prefix = custom_id.split(":", 1)[0]
+    if prefix.startswith("ffa_"):
+        prefix = "ffa"
+    return INTERACTION_ROUTES.get(prefix)
+
+for ruleset in RULESETS.values():
+    for name, command in ruleset.tree.commands.items():
+        if name not in SHARED_COMMANDS:
+            tree.add_command(command)
+
+@tree.command(name="buckshot", description="다른 유저와 벅샷 룰렛 대결을 시작합니다!")
+@app_commands.describe(
+    opponent="대결할 상대를 선택하세요 (클래식 룰셋에서 이 봇을 선택하면 하우스 AI와 대결)",
+    ruleset="룰셋: classic 또는 channel",
+    mode="(클래식) 게임 모드: Normal 또는 Double or Nothing",
+    difficulty="(클래식) 하우스 AI 난이도: easy, normal, hard"
+)
+@app_commands.choices(ruleset=RULESET_CHOICES)
+async def buckshot(interaction: discord.Interaction, opponent: discord.Member, ruleset: str = "classic", mode: str = "Normal", difficulty: str = "normal"):
+    command = RULESETS[ruleset].tree.commands["buckshot"]
+    if ruleset == "classic":
+        await command.callback(interaction, opponent, mode, difficulty)
+    else:
+        await command.callback(interaction, opponent)
+
+@tree.command(name="items", description="벅샷 룰렛 게임의 아이템 설명을 확인합니다.")
+@app_commands.describe(ruleset="룰셋: classic 또는 channel")
+@app_commands.choices(ruleset=RULESET_CHOICES)
+async def items(interaction: discord.Interaction, ruleset: str = "classic"):
+    await RULESETS[ruleset].tree.commands["items"].callback(interaction)
+
+@tree.command(name="distribution", description="라운드별 탄환 구성 확률과 아이템 배분 규칙을 확인합니다.")
+@app_commands.describe(ruleset="룰셋: classic 또는 channel")
+@app_commands.choices(ruleset=RULESET_CHOICES)
+async def distribution(interaction: discord.Interaction, ruleset: str = "classic"):
+    await RULESETS[ruleset].tree.commands["distribution"].callback(interaction)
+
+# 룰셋 파일의 @client.event 핸들러는 공용 클라이언트에 먼저 붙었다가 아래 핸들러로 바뀜 (각 모듈에서 직접 호출)
+@client.event
+async def on_interaction(interaction: discord.Interaction):
+    custom_id = (interaction.data or {}).get("custom_id")
+    if not custom_id:
+        return
+    ruleset = route_interaction(custom_id)
+    if ruleset is not None:
+        await ruleset.on_interaction(interaction)
+
+shutting_down = False
+
+async def graceful_shutdown():
+    """SIGTERM: 두 룰셋의 진행 중인 게임을 모두 스냅샷으로 남긴 뒤 연결을 한 번만 닫음"""
+    global shutting_down
+    if shutting_down:
+        return
+    shutting_down = True
+    for ruleset in RULESETS.values():
+        await ruleset.prepare_shutdown()
+    await client.close()
+
+synced = False
+
+@client.event
+async def on_ready():
+    global synced
+    install_shutdown_handler(graceful_shutdown)
+    for ruleset in RULESETS.values():
+        await ruleset.on_ready()
+    if not synced and owns_guild(None):  # 명령어 동기화는 0번 샤드를 맡은 프로세스만 수행
+        try:
+            count = await sync_command_tree(tree)  # 명령 정의가 바뀌었을 때만 동기화
+            print("Slash commands unchanged, sync skipped" if count is None else f"Synced {count} commands for rulesets {', '.join(RULESETS)}")
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
+            return  # 다음 on_ready(재연결)에서 다시 시도
+    synced = True
+
+if __name__ == "__main__":
+    if SHARD_PROCESSES > 1 and SHARD_IDS is None:
+        asyncio.run(run_shard_supervisor(SHARD_COUNT or SHARD_PROCESSES, SHARD_PROCESSES, os.path.abspath(__file__)))
+    else:
+        client.run('')
@@ -0,0 +1,1845 @@
+"""벅샷 룰렛 공용 모듈
+
+클래식 룰셋(11.py)과 채널 룰셋(22.py)이 함께 쓰는 샤드 설정, SQLite 저장, 아이템, 하우스 AI 탐색, 게임 화면, 연타 제한, 단계별 시간 측정,
+종료 스냅샷, 상호작용 기록과 재생, DB 정리 작업, 샤드 감독, 명령어 동기화를 모아 둔다.
+룰셋마다 다른 규칙(탄 구성 확률, 아이템 구성, 화면 형식)은 Ruleset 설정으로 넘긴다.
+import만으로는 디스코드에 연결하거나 DB 파일을 만들지 않는다.
+"""
+import discord
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from itertools import combinations
+from math import lcm
+from uuid import uuid4
+
+# 샤드 설정
+# BUCKSHOT_SHARD_COUNT: 전체 샤드 수 (비우면 디스코드 권장값)
+# BUCKSHOT_SHARD_IDS: 이 프로세스가 맡을 샤드 번호 (예: "0,1", 비우면 전부)
+# BUCKSHOT_SHARD_PROCESSES: 2 이상이면 감독 프로세스로 실행되어 샤드를 그만큼의 프로세스로 나눠 띄움
+SHARD_COUNT = int(os.environ["BUCKSHOT_SHARD_COUNT"]) if os.environ.get("BUCKSHOT_SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.environ["BUCKSHOT_SHARD_IDS"].split(",")] if os.environ.get("BUCKSHOT_SHARD_IDS") else None
+SHARD_PROCESSES = int(os.environ.get("BUCKSHOT_SHARD_PROCESSES", "1"))
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise ValueError("BUCKSHOT_SHARD_IDS를 쓰려면 BUCKSHOT_SHARD_COUNT도 지정해야 합니다.")
+
+def shard_for_guild(guild_id, shard_count):
+    """길드를 맡는 샤드 번호 (디스코드 규칙: (guild_id >> 22) % shard_count, DM은 0번 샤드)"""
+    if guild_id is None:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+def owns_guild(guild_id):
+    """이 프로세스의 샤드가 맡는 길드인지 (게임은 채널이 속한 길드의 샤드에서만 진행)"""
+    if SHARD_IDS is None:
+        return True
+    return shard_for_guild(guild_id, SHARD_COUNT) in SHARD_IDS
+
+def shard_path(name, extension):
+    """샤드 그룹마다 따로 쓰는 파일 이름 (예: name-0_1.bin, 샤드를 나누지 않으면 name.bin)"""
+    return f"{name}{'-' + '_'.join(map(str, SHARD_IDS)) if SHARD_IDS else ''}.{extension}"
+
+# SQLite 저장: 두 룰셋이 같은 DB 파일을 쓰고, games 테이블의 ruleset 컬럼으로 룰셋을 구분
+# 클래식 게임은 컬럼과 game_states 행으로, 채널 룰셋 게임은 저장소 키(duel:<ID>, ffa:<ID>)를 game_id로 해서 state(JSON)로 저장
+DB_PATH = "buckshot.db"
+HOUSE_ACCOUNT = 0  # 상금을 내주는 하우스 계정 (디스코드 ID는 0이 될 수 없음)
+
+# 행동 하나가 하는 I/O 횟수 (/bench action에서 읽음)
+io_stats = {"db_writes": 0, "db_commits": 0}
+
+# 모든 게임이 공유하는 SQLite 연결
+db_conn = None
+db_ready = False  # 스키마 생성과 마이그레이션은 import가 아니라 처음 DB를 쓸 때 (ensure_db)
+db_migrations = []  # 처음 DB를 쓸 때 init_db 다음에 실행하는 룰셋별 이전 데이터 마이그레이션
+# 쓰기를 모아서 커밋하는 간격(초)과 커밋이 예약된 연결
+COMMIT_INTERVAL = 0.05
+pending_commits = set()
+commit_observers = []  # 모아 둔 커밋이 끝날 때마다 걸린 시간(초)을 받는 함수 (클래식 룰셋의 과부하 판단)
+
+def get_db():
+    """프로세스 전체에서 공유하는 SQLite 연결"""
+    global db_conn
+    if db_conn is None:
+        ensure_db()
+        db_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        db_conn.execute("PRAGMA journal_mode=WAL")
+        db_conn.execute("PRAGMA synchronous=NORMAL")  # WAL에서는 프로세스가 죽어도 커밋된 트랜잭션이 남음 (커밋마다 fsync하지 않음)
+    return db_conn
+
+def request_commit(conn):
+    """커밋을 COMMIT_INTERVAL 동안 모아서 한 번에 수행 (이벤트 루프 밖에서는 즉시 커밋)"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        conn.commit()
+        io_stats["db_commits"] += 1
+        return
+    if conn in pending_commits:
+        return
+    pending_commits.add(conn)
+
+    def flush():
+        pending_commits.discard(conn)
+        started = time.perf_counter()
+        conn.commit()
+        io_stats["db_commits"] += 1
+        for observer in commit_observers:
+            observer(time.perf_counter() - started)
+
+    loop.call_later(COMMIT_INTERVAL, flush)
+
+def flush_commits():
+    """COMMIT_INTERVAL로 모아 둔 커밋을 바로 수행 (종료 처리용)"""
+    for conn in list(pending_commits):
+        pending_commits.discard(conn)
+        conn.commit()
+        io_stats["db_commits"] += 1
+
+@contextmanager
+def write_transaction(conn):
+    """읽고-고쳐-쓰는 갱신을 쓰기 잠금(BEGIN IMMEDIATE)을 먼저 잡은 한 트랜잭션으로 수행
+
+    샤드 프로세스 여럿이 같은 DB에 쓰므로 상금, 레이팅처럼 기존 값을 읽어 더하는 갱신은
+    읽기 전에 잠금을 잡아야 다른 프로세스의 갱신을 덮어쓰지 않는다. 모아 둔 커밋은 먼저 내보낸다.
+    """
+    pending_commits.discard(conn)
+    if conn.in_transaction:
+        conn.commit()
+        io_stats["db_commits"] += 1
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    io_stats["db_commits"] += 1
+
+# 이전 스키마의 games 테이블에 없을 수 있는 컬럼 (init_db가 추가)
+GAME_COLUMNS = (
+    ("guild_id", "INTEGER"),
+    ("ruleset", "TEXT NOT NULL DEFAULT 'classic'"),
+    ("channel_id", "INTEGER"),
+    ("last_message_id", "INTEGER"),
+    ("state", "TEXT"),
+    ("updated_at", "REAL"),
+)
+
+# SQLite 데이터베이스 초기화 (reset=True면 모든 테이블을 지우고 새로 만듦)
+def init_db(path=None, reset=False):
+    try:
+        with sqlite3.connect(path or DB_PATH) as conn:
+            c = conn.cursor()
+            if c.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+                c.execute("PRAGMA auto_vacuum = INCREMENTAL")  # 빈 DB에서만 바꿀 수 있음: 정리 작업이 빈 페이지를 조금씩 돌려줌
+            if reset:
+                for table in ("games", "game_states", "player_money", "tournaments", "tournament_players",
+                              "tournament_matches", "player_ratings", "match_history", "game_archive", "export_watermarks",
+                              "ledger_entries"):
+                    c.execute(f"DROP TABLE IF EXISTS {table}")
+            c.execute('''CREATE TABLE IF NOT EXISTS games (
+                game_id TEXT PRIMARY KEY,
+                ruleset TEXT NOT NULL DEFAULT 'classic',
+                player1_id INTEGER,
+                player2_id INTEGER,
+                round INTEGER,
+                scores TEXT,
+                status TEXT,
+                prize INTEGER,
+                double_or_nothing BOOLEAN,
+                seed INTEGER,
+                guild_id INTEGER,
+                channel_id INTEGER,
+                last_message_id INTEGER,
+                state TEXT,
+                updated_at REAL
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS game_states (
+                game_id TEXT,
+                turn INTEGER,
+                current_turn_id INTEGER,
+                hp TEXT,
+                chamber TEXT,
+                knife_active TEXT,
+                handcuff_active TEXT,
+                jammer_active TEXT,
+                item_usage TEXT,
+                rng_state TEXT,
+                items TEXT,
+                FOREIGN KEY (game_id) REFERENCES games (game_id)
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS player_money (
+                player_id INTEGER PRIMARY KEY,
+                total_money INTEGER,
+                item_usage_history TEXT
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS tournaments (
+                tournament_id TEXT PRIMARY KEY,
+                guild_id INTEGER,
+                channel_id INTEGER,
+                creator_id INTEGER,
+                name TEXT,
+                format TEXT,
+                status TEXT,
+                round INTEGER,
+                max_players INTEGER,
+                champion_id INTEGER
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS tournament_players (
+                tournament_id TEXT,
+                player_id INTEGER,
+                seed INTEGER,
+                losses INTEGER,
+                PRIMARY KEY (tournament_id, player_id)
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS tournament_matches (
+                match_id TEXT PRIMARY KEY,
+                tournament_id TEXT,
+                round INTEGER,
+                bracket TEXT,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                winner_id INTEGER,
+                status TEXT
+            )''')
+            c.execute("CREATE INDEX IF NOT EXISTS idx_tournament_matches ON tournament_matches (tournament_id, round)")
+            c.execute('''CREATE TABLE IF NOT EXISTS player_ratings (
+                player_id INTEGER PRIMARY KEY,
+                rating REAL,
+                rd REAL,
+                games INTEGER,
+                last_played REAL
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS match_history (
+                match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id TEXT,
+                played_at REAL,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                winner_id INTEGER
+            )''')
+            c.execute("CREATE INDEX IF NOT EXISTS idx_match_history_played_at ON match_history (played_at)")
+            # 분석용: 끝난 게임 한 판이 한 행 (플레이어별 아이템 사용과 라운드별 탄 구성은 JSON)
+            c.execute('''CREATE TABLE IF NOT EXISTS game_archive (
+                archive_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id TEXT,
+                finished_at REAL,
+                duration REAL,
+                end_reason TEXT,
+                mode TEXT,
+                seed INTEGER,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                winner_id INTEGER,
+                rounds INTEGER,
+                score1 INTEGER,
+                score2 INTEGER,
+                prize INTEGER,
+                items_used1 TEXT,
+                items_used2 TEXT,
+                chambers TEXT
+            )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS export_watermarks (
+                name TEXT PRIMARY KEY,
+                last_archive_id INTEGER,
+                exported_at REAL
+            )''')
+            # 상금 원장: 거래(txn_id)마다 계정별 입출금 행, 행은 추가만 함
+            c.execute('''CREATE TABLE IF NOT EXISTS ledger_entries (
+                entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                txn_id TEXT,
+                account_id INTEGER,
+                amount INTEGER,
+                game_id TEXT,
+                reason TEXT,
+                created_at REAL
+            )''')
+            c.execute("CREATE INDEX IF NOT EXISTS idx_ledger_entries_account ON ledger_entries (account_id)")
+            # 원장 도입 전 잔액은 하우스에서 받은 기초 잔액 거래 하나로 옮김
+            if c.execute("SELECT 1 FROM ledger_entries LIMIT 1").fetchone() is None:
+                balances = c.execute(
+                    "SELECT player_id, total_money FROM player_money WHERE player_id != ? AND total_money != 0", (HOUSE_ACCOUNT,)
+                ).fetchall()
+                if balances:
+                    txn_id, now = uuid4().hex, time.time()
+                    house_total = -sum(total_money for _, total_money in balances)
+                    c.executemany(
+                        "INSERT INTO ledger_entries (txn_id, account_id, amount, game_id, reason, created_at) VALUES (?, ?, ?, NULL, 'opening_balance', ?)",
+                        [(txn_id, player_id, total_money, now) for player_id, total_money in balances] + [(txn_id, HOUSE_ACCOUNT, house_total, now)]
+                    )
+                    c.execute("INSERT OR REPLACE INTO player_money (player_id, total_money, item_usage_history) VALUES (?, ?, '{}')",
+                              (HOUSE_ACCOUNT, house_total))
+            # 이전 스키마 마이그레이션: 길드, 룰셋, 채널 룰셋 게임의 컬럼 추가 (기존 행은 클래식 게임)
+            columns = {row[1] for row in c.execute("PRAGMA table_info(games)")}
+            for column, definition in GAME_COLUMNS:
+                if column not in columns:
+                    c.execute(f"ALTER TABLE games ADD COLUMN {column} {definition}")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_games_status ON games (ruleset, status)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_games_updated ON games (ruleset, updated_at)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_games_channel ON games (channel_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_games_message ON games (last_message_id)")
+            # 이전 스키마 마이그레이션: 아이템을 user.json 대신 상태 행에 저장
+            if "items" not in {row[1] for row in c.execute("PRAGMA table_info(game_states)")}:
+                c.execute("ALTER TABLE game_states ADD COLUMN items TEXT")
+            # 이전 스키마 마이그레이션: game_states에 키가 없어 INSERT OR REPLACE가 저장할 때마다 행을 추가했으므로
+            # 게임마다 마지막 행만 남기고 game_id에 유일 인덱스를 걸어 이후로는 한 행을 덮어씀
+            if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_game_states_game'").fetchone() is None:
+                c.execute("DELETE FROM game_states WHERE rowid NOT IN (SELECT MAX(rowid) FROM game_states GROUP BY game_id)")
+                c.execute("CREATE UNIQUE INDEX idx_game_states_game ON game_states (game_id)")
+            conn.commit()
+            return True, "데이터베이스가 성공적으로 초기화되었습니다!"
+    except sqlite3.Error as e:
+        return False, f"데이터베이스 초기화 중 오류 발생: {e}"
+
+def register_migration(migration):
+    """처음 DB를 쓸 때 실행할 이전 데이터 마이그레이션을 등록 (이미 DB를 준비했으면 바로 실행)"""
+    db_migrations.append(migration)
+    if db_ready:
+        migration()
+
+def ensure_db():
+    """처음 DB를 쓸 때 스키마 생성과 마이그레이션을 한 번 수행"""
+    global db_ready
+    if not db_ready:
+        success, message = init_db()
+        if not success:
+            logging.error(message)
+        else:
+            for migration in db_migrations:
+                migration()
+        db_ready = True
+
+def connect_db():
+    """명령 처리용 단기 연결"""
+    ensure_db()
+    return sqlite3.connect(DB_PATH)
+
+class GameRNG:
+    """게임별 시드 기반 난수 스트림
+
+    이벤트 종류(tag)마다 카운터를 두고 (시드, tag, 순번)으로 독립된 하위 스트림을 만든다.
+    저장된 시드와 카운터만 있으면 같은 게임을 그대로 다시 재현할 수 있고,
+    다른 프로세스와 난수 상태를 공유할 필요도 없다.
+    하위 스트림은 (시드, tag, 순번)을 정수 하나로 묶어 시드로 쓰므로 문자열 시드의 SHA-512 해시를 거치지 않고,
+    pregenerate로 미리 만든 스트림은 처음 상태로 되돌려 두었다가 그 순번의 stream()에서 그대로 다시 쓴다.
+    """
+    __slots__ = ("seed", "counters", "cache")
+
+    def __init__(self, seed=None, counters=None):
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 63)
+        self.counters = dict(counters or {})
+        self.cache = {}  # (tag, 순번) -> 아직 쓰지 않은 하위 스트림 (pregenerate가 채움)
+
+    def _build(self, tag, index):
+        key = (self.seed & 0xFFFFFFFFFFFFFFFF) << 96 | zlib.crc32(tag.encode()) << 64 | index
+        return random.Random(key)
+
+    def stream(self, tag, index=None):
+        """tag의 다음(또는 지정한 index 번째) 하위 스트림을 반환"""
+        if index is None:
+            index = self.counters.get(tag, 0)
+            self.counters[tag] = index + 1
+        rng = self.cache.pop((tag, index), None)
+        return rng if rng is not None else self._build(tag, index)
+
+    def pregenerate(self, tag, draw, n):
+        """앞으로 n번의 draw 결과를 미리 생성 (카운터는 소비하지 않음)
+
+        뽑는 데 쓴 하위 스트림은 처음 상태로 되돌려 캐시에 두고, 나중에 같은 순번의 stream()이 그대로 꺼내 쓴다.
+        """
+        start = self.counters.get(tag, 0)
+        results = []
+        for index in range(start, start + n):
+            rng = self.cache.get((tag, index)) or self._build(tag, index)
+            state = rng.getstate()
+            results.append(draw(rng))
+            rng.setstate(state)
+            self.cache[(tag, index)] = rng
+        return results
+
+    def get_state(self):
+        return json.dumps({"seed": self.seed, "counters": self.counters})
+
+    @classmethod
+    def from_state(cls, state):
+        data = json.loads(state)
+        return cls(data["seed"], data["counters"])
+
+class StoredPlayer:
+    """저장된 상태에서 복원한 플레이어 (화면에 필요한 ID와 이름만 가짐)"""
+    __slots__ = ("id", "display_name")
+
+    def __init__(self, player_id, display_name):
+        self.id = player_id
+        self.display_name = display_name
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+# 탄 구성 추첨 테이블
+def build_draw_table(odds):
+    """확률표를 균등 인덱스 추첨용 테이블로 펼침 (인덱스 하나로 구성이 결정됨)"""
+    denominator = lcm(*(p.denominator for p in odds.values()))
+    table = []
+    for composition, p in odds.items():
+        table.extend([composition] * int(p * denominator))
+    return table
+
+def build_arrangements(live, blank):
+    """구성별로 가능한 모든 탄환 배열 (각 배열이 셔플과 같은 확률로 뽑힘)"""
+    total_bullets = live + blank
+    return [
+        tuple("live" if idx in positions else "blank" for idx in range(total_bullets))
+        for positions in combinations(range(total_bullets), live)
+    ]
+
+class Ruleset:
+    """룰셋 하나의 설정: 라운드별 탄 구성 확률, 아이템 구성, 게임 화면 형식
+
+    chamber_odds(round_num)는 {(실탄, 공포탄): 확률}을 돌려주며, 3라운드부터는 3라운드 표를 계속 쓴다.
+    """
+    def __init__(self, name, chamber_odds, items, max_rounds=None, show_mode=False, thumbnail=None, show_updated_at=False):
+        self.name = name
+        self.items = items  # ItemConfig
+        self.max_rounds = max_rounds  # 화면 제목에 '라운드 n/max_rounds'로 표시 (None이면 라운드 번호만)
+        self.show_mode = show_mode  # 화면 제목에 게임 모드 표시 (game.get_mode())
+        self.thumbnail = thumbnail
+        self.show_updated_at = show_updated_at  # 화면 아래에 마지막 업데이트 시각 표시
+        self.chamber_odds = {round_num: chamber_odds(round_num) for round_num in (1, 2, 3)}
+        self.chamber_draw_table = {round_num: build_draw_table(odds) for round_num, odds in self.chamber_odds.items()}
+        self.chamber_arrangements = {
+            composition: build_arrangements(*composition) for odds in self.chamber_odds.values() for composition in odds
+        }
+
+    def draw_chamber(self, rng, round_num):
+        """테이블에서 인덱스를 뽑아 (탄창, 실탄 수, 공포탄 수)로 디코딩"""
+        table = self.chamber_draw_table[min(round_num, 3)]
+        live, blank = table[rng.randrange(len(table))]
+        arrangements = self.chamber_arrangements[(live, blank)]
+        return list(arrangements[rng.randrange(len(arrangements))]), live, blank
+
+def render_game_embed(game, ruleset, events=(), results=(), viewer_id=None, show_chamber=False):
+    """1:1 게임 화면 (두 룰셋 공용)
+
+    events는 체력 위에, results(라운드 종료, 게임 종료)는 스코어 아래에 붙는 (이름, 값) 필드 목록이다.
+    체력 칸은 game.get_hp_bar(플레이어 ID, 보는 사람 ID)가 정한다.
+    """
+    player1, player2 = game.player1, game.player2
+    current_player = player1 if game.current_turn == player1.id else player2
+    round_label = f"{min(game.round, ruleset.max_rounds)}/{ruleset.max_rounds}" if ruleset.max_rounds else game.round
+    title = f"벅샷 룰렛 🔫 | 라운드 {round_label} | {current_player.display_name}의 턴"
+    if ruleset.show_mode:
+        title += f" | 모드: {game.get_mode()}"
+    embed = discord.Embed(
+        title=title,
+        description=f"{player1.mention} vs {player2.mention}",
+        color=discord.Color.red() if game.current_turn == player1.id else discord.Color.blue()
+    )
+    if ruleset.thumbnail:
+        embed.set_thumbnail(url=ruleset.thumbnail)
+    for name, value in events:
+        embed.add_field(name=name, value=value, inline=False)
+    for player in (player1, player2):
+        embed.add_field(name=f"{player.display_name} 체력", value=game.get_hp_bar(player.id, viewer_id), inline=True)
+    if show_chamber:
+        embed.add_field(name="탄환", value=game.get_chamber_info(), inline=True)
+    for player in (player1, player2):
+        embed.add_field(name=f"{player.display_name} 아이템", value=", ".join(game.items[player.id]) or "없음", inline=False)
+    embed.add_field(
+        name="스코어",
+        value=f"{player1.display_name}: {game.scores[player1.id]} | {player2.display_name}: {game.scores[player2.id]}",
+        inline=True
+    )
+    for name, value in results:
+        embed.add_field(name=name, value=value, inline=False)
+    if ruleset.show_updated_at:
+        embed.set_footer(text=f"마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return embed
+
+# 아이템 레지스트리: 두 룰셋이 같은 아이템 클래스를 쓰고, 룰셋마다 어떤 아이템을 어떤 설정으로 쓰는지는 ItemConfig로 정함
+# 효과 대상(user, target)은 게임 종류에 따라 플레이어 ID(1:1) 또는 좌석 번호(개인전)이며,
+# 룰셋과 게임 종류마다 다른 부분은 게임이 구현하는 ItemHooks로 흡수한다.
+NO_SHELLS_MESSAGE = "🔄 탄환이 없습니다!"
+
+def bullet_label(bullet):
+    return '🔴 실탄' if bullet == 'live' else '🔵 공포탄'
+
+class ItemHooks:
+    """아이템 효과가 게임에 요구하는 훅 (기본 구현은 채널 룰셋 1:1 게임 기준)
+
+    게임은 chamber, hp, items, knife_active, rng를 가지고, 필요한 훅만 다시 정의한다.
+    """
+    __slots__ = ()
+    target_word = "상대"
+
+    def player_name(self, user):
+        return self.get_player(user).display_name
+
+    def target_name(self, target):
+        return self.target_word
+
+    def knock_out(self, user):
+        """약으로 체력이 0이 됨. 결과 메시지에 붙일 말을 반환 (None이면 판정을 다음 샷에 맡김)"""
+        return "패배"
+
+    def hp_change(self, user, old_hp):
+        """체력 변화 표시 (체력을 숨기는 룰셋은 빈 문자열)"""
+        return f" HP: {old_hp} → {self.hp[user]}"
+
+    def heal_locked(self, user):
+        """담배로 회복할 수 없는 상태인지"""
+        return False
+
+    def charge_item(self, user, name):
+        """비용이 있는 아이템의 효과가 적용됨"""
+
+    def reload_if_needed(self):
+        """탄창이 바뀐 뒤 재장전 규칙을 적용하고 결과 메시지에 붙일 말을 반환"""
+        return ""
+
+    def bullet_ejected(self, bullet):
+        """맨 앞의 탄이 빠져 공개됨"""
+
+    def bullet_revealed(self, index, user=None):
+        """chamber[index]를 user(None이면 모두)가 알게 됨"""
+
+    def bullet_inverted(self):
+        """맨 앞의 탄이 반전됨"""
+
+class Item:
+    """아이템 하나: 이름, 설명, 비용, 등장 모드, 효과
+
+    클래스 속성이 기본 설정이고, 룰셋 설정에서 키워드 인자로 바꾼다 (예: Cigarette(max_hp=4)).
+    """
+    name = ""
+    icon = ""
+    description = ""
+    cost = 0  # 효과가 적용될 때마다 우승 상금에서 차감
+    modes = None  # 등장하는 게임 모드 (None이면 모든 모드)
+    reveals_chamber = False  # 사용 후 탄환 정보를 화면에 표시
+    ai_searchable = True  # AI 탐색에서 효과를 모델링하는 아이템
+    needs_target = False  # 개인전에서 대상을 골라야 하는 아이템
+
+    def __init__(self, **options):
+        for key, value in options.items():
+            if not hasattr(type(self), key):
+                raise TypeError(f"{type(self).__name__}: 알 수 없는 설정 {key}")
+            setattr(self, key, value)
+
+    @property
+    def label(self):
+        return f"{self.icon} {self.name}" if self.icon else self.name
+
+    def available(self, mode):
+        return self.modes is None or mode in self.modes
+
+    def apply(self, game, user, target):
+        """효과를 적용하고 (결과 메시지, 사용자 생존 여부)를 반환"""
+        raise NotImplementedError
+
+    def charge(self, game, user):
+        if self.cost:
+            game.charge_item(user, self.name)
+
+class Beer(Item):
+    name = "맥주"
+    icon = "🍺"
+    description = "샷건에서 현재 탄환을 배출하고 실탄인지 공포탄인지 확인합니다."
+    reveals_chamber = True
+
+    def apply(self, game, user, target):
+        if not game.chamber:
+            return NO_SHELLS_MESSAGE, True
+        self.charge(game, user)
+        bullet = game.chamber.pop(0)
+        game.bullet_ejected(bullet)
+        return f"{self.label}: {bullet_label(bullet)}을 배출했습니다!{game.reload_if_needed()}", True
+
+class MagnifyingGlass(Item):
+    name = "돋보기"
+    icon = "🔍"
+    description = "다음 탄환의 종류(실탄/공포탄)를 확인합니다."
+
+    def apply(self, game, user, target):
+        if not game.chamber:
+            return NO_SHELLS_MESSAGE, True
+        game.bullet_revealed(0, user)
+        return f"{self.label}: 다음 탄환은 {bullet_label(game.chamber[0])}입니다!", True
+
+class Cigarette(Item):
+    name = "담배"
+    icon = "🚬"
+    max_hp = 6
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        if "description" not in options:
+            self.description = f"체력을 1 회복합니다. 최대 체력은 {self.max_hp}입니다."
+
+    def apply(self, game, user, target):
+        if game.heal_locked(user):
+            return f"{self.label}: 체력 2 이하에서는 회복 불가!", True
+        if game.hp[user] >= self.max_hp:
+            return f"{self.label}: 이미 최대 체력입니다!", True
+        self.charge(game, user)
+        old_hp = game.hp[user]
+        game.hp[user] += 1
+        return f"{self.label}: 체력 1 회복!{game.hp_change(user, old_hp)}", True
+
+class Knife(Item):
+    name = "칼"
+    icon = "🪚"
+    description = "다음 샷의 대미지를 2배로 만듭니다."
+
+    def apply(self, game, user, target):
+        game.knife_active[user] = True
+        return f"{self.label}: 다음 샷 대미지 2배!", True
+
+class Handcuffs(Item):
+    """클래식 수갑: 사용자가 다음에 상대를 쏜 뒤에도 턴을 유지 (game.handcuff_active)"""
+    name = "수갑"
+    icon = "⛓"
+    description = "다음 상대 샷 후에도 턴을 유지합니다."
+
+    def apply(self, game, user, target):
+        game.handcuff_active[user] = True
+        return f"{self.label}: 다음 상대 샷 후에도 턴을 유지합니다!", True
+
+class SkipTurn(Item):
+    """대상의 다음 턴을 건너뜀 (game.skip_next_turn, 중첩 가능). 채널 룰셋의 수갑과 잼머"""
+    icon = "⛓"
+    needs_target = True
+
+    def apply(self, game, user, target):
+        game.skip_next_turn(target)
+        return f"{self.label}: {game.target_name(target)}의 다음 턴을 건너뜁니다!", True
+
+class Jammer(Item):
+    """클래식 재머: 상대의 다음 아이템 사용을 무효화 (game.jammer_active)"""
+    name = "재머"
+    icon = "📡"
+    description = "상대의 다음 아이템 사용을 무효화합니다."
+    ai_searchable = False
+
+    def apply(self, game, user, target):
+        if target is None:
+            return f"{self.label}: 사용할 수 없습니다!", True
+        game.jammer_active[target] = True
+        return f"{self.label}: {game.target_word}의 다음 아이템 사용을 무효화합니다!", True
+
+class Adrenaline(Item):
+    name = "주사기"
+    icon = "💉"
+    description = "상대의 아이템 하나를 선택해 훔쳐 즉시 사용합니다."
+    ai_searchable = False
+    needs_target = True
+
+    def apply(self, game, user, target):
+        # 실제로 훔치는 처리는 화면에서 아이템을 고른 뒤 진행
+        if target is None or not game.items[target]:
+            return f"{self.label}: {game.target_word}에게 훔칠 아이템이 없습니다!", True
+        self.charge(game, user)
+        return f"{self.label}: {game.target_word}의 아이템을 선택해 훔쳐 즉시 사용합니다.", True
+
+class BurnerPhone(Item):
+    name = "버너폰"
+    icon = "📱"
+    random_position = True  # True: 남은 탄 중 무작위 위치, False: 잔탄 3발 이상일 때 마지막 탄
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        if "description" not in options:
+            self.description = (
+                "샷건에 남은 무작위 탄환의 종류를 확인합니다." if self.random_position
+                else "잔탄 3발 이상 시, 마지막 탄환의 종류를 확인합니다. 잔탄 2발 시 '안타깝게... 됐군...' 메시지 출력."
+            )
+
+    def apply(self, game, user, target):
+        if not game.chamber:
+            return NO_SHELLS_MESSAGE, True
+        if self.random_position:
+            idx = game.rng.stream("burner").randint(0, len(game.chamber) - 1)
+            return f"{self.label}: {idx + 1}번째 탄환은 {bullet_label(game.chamber[idx])}입니다!", True
+        if len(game.chamber) >= 3:
+            game.bullet_revealed(len(game.chamber) - 1)  # 결과가 채널에 공개됨
+            bullet_type = "실탄" if game.chamber[-1] == "live" else "공포탄"
+            return f"{self.label}: {len(game.chamber)}번째 탄은 {bullet_type}이야...", True
+        if len(game.chamber) == 2:
+            return f"{self.label}: 안타깝게... 됐군...", True
+        return f"{self.label}: 잔탄이 너무 적어 사용할 수 없습니다!", True
+
+class Medicine(Item):
+    name = "약"
+    icon = "💊"
+    heal_chance = 0.5
+    max_hp = None  # None이면 game.max_hp
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        if "description" not in options:
+            self.description = (
+                f"{self.heal_chance:.0%} 확률로 체력 2 회복, {1 - self.heal_chance:.0%} 확률로 체력 1 손실."
+            )
+
+    def apply(self, game, user, target):
+        old_hp = game.hp[user]
+        if game.rng.stream("medicine").random() < self.heal_chance:
+            game.hp[user] = min(game.hp[user] + 2, self.max_hp or game.max_hp)
+            return f"{self.label}: 체력 2 회복!{game.hp_change(user, old_hp)}", True
+        game.hp[user] = max(game.hp[user] - 1, 0)
+        outcome = game.knock_out(user) if game.hp[user] <= 0 else None
+        if outcome:
+            return f"{self.label}: 체력 1 감소! {game.player_name(user)} {outcome}!", False
+        return f"{self.label}: 체력 1 감소!{game.hp_change(user, old_hp)}", True
+
+class Inverter(Item):
+    name = "인버터"
+    icon = "🔄"
+    reveals_chamber = True
+    swaps = False  # True: 현재 탄과 다음 탄의 위치를 바꿈, False: 다음 탄의 실탄/공포탄을 뒤집음
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        if "description" not in options:
+            self.description = (
+                "현재 탄환과 다음 탄환의 위치를 교환합니다." if self.swaps
+                else "다음 탄환의 상태를 반전시킵니다(실탄 ↔ 공포탄)."
+            )
+
+    def apply(self, game, user, target):
+        if len(game.chamber) <= (1 if self.swaps else 0):
+            return f"{self.label}: 사용할 수 없습니다!", True
+        if self.swaps:
+            game.chamber[0], game.chamber[1] = game.chamber[1], game.chamber[0]
+            return f"{self.label}: 현재 탄환과 다음 탄환의 위치가 바뀌었습니다!{game.reload_if_needed()}", True
+        game.chamber[0] = "live" if game.chamber[0] == "blank" else "blank"
+        game.bullet_inverted()
+        return f"{self.label}: 다음 탄환의 상태가 변경되었습니다!", True
+
+class ItemConfig:
+    """룰셋 하나의 아이템 구성
+
+    items의 순서가 곧 아이템 ID (비트마스크와 조합 테이블의 순서)이다.
+    modes는 게임 모드 목록이고 모드가 없는 룰셋은 (None,)을 쓴다.
+    """
+    def __init__(self, items, modes=(None,), icons=True):
+        self.items = tuple(items)
+        if not icons:  # 아이콘 없이 이름만 표시하는 룰셋
+            for item in self.items:
+                item.icon = ""
+        self.ids = {sys.intern(item.name): item_id for item_id, item in enumerate(self.items)}
+        self.by_name = {name: self.items[item_id] for name, item_id in self.ids.items()}  # 이름 -> 아이템 디스패치 테이블
+        self.bits = {name: 1 << item_id for name, item_id in self.ids.items()}
+        self.pools = {mode: [item.name for item in self.items if item.available(mode)] for mode in modes}
+        self.pool_masks = {mode: self.mask(pool) for mode, pool in self.pools.items()}
+        # (모드, 개수, 이미 가진 아이템 마스크)별로 뽑을 수 있는 조합 테이블
+        # 가진 아이템은 풀 안의 것만 뜻이 있으므로 풀의 모든 부분집합에 대해 미리 만들어 두고, 추첨은 조회 한 번으로 끝냄
+        # (마스크별 표는 전체 조합 표의 튜플을 그대로 가리키므로 늘어나는 것은 목록뿐)
+        self.subsets = {}
+        for mode, pool in self.pools.items():
+            for count in range(1, len(pool) + 1):
+                entries = [(self.mask(subset), subset) for subset in combinations(pool, count)]
+                for held_count in range(len(pool) - count + 1):
+                    for held in combinations(pool, held_count):
+                        held_mask = self.mask(held)
+                        self.subsets[(mode, count, held_mask)] = [subset for mask, subset in entries if not mask & held_mask]
+
+    def mask(self, items):
+        mask = 0
+        for item in items:
+            mask |= self.bits.get(item, 0)
+        return mask
+
+    def draw(self, rng, count, mode=None, held_mask=0):
+        """이미 가진 아이템(held_mask)과 겹치지 않는 count개 조합을 테이블에서 추첨"""
+        subsets = self.subsets[(mode, count, held_mask & self.pool_masks[mode])]
+        return list(subsets[rng.randrange(len(subsets))])
+
+# 하우스 AI (클래식 룰셋): 시간 예산 안에서 반복 심화 expectimax로 행동을 고름
+# 탐색은 spawn으로 띄운 프로세스 풀에서 돈다. 워커는 이 모듈을 import해 choose_ai_action을 실행하므로
+# fork처럼 이벤트 루프와 SQLite 스레드가 있는 프로세스를 복제하지 않고, fork가 없는 Windows에서도 같다.
+AI_DIFFICULTIES = {  # 탐색 깊이(행동 수)와 한 수당 시간 예산(초)
+    "easy": {"depth": 1, "budget": 0.05},
+    "normal": {"depth": 3, "budget": 0.3},
+    "hard": {"depth": 8, "budget": 1.0},
+}
+AI_CACHE_SIZE = 200000
+AI_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# 탐색 상태 (인덱스 0은 AI, 1은 상대). known은 AI가 아는 (탄창 끝 기준 위치, 탄) 목록
+AIState = namedtuple("AIState", "live blank known hp items knife cuff max_hp round3 turn")
+
+class AISearchTimeout(Exception):
+    pass
+
+ai_deadline = 0.0
+
+def ai_bullet_odds(state, position):
+    """탄창 끝 기준 position 위치의 탄이 실탄일 확률"""
+    known = dict(state.known)
+    if position in known:
+        return 1.0 if known[position] == "live" else 0.0
+    unknown = state.live + state.blank - len(known)
+    unknown_live = state.live - sum(1 for bullet in known.values() if bullet == "live")
+    return unknown_live / unknown if unknown else 0.0
+
+def ai_learn(state, position, bullet):
+    known = dict(state.known)
+    known[position] = bullet
+    return state._replace(known=tuple(sorted(known.items())))
+
+def ai_pop(state, bullet):
+    live, blank = (state.live - 1, state.blank) if bullet == "live" else (state.live, state.blank - 1)
+    total = live + blank
+    return state._replace(live=live, blank=blank, known=tuple(entry for entry in state.known if entry[0] < total))
+
+def ai_actions(state):
+    actor = state.turn
+    front = state.live + state.blank - 1
+    known = dict(state.known)
+    actions = [("shoot", "self"), ("shoot", "opponent")]
+    for item in sorted(set(state.items[actor])):
+        if item == "돋보기" and (actor != 0 or front in known):
+            continue
+        if item == "담배" and (state.hp[actor] >= 4 or (state.round3 and state.hp[actor] <= 2)):
+            continue
+        if (item == "칼" and state.knife[actor]) or (item == "수갑" and state.cuff[actor]):
+            continue
+        if item == "버너폰" and (front < 2 or 0 in known):
+            continue
+        actions.append(("item", item))
+    return actions
+
+def ai_outcomes(state, action):
+    """행동 결과를 (확률, 다음 상태) 목록으로 반환 (규칙은 11.py BuckshotGame.shoot/use_item과 동일)"""
+    actor, other = state.turn, 1 - state.turn
+    front = state.live + state.blank - 1
+    p_live = ai_bullet_odds(state, front)
+    kind, name = action
+    if kind == "shoot":
+        target = actor if name == "self" else other
+        knife, cuff = list(state.knife), list(state.cuff)
+        damage = 2 if knife[actor] else 1
+        cuff_used = cuff[actor]
+        knife[actor] = cuff[actor] = False
+        base = state._replace(knife=tuple(knife), cuff=tuple(cuff))
+        hp = list(state.hp)
+        hp[target] = 0 if state.round3 and hp[target] <= 2 else hp[target] - damage
+        live_turn = actor if target == other and cuff_used else other
+        blank_turn = actor if target == actor or cuff_used else other
+        return [
+            (p_live, ai_pop(base._replace(hp=tuple(hp), turn=live_turn), "live")),
+            (1 - p_live, ai_pop(base._replace(turn=blank_turn), "blank")),
+        ]
+    items = list(state.items)
+    own = list(items[actor])
+    own.remove(name)
+    items[actor] = tuple(own)
+    base = state._replace(items=tuple(items))
+    hp = list(state.hp)
+    if name == "맥주":
+        return [(p_live, ai_pop(base, "live")), (1 - p_live, ai_pop(base, "blank"))]
+    if name == "돋보기":
+        return [(p_live, ai_learn(base, front, "live")), (1 - p_live, ai_learn(base, front, "blank"))]
+    if name == "버너폰":
+        p_last = ai_bullet_odds(state, 0)
+        return [(p_last, ai_learn(base, 0, "live")), (1 - p_last, ai_learn(base, 0, "blank"))]
+    if name == "인버터":  # 바뀐 탄 구성이 공개되므로 뒤집힌 탄을 알게 됨
+        return [
+            (p_live, ai_learn(base._replace(live=state.live - 1, blank=state.blank + 1), front, "blank")),
+            (1 - p_live, ai_learn(base._replace(live=state.live + 1, blank=state.blank - 1), front, "live")),
+        ]
+    if name == "담배":
+        hp[actor] += 1
+        return [(1.0, base._replace(hp=tuple(hp)))]
+    if name == "칼":
+        knife = list(state.knife)
+        knife[actor] = True
+        return [(1.0, base._replace(knife=tuple(knife)))]
+    if name == "수갑":
+        cuff = list(state.cuff)
+        cuff[actor] = True
+        return [(1.0, base._replace(cuff=tuple(cuff)))]
+    healed, hurt = list(hp), list(hp)  # 상한 약
+    healed[actor] = min(hp[actor] + 2, state.max_hp)
+    hurt[actor] = max(hp[actor] - 1, 0)
+    return [(0.5, base._replace(hp=tuple(healed))), (0.5, base._replace(hp=tuple(hurt)))]
+
+def ai_action_value(state, action, depth):
+    return sum(p * ai_state_value(next_state, depth - 1) for p, next_state in ai_outcomes(state, action) if p > 0)
+
+@lru_cache(maxsize=AI_CACHE_SIZE)
+def ai_state_value(state, depth):
+    """AI 관점의 상태 가치 (-1 패배 ~ 1 승리). AI 턴은 최댓값, 상대 턴은 최솟값, 탄은 기댓값"""
+    if state.hp[0] <= 0:
+        return -1.0
+    if state.hp[1] <= 0:
+        return 1.0
+    if depth == 0 or state.live + state.blank == 0:
+        return (state.hp[0] - state.hp[1]) / (2 * state.max_hp)
+    if time.perf_counter() > ai_deadline:
+        raise AISearchTimeout
+    values = [ai_action_value(state, action, depth) for action in ai_actions(state)]
+    return max(values) if state.turn == 0 else min(values)
+
+def fallback_ai_action(state):
+    """탐색 결과를 받지 못했을 때 쓰는 단순 규칙"""
+    return ("shoot", "opponent" if ai_bullet_odds(state, state.live + state.blank - 1) >= 0.5 else "self")
+
+def choose_ai_action(state, difficulty="normal"):
+    """시간 예산 안에서 반복 심화 expectimax로 행동을 고름 (프로세스 풀에서 실행)
+
+    가치 캐시는 워커 프로세스마다 유지되어 비슷한 상태를 다시 만나면 재사용된다.
+    반환값은 (행동, 끝까지 탐색한 깊이)이다.
+    """
+    global ai_deadline
+    settings = AI_DIFFICULTIES[difficulty]
+    ai_deadline = time.perf_counter() + settings["budget"]
+    actions = ai_actions(state)
+    best, searched = fallback_ai_action(state), 0
+    for depth in range(1, settings["depth"] + 1):
+        try:
+            scored = [(ai_action_value(state, action, depth), action) for action in actions]
+        except AISearchTimeout:
+            break
+        best, searched = max(scored)[1], depth  # 동점이면 아이템보다 샷을 우선
+    return best, searched
+
+ai_pool = None
+
+def get_ai_pool():
+    global ai_pool
+    if ai_pool is None:
+        ai_pool = ProcessPoolExecutor(max_workers=AI_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return ai_pool
+
+def discard_ai_pool():
+    """망가진 풀을 버림 (다음 요청에서 새로 띄움)"""
+    global ai_pool
+    if ai_pool is not None:
+        ai_pool.shutdown(wait=False, cancel_futures=True)
+        ai_pool = None
+
+def in_worker_process():
+    """AI 풀의 워커 프로세스인지
+
+    spawn 워커는 실행한 스크립트를 __mp_main__으로 다시 import하는데, 그때는 parent_process()가 아직 None이다.
+    프로세스 이름은 스크립트를 import하기 전에 정해지므로 이름으로 판단한다 (샤드 프로세스는 subprocess로 띄우므로 MainProcess).
+    """
+    return multiprocessing.current_process().name != "MainProcess"
+
+# 상호작용 단계별 시간 예산(초). 디스코드는 3초 안에 응답이 없으면 "상호작용 실패"로 처리하므로
+# 게임 상호작용은 먼저 응답(ack)해 두고 계산(compute) → 저장(persist) → 화면(render) 순으로 진행
+STAGE_BUDGETS = {"ack": 0.5, "compute": 0.1, "persist": 0.3, "render": 1.0}
+stage_stats = {stage: {"count": 0, "misses": 0, "max": 0.0} for stage in STAGE_BUDGETS}
+
+def record_stage(stage, handler, elapsed):
+    """단계 하나의 시간을 stage_stats에 더하고 예산을 넘으면 로그로 남김"""
+    stats = stage_stats[stage]
+    stats["count"] += 1
+    stats["max"] = max(stats["max"], elapsed)
+    if elapsed > STAGE_BUDGETS[stage]:
+        stats["misses"] += 1
+        logging.warning(f"{handler}: {stage} 단계 {elapsed * 1000:.0f}ms (예산 {STAGE_BUDGETS[stage] * 1000:.0f}ms, 누적 초과 {stats['misses']}회)")
+
+@contextmanager
+def timed_stage(stage, handler):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, handler, time.perf_counter() - started)
+
+async def acknowledge(interaction, handler):
+    """3초 응답 창 안에 먼저 defer 해 둠 (이후 응답은 모두 followup)
+
+    채널 룰셋의 compute 단계는 여기서 시작해 저장소에 반영하기 직전에 끝난다.
+    """
+    with timed_stage("ack", handler):
+        if not interaction.response.is_done():
+            await interaction.response.defer()
+    interaction.extras["handler"] = handler
+    interaction.extras["compute_started"] = time.perf_counter()
+
+# 버튼과 선택 메뉴 연타 제한: 게임 처리와 DB에 닿기 전에 유저별, 게임별 토큰 버킷으로 거름
+THROTTLE_USER_RATE = 2.0  # 초당 차오르는 토큰 수
+THROTTLE_USER_BURST = 5  # 연달아 누를 수 있는 횟수
+THROTTLE_GAME_RATE = 4.0
+THROTTLE_GAME_BURST = 8
+THROTTLE_MAX_BUCKETS = 10000  # 종류별로 기억하는 버킷 수
+
+class TokenBucketLimiter:
+    """키마다 토큰 버킷 하나 (초당 rate개씩 burst개까지 차오름)
+
+    버킷은 최근에 쓴 순서로 두고 max_buckets를 넘으면 가장 오래 안 쓴 것부터 버린다.
+    버려진 키는 가득 찬 버킷으로 다시 시작하는데, 그만큼 쉬었으면 대개 이미 가득 차 있었을 것이라 결과가 같다.
+    """
+    def __init__(self, rate, burst, max_buckets=THROTTLE_MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()  # 키 -> [남은 토큰, 마지막 갱신 시각, 쿨다운 안내 여부]
+
+    def refill(self, key, now):
+        """키의 버킷을 now까지 채워 반환 (처음 보는 키는 가득 찬 버킷)"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now, False]
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def available(self, key, now):
+        """토큰을 쓰지 않고 남아 있는지만 확인"""
+        return self.refill(key, now)[0] >= 1
+
+    def take(self, key, now):
+        """토큰 하나를 쓰고 성공 여부를 반환"""
+        bucket = self.refill(key, now)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True
+        return False
+
+    def first_refusal(self, key):
+        """이번 쿨다운에서 처음 거절된 키면 True (안내는 한 번만 보냄)"""
+        bucket = self.buckets.get(key)
+        if bucket is None or bucket[2]:
+            return False
+        bucket[2] = True
+        return True
+
+user_limiter = TokenBucketLimiter(THROTTLE_USER_RATE, THROTTLE_USER_BURST)
+game_limiter = TokenBucketLimiter(THROTTLE_GAME_RATE, THROTTLE_GAME_BURST)
+
+def take_tokens(user_id, game_key, now, users=user_limiter, games=game_limiter):
+    """게임 버킷에 토큰이 있을 때만 유저 토큰을 쓰고, 유저 토큰까지 쓰면 게임 토큰을 씀
+
+    한쪽이 거절하면 어느 쪽 토큰도 쓰지 않는다. 거절한 (버킷, 키)를 반환하고 통과하면 None.
+    """
+    if not games.available(game_key, now):
+        return games, game_key
+    if not users.take(user_id, now):
+        return users, user_id
+    games.take(game_key, now)
+    return None
+
+async def throttle(interaction, game_key, participants=None):
+    """게임과 유저의 토큰을 하나씩 씀. 넘치면 처음 한 번만 쿨다운을 알리고 이후에는 응답 없이 버림
+
+    participants를 주면 참가자가 아닌 유저는 토큰을 쓰기 전에 거절해 구경꾼이 게임 버킷을 비우지 못하게 한다.
+    참가자를 아직 모르는 경로(스냅샷이나 저장소에서 게임을 읽기 전)는 게임 버킷을 (게임, 유저)로 나눠 씀.
+    """
+    user_id = interaction.user.id
+    if participants is None:
+        game_key = (game_key, user_id)
+    elif user_id not in participants:
+        if not interaction.response.is_done():
+            await interaction.response.send_message("이 게임의 참가자가 아닙니다!", ephemeral=True)
+        return False
+    refused = take_tokens(user_id, game_key, time.monotonic())
+    if refused is None:
+        return True
+    limiter, key = refused
+    if limiter.first_refusal(key) and not interaction.response.is_done():
+        await interaction.response.send_message("⏳ 너무 빠르게 누르고 있습니다. 잠시 후 다시 시도해 주세요.", ephemeral=True)
+    return False
+
+# 동시 게임 수 제한: 초대 대기(pending)와 진행 중(active) 게임을 프로세스 전체, 길드, 유저 단위로 셈
+# 초대 하나는 수락되면 진행 중 게임이 되므로 전체/길드 진행 중 한도는 초대 대기 수까지 포함해서 봄
+ADMISSION_LIMITS = {
+    "pending": {"global": 200, "guild": 20, "user": 3},
+    "active": {"global": 500, "guild": 50, "user": 1},
+}
+INVITE_QUEUE_SIZE = 200  # 한도를 넘은 초대가 기다리는 대기열 길이
+INVITE_QUEUE_TIMEOUT = 300.0  # 대기열에서 이만큼(초) 자리가 나지 않으면 취소
+# 이벤트 루프 지연이나 커밋 시간이 이 값(초)을 넘으면 새 게임을 받지 않음 (지수 이동 평균 기준)
+SHED_LOOP_LAG = 0.25
+SHED_COMMIT_LATENCY = 0.1
+LOAD_SAMPLE_INTERVAL = 1.0
+LOAD_SMOOTHING = 0.3
+
+class InviteQueueEntry:
+    __slots__ = ("ticket", "kind", "guild_id", "user_ids", "create", "future")
+
+    def __init__(self, ticket, kind, guild_id, user_ids, create, future):
+        self.ticket = ticket  # 대기열에 들어온 순서대로 하나씩 커지는 번호
+        self.kind = kind
+        self.guild_id = guild_id
+        self.user_ids = user_ids
+        self.create = create  # 자리가 났을 때 게임을 만들어 admit까지 하는 함수
+        self.future = future
+
+class AdmissionControl:
+    """동시 게임 수 한도, 초대 대기열, 과부하 시 새 게임 거절
+
+    admit()한 게임만 세고 (시뮬레이션과 벤치마크 게임은 세지 않음), 게임 상태가 바뀔 때마다(update, track)
+    카운터를 옮긴다. 카운터는 저장된 pending/active 게임을 그대로 따라가므로 비정상 종료 후에는
+    룰셋이 저장된 게임에서 다시 세면 되고 따로 저장하지 않는다.
+    한도 확인과 갱신은 (종류, 범위, 키) 카운터 몇 개만 보므로 게임 수와 무관하게 O(1)이다.
+    """
+    def __init__(self, limits=None):
+        self.limits = limits or ADMISSION_LIMITS
+        self.counts = {}  # (종류, 범위, 키) -> 게임 수
+        self.tracked = {}  # game_id -> 센 항목 (종류, 길드 ID, 유저 ID 튜플)
+        self.queue = OrderedDict()  # 초대한 유저 ID -> InviteQueueEntry (먼저 온 순서)
+        self.next_ticket = 0
+        self.loop_lag = 0.0
+        self.commit_latency = 0.0
+        self.committed = False  # 마지막 샘플 이후 커밋이 있었는지
+        self.drain_scheduled = False
+
+    def count(self, kind, scope, key=None):
+        return self.counts.get((kind, scope, key), 0)
+
+    def _apply(self, entry, delta):
+        kind, guild_id, user_ids = entry
+        keys = [(kind, "global", None)] + ([(kind, "guild", guild_id)] if guild_id is not None else [])
+        for key in keys + [(kind, "user", user_id) for user_id in user_ids]:
+            count = self.counts.get(key, 0) + delta
+            if count:
+                self.counts[key] = count
+            else:
+                del self.counts[key]
+
+    def _track(self, game_id, entry):
+        old = self.tracked.get(game_id)
+        if old == entry:
+            return
+        if entry is None:
+            del self.tracked[game_id]
+        else:
+            self.tracked[game_id] = entry
+            self._apply(entry, 1)
+        if old is not None:
+            self._apply(old, -1)
+            self.schedule_drain()
+
+    @staticmethod
+    def entry_for(status, guild_id, player_ids):
+        """상태별로 세는 항목: 초대 대기는 초대한 유저, 진행 중은 사람 플레이어 모두"""
+        if status == "pending":
+            return ("pending", guild_id, tuple(player_ids[:1]))
+        if status == "active":
+            return ("active", guild_id, tuple(player_ids))
+        return None
+
+    def game_entry(self, game):
+        """admit/update로 세는 게임 객체의 항목 (status, guild_id, seats가 있는 게임)"""
+        return self.entry_for(game.status, game.guild_id, list(game.seats))
+
+    def admit(self, game):
+        """게임을 세기 시작함 (한도 확인은 check로 먼저 하고, 토너먼트/매칭처럼 이미 정해진 게임은 바로 admit)"""
+        self._track(game.game_id, self.game_entry(game))
+
+    def update(self, game):
+        """게임 행을 쓰거나 게임이 끝날 때 호출. admit한 게임만 상태에 맞춰 옮김"""
+        if game.game_id in self.tracked:
+            self._track(game.game_id, self.game_entry(game))
+
+    def track(self, game_id, status, guild_id, player_ids):
+        """게임 객체 없이 저장소 키로 세는 게임의 상태를 옮김 (status가 pending/active가 아니면 더 세지 않음)"""
+        entry = self.entry_for(status, guild_id, player_ids)
+        if entry is not None or game_id in self.tracked:
+            self._track(game_id, entry)
+
+    def forget(self, game_id):
+        if game_id in self.tracked:
+            self._track(game_id, None)
+
+    def check(self, kind, guild_id, user_ids, reserved=False):
+        """kind 게임을 하나 더 받을 수 없으면 막힌 범위('global', 'guild', 'user'), 받을 수 있으면 None
+
+        reserved: 이미 초대 대기로 세고 있는 게임을 진행 중으로 옮기는 경우 (전체/길드 자리는 초대 때 잡아 둠)
+        """
+        active_limits, pending_limits = self.limits["active"], self.limits["pending"]
+        for scope, key in (("global", None), ("guild", guild_id)):
+            if reserved or (scope == "guild" and guild_id is None):
+                continue
+            pending = self.count("pending", scope, key)
+            if pending + self.count("active", scope, key) >= active_limits[scope]:
+                return scope
+            if kind == "pending" and pending >= pending_limits[scope]:
+                return scope
+        for user_id in user_ids:
+            if self.count("active", "user", user_id) >= active_limits["user"]:
+                return "user"
+            if kind == "pending" and self.count("pending", "user", user_id) >= pending_limits["user"]:
+                return "user"
+        return None
+
+    def record_commit(self, elapsed):
+        self.commit_latency += (elapsed - self.commit_latency) * LOAD_SMOOTHING
+        self.committed = True
+
+    def sample_load(self, lag):
+        """LOAD_SAMPLE_INTERVAL마다 루프 지연을 기록. 그동안 커밋이 없었으면 커밋 시간도 가라앉은 것으로 봄"""
+        self.loop_lag += (lag - self.loop_lag) * LOAD_SMOOTHING
+        if not self.committed:
+            self.commit_latency -= self.commit_latency * LOAD_SMOOTHING
+        self.committed = False
+        self.schedule_drain()  # 과부하가 풀렸으면 멈춰 둔 대기열을 다시 처리
+
+    def overloaded(self):
+        """과부하면 이유를, 아니면 None"""
+        if self.loop_lag > SHED_LOOP_LAG:
+            return f"event loop lag {self.loop_lag * 1000:.0f}ms"
+        if self.commit_latency > SHED_COMMIT_LATENCY:
+            return f"commit latency {self.commit_latency * 1000:.0f}ms"
+        return None
+
+    def enqueue(self, kind, guild_id, user_ids, create):
+        """한도 때문에 받지 못한 게임을 대기열에 넣고 (대기 순번, future)를 반환. 대기열이 가득 차면 None
+
+        초대한 유저가 이미 기다리고 있으면 기존 항목을 덮어쓰지 않고 (그 순번, None)을 반환.
+        """
+        if user_ids[0] in self.queue:
+            return self.position(user_ids[0]), None
+        if len(self.queue) >= INVITE_QUEUE_SIZE:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.queue[user_ids[0]] = InviteQueueEntry(self.next_ticket, kind, guild_id, user_ids, create, future)
+        self.next_ticket += 1
+        return self.position(user_ids[0]), future
+
+    def position(self, user_id):
+        """대기열 순번 (1부터, 없으면 None)
+
+        맨 앞 항목과의 번호 차이로 셈. 중간에서 빠진 항목(취소, 길드 한도로 건너뛴 뒤 먼저 시작한 게임)도
+        앞에 있는 것으로 세므로 실제 순번 이하로는 알려주지 않는다.
+        """
+        entry = self.queue.get(user_id)
+        if entry is None:
+            return None
+        return entry.ticket - next(iter(self.queue.values())).ticket + 1
+
+    def cancel(self, user_id, future):
+        """대기를 포기함. 그 사이 같은 유저가 다시 넣은 항목은 건드리지 않도록 future가 같을 때만 뺌"""
+        entry = self.queue.get(user_id)
+        if entry is not None and entry.future is future:
+            del self.queue[user_id]
+
+    def schedule_drain(self):
+        """자리가 나면 이벤트 루프의 다음 차례에 대기열을 처리 (게임 행을 쓰는 도중에 새 게임을 만들지 않도록)"""
+        if not self.queue or self.drain_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.drain_scheduled = True
+        loop.call_soon(self.drain)
+
+    def drain(self):
+        """앞에서부터 자리가 난 대기 게임을 만듦 (과부하 중에는 멈춤)"""
+        self.drain_scheduled = False
+        if self.overloaded():
+            return
+        for user_id, entry in list(self.queue.items()):
+            blocked = self.check(entry.kind, entry.guild_id, entry.user_ids)
+            if blocked == "global":
+                break
+            if entry.future.done():  # 기다리던 쪽이 이미 포기함
+                del self.queue[user_id]
+                continue
+            if blocked:
+                continue
+            del self.queue[user_id]
+            try:
+                entry.future.set_result(entry.create())
+            except Exception as e:
+                entry.future.set_exception(e)
+
+    def stats(self):
+        return {
+            "pending": self.count("pending", "global"), "active": self.count("active", "global"), "queued": len(self.queue),
+            "loop_lag_ms": round(self.loop_lag * 1000, 1), "commit_ms": round(self.commit_latency * 1000, 1),
+        }
+
+# 상호작용 기록 (선택): BUCKSHOT_RECORD에 파일 이름 앞부분을 주면 게임 시작과 버튼/선택 입력을 익명화해 한 줄씩 덧붙임
+# 기록은 BUCKSHOT_REPLAY로 실행해 실제 핸들러에 다시 흘려 넣을 수 있다 (아래 기록 재생)
+# 파일 이름: <BUCKSHOT_RECORD>-<룰셋>[-샤드 번호].jsonl (룰셋과 샤드 그룹마다 따로 써서 한 파일에는 프로세스 하나만 씀)
+RECORD_MAX_SESSIONS = 10000  # 기억하는 세션 수 (넘으면 가장 오래된 세션부터 더 기록하지 않음)
+
+def record_path(ruleset):
+    return shard_path(f"{os.environ['BUCKSHOT_RECORD']}-{ruleset}", "jsonl") if os.environ.get("BUCKSHOT_RECORD") else None
+
+class InteractionRecorder:
+    """게임 하나를 세션 하나로 묶어 상호작용을 JSON 줄로 기록
+
+    유저 ID는 세션 안에서 처음 나온 순서의 자리 번호로(게임을 연 사람 0), 게임 ID는 해시로 바꿔 남긴다.
+    줄마다 {"s": 세션, "t": 기록 시작 후 ms, "u": 자리, "a": 동작, "v": 선택 값}이고, 세션 첫 줄에는
+    재생할 때 같은 게임이 나오도록 시드를 넣는다. 파일을 열 때마다 룰셋 이름을 담은 머리 줄을 하나 쓴다.
+    component_action(custom_id, is_select)은 룰셋의 custom_id 형식에서 동작 이름을 꺼낸다.
+    """
+    def __init__(self, path, ruleset, component_action):
+        self.path = path
+        self.ruleset = ruleset
+        self.component_action = component_action
+        self.file = None
+        self.opened_at = 0.0
+        self.sessions = OrderedDict()  # 게임 ID -> (세션 ID, 자리 순서의 유저 ID 목록)
+
+    def write(self, line):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8", buffering=1)  # 줄 단위로 내보냄
+            self.opened_at = time.monotonic()
+            self.file.write(json.dumps({"recorded_at": round(time.time()), "ruleset": self.ruleset}) + "\n")
+        line["t"] = round((time.monotonic() - self.opened_at) * 1000)
+        self.file.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def start(self, game_id, seed, user_ids, kind=1, **fields):
+        """게임의 세션을 엶 (fields 중 None이 아닌 값은 세션 첫 줄에 함께 남김)"""
+        if not self.path:
+            return
+        session = hashlib.sha256(str(game_id).encode()).hexdigest()[:12]
+        self.sessions[game_id] = (session, list(user_ids))
+        if len(self.sessions) > RECORD_MAX_SESSIONS:
+            self.sessions.popitem(last=False)
+        line = {"s": session, "start": kind, "seed": seed}
+        line.update((name, value) for name, value in fields.items() if value is not None)
+        self.write(line)
+
+    def finish(self, game_id):
+        """끝난 게임의 세션을 닫음"""
+        self.sessions.pop(game_id, None)
+
+    def record(self, game_id, interaction):
+        """버튼이나 선택 메뉴 입력 하나 (연타 제한에 걸리는 입력도 그대로 남김)"""
+        entry = self.sessions.get(game_id)
+        if entry is None:
+            return
+        session, user_ids = entry
+        data = interaction.data or {}
+        action = self.component_action(data.get("custom_id"), "values" in data)
+        if action is None:
+            return
+        if interaction.user.id not in user_ids:
+            user_ids.append(interaction.user.id)  # 관전자 등 처음 누른 유저도 순서대로 자리를 받음
+        line = {"s": session, "u": user_ids.index(interaction.user.id), "a": action}
+        if data.get("values"):
+            line["v"] = data["values"]
+        self.write(line)
+
+# 기록 재생: BUCKSHOT_REPLAY=<기록 파일>로 룰셋 파일을 단독 실행하면 디스코드에 연결하지 않고 기록된 세션을 실제 핸들러에 다시 흘려 넣음
+# 디스코드 입출력은 아래 Replay* 객체가 대신 받고, DB와 스냅샷 파일은 임시 디렉터리에 새로 만든다
+REPLAY_PATH = os.environ.get("BUCKSHOT_REPLAY")
+REPLAY_SPEED = float(os.environ.get("BUCKSHOT_REPLAY_SPEED", "1"))  # 1: 기록된 간격 그대로, 2: 두 배 빠르게, 0: 쉬지 않고
+REPLAY_VIEW_HISTORY = 8  # 세션마다 기억하는 최근 화면 수 (입력할 버튼과 선택 메뉴를 여기서 찾음)
+replay_ids = iter(range(1, 2 ** 62))
+
+class ReplayUser:
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f"replay{user_id}"
+        self.mention = f"<@{user_id}>"
+
+class ReplaySession:
+    """재생 중인 세션 하나: 자리 번호별 가짜 유저와 최근에 보낸 화면"""
+    def __init__(self, events, component_action):
+        self.events = events
+        self.component_action = component_action
+        self.user_base = next(replay_ids) * 100  # 자리 번호를 더해 세션마다 겹치지 않는 유저 ID를 만듦
+        self.channel_id = next(replay_ids)
+        self.users = {}
+        self.views = []
+
+    def user(self, slot):
+        if slot not in self.users:
+            self.users[slot] = ReplayUser(self.user_base + slot)
+        return self.users[slot]
+
+    def show(self, view):
+        if view is not None:
+            self.views.append(view)
+            del self.views[:-REPLAY_VIEW_HISTORY]
+
+    def find_component(self, action):
+        """가장 최근 화면부터 동작 이름이 같은 버튼이나 선택 메뉴를 찾음"""
+        for view in reversed(self.views):
+            for item in view.children:
+                if self.component_action(getattr(item, "custom_id", None), isinstance(item, discord.ui.Select)) == action:
+                    return view, item
+        return None, None
+
+class ReplayMessage:
+    def __init__(self, session, message_id=None):
+        self.session = session
+        self.id = message_id or next(replay_ids)
+
+    async def delete(self):
+        pass
+
+    async def edit(self, **kwargs):
+        self.session.show(kwargs.get("view"))
+
+class ReplayChannel:
+    def __init__(self, session):
+        self.session = session
+
+    def get_partial_message(self, message_id):
+        return ReplayMessage(self.session, message_id)
+
+class ReplayResponse:
+    def __init__(self, session):
+        self.session = session
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        self.session.show(kwargs.get("view"))
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+        self.session.show(kwargs.get("view"))
+
+class ReplayFollowup:
+    def __init__(self, session):
+        self.session = session
+
+    async def send(self, content=None, **kwargs):
+        self.session.show(kwargs.get("view"))
+        return ReplayMessage(self.session)
+
+class ReplayInteraction:
+    """핸들러가 쓰는 만큼만 갖춘 가짜 상호작용"""
+    def __init__(self, session, user, data=None):
+        self.user = user
+        self.data = data or {}
+        self.guild_id = None
+        self.channel_id = session.channel_id
+        self.channel = ReplayChannel(session)
+        self.message = None
+        self.extras = {}
+        self.response = ReplayResponse(session)
+        self.followup = ReplayFollowup(session)
+
+def load_recording(path):
+    """기록 파일을 세션별 줄 목록으로 읽음 (여러 번 이어 쓴 기록은 앞 기록이 끝난 뒤로 시각을 옮겨 이어 붙임)"""
+    sessions = OrderedDict()
+    offset = last = 0
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            if "recorded_at" in line:
+                offset = last
+                continue
+            line["t"] += offset
+            last = max(last, line["t"])
+            sessions.setdefault(line["s"], []).append(line)
+    return [lines for lines in sessions.values() if lines[0].get("start")]  # 기록을 켜기 전에 시작한 게임은 재생할 수 없음
+
+def run_replay(replay_recording, path, speed=REPLAY_SPEED):
+    """임시 디렉터리에서 룰셋의 replay_recording(path, speed)으로 기록을 재생하고 결과를 로그로 남김"""
+    global db_conn, db_ready
+    path = os.path.abspath(path)
+    db_conn, db_ready = None, False  # DB를 임시 디렉터리에 새로 만듦
+    workdir = tempfile.mkdtemp(prefix="buckshot_replay_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # DB, 스냅샷 등 상대 경로 파일이 모두 여기에 새로 생김
+    try:
+        result = asyncio.run(replay_recording(path, speed))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    for name, value in result.items():
+        logging.info(f"{name}: {value}")
+
+# 종료 스냅샷: 진행 중인 게임을 키 순 색인 + 레코드 영역 파일 하나로 남기고, 다시 시작하면 mmap으로 열어 게임을 하나씩 꺼냄
+SNAPSHOT_MAGIC = b"BSNP"
+SNAPSHOT_HEADER = struct.Struct("<4sHId")  # 매직, 형식 버전, 게임 수, 저장 시각
+SNAPSHOT_ENTRY = struct.Struct("<16sQId")  # 게임 키(16바이트), 레코드 위치, 레코드 길이, 게임 저장 시각
+
+def write_snapshot(path, entries, version):
+    """(키, JSON 바이트, 저장 시각) 목록을 키 순 색인 + 레코드 영역 파일로 저장 (임시 파일에 쓴 뒤 교체)"""
+    entries = sorted(entries)
+    offset = SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size * len(entries)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, len(entries), time.time()))
+        for key, payload, saved_at in entries:
+            f.write(SNAPSHOT_ENTRY.pack(key, offset, len(payload), saved_at))
+            offset += len(payload)
+        for key, payload, saved_at in entries:
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return offset
+
+class GameSnapshot:
+    """종료 스냅샷 파일을 mmap으로 열어 두고 게임을 하나씩 꺼냄
+
+    시작할 때는 헤더만 읽는다. 게임은 첫 상호작용 때 정렬된 색인을 이진 탐색해 그 레코드만 디코딩하고,
+    한 번 꺼낸 게임은 다시 꺼내지 않는다 (이미 메모리에 올라갔거나 그 뒤에 끝난 게임).
+    encode_key는 룰셋의 게임 키를 16바이트 색인 키로 바꾸고, max_age(초)를 주면 그보다 오래된 게임은 꺼내지 않는다.
+    """
+    def __init__(self, path, version, encode_key, max_age=None):
+        self.encode_key = encode_key
+        self.max_age = max_age
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, file_version, self.count, self.saved_at = SNAPSHOT_HEADER.unpack_from(self.map, 0)
+        if magic != SNAPSHOT_MAGIC or file_version != version:
+            self.close()
+            raise ValueError(f"지원하지 않는 스냅샷 형식입니다: {magic!r} v{file_version}")
+        self.taken = set()
+
+    @classmethod
+    def open(cls, path, version, encode_key, max_age=None):
+        """스냅샷 파일이 있으면 다른 이름으로 옮긴 뒤 열어 둠 (비정상 종료 후 같은 스냅샷을 다시 읽지 않도록)"""
+        if not os.path.exists(path):
+            return None
+        restoring_path = f"{path}.restoring"
+        os.replace(path, restoring_path)
+        try:
+            return cls(restoring_path, version, encode_key, max_age)
+        except (ValueError, struct.error, OSError) as e:
+            logging.error(f"스냅샷 무시: {e}")
+            return None
+
+    def entry(self, index):
+        return SNAPSHOT_ENTRY.unpack_from(self.map, SNAPSHOT_HEADER.size + index * SNAPSHOT_ENTRY.size)
+
+    def find(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.count and self.entry(low)[0] == key else -1
+
+    def expired(self, saved_at, now):
+        return self.max_age is not None and now - saved_at > self.max_age
+
+    def contains(self, game_key):
+        try:
+            key = self.encode_key(game_key)
+        except ValueError:
+            return False
+        return key not in self.taken and self.find(key) >= 0
+
+    def take(self, game_key):
+        """게임 상태를 꺼냄 (없거나, 이미 꺼냈거나, 너무 오래된 게임이면 None)"""
+        try:
+            key = self.encode_key(game_key)
+        except ValueError:
+            return None
+        if key in self.taken:
+            return None
+        index = self.find(key)
+        if index < 0:
+            return None
+        self.taken.add(key)
+        _, offset, length, saved_at = self.entry(index)
+        if self.expired(saved_at, time.time()):
+            return None
+        return json.loads(self.map[offset:offset + length])
+
+    def discard(self, game_key):
+        """초기화된 게임이 다시 살아나지 않도록 꺼낸 것으로 표시"""
+        try:
+            self.taken.add(self.encode_key(game_key))
+        except ValueError:
+            pass
+
+    def remaining(self):
+        """아직 꺼내지 않았고 오래되지 않은 레코드 (다음 스냅샷에 그대로 옮김)"""
+        now = time.time()
+        for index in range(self.count):
+            key, offset, length, saved_at = self.entry(index)
+            if key not in self.taken and not self.expired(saved_at, now):
+                yield key, self.map[offset:offset + length], saved_at
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+        if self.file.name.endswith(".restoring"):
+            os.remove(self.file.name)
+
+def install_shutdown_handler(shutdown):
+    """SIGTERM을 받으면 shutdown()(진행 중인 게임을 남기고 연결을 닫는 코루틴 함수)을 실행"""
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(shutdown()))
+    except NotImplementedError:  # 윈도우 이벤트 루프는 시그널 핸들러를 지원하지 않음
+        pass
+
+# DB 정리 작업: 룰셋마다 지울 행을 찾는 정리 단계(sweep)를 등록하고, 빈 페이지와 WAL은 공통으로 돌려줌
+MAINTENANCE_INTERVAL = 900.0  # 정리 주기(초)
+MAINTENANCE_BATCH = 200  # 쓰기 트랜잭션 하나에서 다루는 최대 행 수 (쓰기 잠금을 몇 ms 안에 놓도록)
+MAINTENANCE_MAX_ROWS = 50000  # 한 주기에 정리 단계마다 지우는 최대 행 수
+MAINTENANCE_PAUSE = 0.05  # 배치 사이에 쉬는 시간(초), 그 사이에 게임의 쓰기가 들어옴
+MAINTENANCE_BUSY_TIMEOUT = 0.005  # 잠금을 기다리는 최대 시간(초), 넘기면 이번 주기의 나머지를 다음으로 미룸
+MAINTENANCE_VACUUM_PAGES = 64  # incremental_vacuum 한 번에 돌려주는 페이지 수
+MAINTENANCE_IDLE_ACTIONS = 100  # 지난 주기 동안 처리한 상호작용이 이 수 이하면 한가한 때로 보고 체크포인트와 ANALYZE
+MAINTENANCE_ANALYZE_INTERVAL = 86400.0
+MAINTENANCE_ANALYZE_LIMIT = 1000  # ANALYZE가 색인마다 살펴보는 행 수 (PRAGMA analysis_limit)
+
+class DatabaseMaintenance:
+    """낮은 우선순위의 DB 정리 작업
+
+    정리 단계는 async (maintenance, conn) -> {이름: 지운 행 수}로, write_step/write_lock으로 MAINTENANCE_BATCH행씩
+    BEGIN IMMEDIATE를 짧게 잡고 지운다. 잠금을 MAINTENANCE_BUSY_TIMEOUT 안에 잡지 못하면 기다리지 않고 다음 주기로 미룬다.
+    자체 연결을 쓰고 DB 작업은 스레드에서 실행한다. idle_checks가 모두 True면 한가한 때로 본다.
+    """
+    def __init__(self, path=None, pause=MAINTENANCE_PAUSE, sweeps=None):
+        self.path = path or DB_PATH
+        self.pause = pause
+        self.sweeps = list(sweeps or [])
+        self.idle_checks = []
+        self.last_analyze = 0.0
+        self.last_actions = 0
+        self.stats = {"runs": 0, "reclaimed_bytes": 0, "deferred": 0, "max_lock_ms": 0.0}
+
+    def connect(self):
+        if self.path == DB_PATH:
+            ensure_db()
+        return sqlite3.connect(self.path, timeout=MAINTENANCE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+
+    @contextmanager
+    def write_lock(self, conn):
+        """짧은 쓰기 트랜잭션. 잠금을 잡지 못하면 None을 넘김"""
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:  # database is locked
+            self.stats["deferred"] += 1
+            yield None
+            return
+        started = time.perf_counter()
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.stats["max_lock_ms"] = max(self.stats["max_lock_ms"], (time.perf_counter() - started) * 1000)
+
+    def write_step(self, conn, sql, params=None, rows=None):
+        """짧은 쓰기 트랜잭션 하나. 잠금을 잡지 못하면 None, 아니면 바뀐 행 수"""
+        with self.write_lock(conn) as locked:
+            if locked is None:
+                return None
+            cursor = conn.executemany(sql, rows) if rows is not None else conn.execute(sql, params or ())
+            return cursor.rowcount
+
+    def vacuum_step(self, conn):
+        """빈 페이지를 MAINTENANCE_VACUUM_PAGES개까지 파일에서 돌려주고 줄어든 바이트를 반환 (None: 더 돌려줄 것이 없거나 잠금 실패)
+
+        auto_vacuum=INCREMENTAL로 만든 DB에서만 동작한다 (init_db가 새 DB를 그렇게 만듦).
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2 or not conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            return None
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        started = time.perf_counter()
+        try:
+            conn.execute(f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})").fetchall()
+        except sqlite3.OperationalError:
+            self.stats["deferred"] += 1
+            return None
+        self.stats["max_lock_ms"] = max(self.stats["max_lock_ms"], (time.perf_counter() - started) * 1000)
+        return (before - conn.execute("PRAGMA page_count").fetchone()[0]) * page_size
+
+    def checkpoint(self, conn):
+        """WAL 내용을 DB 파일로 옮기고 WAL을 비움, 줄어든 WAL 바이트를 반환"""
+        wal_path = f"{self.path}-wal"
+        before = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        started = time.perf_counter()
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        self.stats["max_lock_ms"] = max(self.stats["max_lock_ms"], (time.perf_counter() - started) * 1000)
+        if busy:
+            self.stats["deferred"] += 1
+        return max(before - (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0), 0)
+
+    def analyze(self, conn):
+        started = time.perf_counter()
+        conn.execute(f"PRAGMA analysis_limit = {MAINTENANCE_ANALYZE_LIMIT}")
+        try:
+            conn.execute("ANALYZE")
+        except sqlite3.OperationalError:
+            self.stats["deferred"] += 1
+            return False
+        self.stats["max_lock_ms"] = max(self.stats["max_lock_ms"], (time.perf_counter() - started) * 1000)
+        self.last_analyze = time.time()
+        return True
+
+    def is_idle(self):
+        """지난 주기 동안 처리한 상호작용 수와 룰셋별 조건(idle_checks)으로 한가한 때인지 판단"""
+        actions = stage_stats["ack"]["count"]
+        idle = actions - self.last_actions <= MAINTENANCE_IDLE_ACTIONS
+        self.last_actions = actions
+        return idle and all(check() for check in self.idle_checks)
+
+    async def run(self, idle):
+        """정리 한 주기: 룰셋별 정리 단계 → incremental vacuum → (한가할 때) 체크포인트, ANALYZE. 이번 주기 결과를 반환"""
+        conn = await asyncio.to_thread(self.connect)
+        report = {"vacuum_bytes": 0, "wal_bytes": 0, "analyzed": False}
+        removed = {}
+        try:
+            for sweep in self.sweeps:
+                for name, count in (await sweep(self, conn)).items():
+                    removed[name] = removed.get(name, 0) + count
+            while (reclaimed := await asyncio.to_thread(self.vacuum_step, conn)) is not None:
+                report["vacuum_bytes"] += reclaimed
+                await asyncio.sleep(self.pause)
+            if idle:
+                report["wal_bytes"] = await asyncio.to_thread(self.checkpoint, conn)
+                if time.time() - self.last_analyze >= MAINTENANCE_ANALYZE_INTERVAL:
+                    report["analyzed"] = await asyncio.to_thread(self.analyze, conn)
+        finally:
+            conn.close()
+        self.stats["runs"] += 1
+        for name, count in removed.items():
+            self.stats[name] = self.stats.get(name, 0) + count
+        self.stats["reclaimed_bytes"] += report["vacuum_bytes"] + report["wal_bytes"]
+        report["removed"] = removed
+        return report
+
+maintenance = DatabaseMaintenance()
+maintenance_task = None
+
+def schedule_maintenance():
+    """MAINTENANCE_INTERVAL마다 DB 정리를 돌리고 지운 것이 있으면 로그로 남김
+
+    같은 DB를 쓰는 샤드 프로세스 중 0번 샤드를 맡은 프로세스에서, 프로세스마다 한 번만 시작한다.
+    """
+    global maintenance_task
+    if maintenance_task is not None or not owns_guild(None):
+        return
+
+    async def run_forever():
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                report = await maintenance.run(maintenance.is_idle())
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"DB 정리 실패: {e}")
+                continue
+            reclaimed = report["vacuum_bytes"] + report["wal_bytes"]
+            if any(report["removed"].values()) or reclaimed:
+                logging.info(
+                    f"DB 정리: {', '.join(f'{name} {count}행' for name, count in report['removed'].items())} 삭제, "
+                    f"{reclaimed:,}바이트 회수 (최대 잠금 {maintenance.stats['max_lock_ms']:.1f}ms)"
+                )
+
+    maintenance_task = asyncio.get_running_loop().create_task(run_forever())
+
+# 샤드 감독 설정
+SHARD_RESTART_DELAY = 1.0  # 샤드 프로세스가 죽은 뒤 첫 재시작까지 대기(초), 연달아 죽으면 두 배씩
+SHARD_MAX_RESTART_DELAY = 60.0
+SHARD_STABLE_AFTER = 60.0  # 이만큼 살아 있다가 죽었으면 대기 시간을 처음으로 되돌림
+
+def shard_groups(shard_count, processes):
+    """샤드 번호를 프로세스 수만큼 연속 구간으로 나눔"""
+    return [list(range(shard_count * i // processes, shard_count * (i + 1) // processes)) for i in range(processes)]
+
+async def supervise_shard_group(shard_ids, shard_count, script):
+    """샤드 그룹 하나를 script를 실행하는 자식 프로세스로 띄우고 비정상 종료되면 다시 띄움"""
+    env = dict(os.environ, BUCKSHOT_SHARD_COUNT=str(shard_count), BUCKSHOT_SHARD_IDS=",".join(map(str, shard_ids)))
+    env.pop("BUCKSHOT_SHARD_PROCESSES", None)
+    delay = SHARD_RESTART_DELAY
+    while True:
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(sys.executable, script, env=env)
+        logging.info(f"샤드 그룹 {shard_ids} 시작 (pid {process.pid})")
+        try:
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            process.terminate()
+            await process.wait()
+            raise
+        if return_code == 0:
+            logging.info(f"샤드 그룹 {shard_ids} 정상 종료")
+            return
+        if time.monotonic() - started >= SHARD_STABLE_AFTER:
+            delay = SHARD_RESTART_DELAY
+        logging.error(f"샤드 그룹 {shard_ids} 비정상 종료 (코드 {return_code}), {delay:.1f}초 후 재시작")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, SHARD_MAX_RESTART_DELAY)
+
+async def run_shard_supervisor(shard_count, processes, script):
+    """샤드를 processes개 프로세스로 나눠 띄우는 감독 프로세스 (script: 자식 프로세스가 실행할 파일)"""
+    if processes > shard_count:
+        raise ValueError("샤드 프로세스 수는 전체 샤드 수보다 많을 수 없습니다.")
+    supervisor = asyncio.gather(*(supervise_shard_group(group, shard_count, script) for group in shard_groups(shard_count, processes)))
+    try:
+        # SIGTERM을 받으면 자식 프로세스에 SIGTERM을 넘겨 각자 스냅샷을 남기고 끝나게 함
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, supervisor.cancel)
+    except NotImplementedError:
+        pass
+    try:
+        await supervisor
+    except asyncio.CancelledError:
+        logging.info("샤드 감독 프로세스 종료")
+
+# 명령어 동기화: 마지막으로 동기화한 명령 정의의 해시를 남겨 두고 정의가 바뀌었을 때만 전역 동기화
+# (재시작마다 동기화하면 전역 명령 동기화 rate limit에 걸림, BUCKSHOT_FORCE_SYNC=1이면 항상 동기화)
+COMMAND_SYNC_PATH = "command_sync.json"
+
+def command_tree_digest(tree):
+    """명령 트리에 등록된 슬래시 명령 정의의 해시"""
+    definitions = []
+    for command in tree.get_commands():
+        try:
+            definitions.append(command.to_dict(tree))
+        except TypeError:  # discord.py 2.4 이전의 to_dict는 인자가 없음
+            definitions.append(command.to_dict())
+    payload = json.dumps(sorted(definitions, key=lambda definition: definition["name"]), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def sync_command_tree(tree, path=None):
+    """명령 정의가 마지막 동기화와 다를 때만 tree.sync() 하고 동기화한 명령 수를 반환 (건너뛰면 None)"""
+    path = path or COMMAND_SYNC_PATH
+    key = str(tree.client.application_id)
+    digest = command_tree_digest(tree)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            synced_digests = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        synced_digests = {}
+    if synced_digests.get(key) == digest and not os.environ.get("BUCKSHOT_FORCE_SYNC"):
+        return None
+    synced_commands = await tree.sync()
+    synced_digests[key] = digest
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(synced_digests, f)
+    os.replace(temp_path, path)
+    return len(synced_commands)